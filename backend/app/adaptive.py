@@ -0,0 +1,216 @@
+import os
+import time
+import asyncio
+import logging
+# types
+from typing import Callable, Dict, Optional, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+ADAPTIVE_MIN = int(os.getenv("ADAPTIVE_MIN", 1))
+ADAPTIVE_MAX = int(os.getenv("ADAPTIVE_MAX", max(2, (os.cpu_count() or 2) * 2)))
+ADAPTIVE_INITIAL = int(os.getenv("ADAPTIVE_INITIAL", 2))
+ADAPTIVE_INTERVAL = float(os.getenv("ADAPTIVE_INTERVAL", 2))
+# free memory share: below LOW backs off, above OK allows ramping up
+ADAPTIVE_MEM_LOW = float(os.getenv("ADAPTIVE_MEM_LOW", 0.15))
+ADAPTIVE_MEM_OK = float(os.getenv("ADAPTIVE_MEM_OK", 0.30))
+# busy cpu share over the last interval
+ADAPTIVE_CPU_HIGH = float(os.getenv("ADAPTIVE_CPU_HIGH", 0.90))
+ADAPTIVE_CPU_OK = float(os.getenv("ADAPTIVE_CPU_OK", 0.75))
+# event loop lag (ewma, seconds)
+ADAPTIVE_LAG_HIGH = float(os.getenv("ADAPTIVE_LAG_HIGH", 0.25))
+ADAPTIVE_LAG_OK = float(os.getenv("ADAPTIVE_LAG_OK", 0.05))
+# AIMD: +1 per interval with headroom, *0.7 under pressure, *0.5 after a renderer crash
+ADAPTIVE_INCREASE = 1.0
+ADAPTIVE_DECREASE = 0.7
+ADAPTIVE_CRASH_DECREASE = 0.5
+# no increases for this long after a decrease
+ADAPTIVE_COOLDOWN = float(os.getenv("ADAPTIVE_COOLDOWN", 10))
+
+# HOST PRESSURE FROM /proc (and the cgroup limit when running in a container)
+def memory_free_ratio() -> Optional[float]:
+    # cgroup v2 limit first, a container is killed at its limit, not the host's
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            limit = f.read().strip()
+        if limit != "max":
+            with open("/sys/fs/cgroup/memory.current") as f:
+                current = int(f.read())
+            return max(0.0, 1 - current / int(limit))
+    except (OSError, ValueError):
+        pass
+    try:
+        info = {}
+        with open("/proc/meminfo") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                info[name] = int(value.split()[0])
+        return info["MemAvailable"] / info["MemTotal"]
+    except (OSError, ValueError, KeyError, IndexError, ZeroDivisionError):
+        return None
+
+def cpu_times() -> Optional[Tuple[int, int]]:
+    # (busy, total) jiffies since boot, all cpus
+    try:
+        with open("/proc/stat") as f:
+            values = [int(v) for v in f.readline().split()[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        return sum(values) - idle, sum(values)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# AIMD LIMIT ON CONCURRENT BROWSER JOBS
+# Every interval: back off multiplicatively when memory, cpu or loop lag is over its high mark,
+# add one slot when all three have headroom and jobs are actually waiting for a slot.
+class AdaptiveConcurrency:
+    def __init__(
+        self,
+        lag: Optional[Callable[[], float]] = None,
+        min_limit: int = ADAPTIVE_MIN,
+        max_limit: int = ADAPTIVE_MAX,
+        initial: int = ADAPTIVE_INITIAL,
+        interval: float = ADAPTIVE_INTERVAL,
+    ):
+        # lag() -> current event loop lag in seconds
+        self.lag = lag
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(min_limit, initial)))
+        self.interval = interval
+        self.active = 0
+        self.waiting = 0
+        self.crashes = 0
+        self.pressure: Dict[str, Optional[float]] = {}
+        self.decisions: deque = deque(maxlen=50)
+        self._cooldown_until = 0.0
+        self._cpu: Optional[Tuple[int, int]] = None
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def current(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    async def acquire(self):
+        async with self._changed:
+            self.waiting += 1
+            try:
+                await self._changed.wait_for(lambda: self.active < self.current)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+
+    async def release(self):
+        async with self._changed:
+            self.active -= 1
+            self._changed.notify_all()
+
+    def record_crash(self, reason: str = "renderer crashed"):
+        # a crash is the strongest signal there is, back off now rather than next interval
+        self.crashes += 1
+        self._decrease(ADAPTIVE_CRASH_DECREASE, reason)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.adjust()
+            except Exception as e:
+                logger.error(f"Adaptive concurrency update failed: {e}")
+
+    def sample(self) -> Dict[str, Optional[float]]:
+        cpu, previous = cpu_times(), self._cpu
+        self._cpu = cpu
+        busy = None
+        if cpu and previous and cpu[1] > previous[1]:
+            busy = (cpu[0] - previous[0]) / (cpu[1] - previous[1])
+        memory = memory_free_ratio()
+        lag = self.lag() if self.lag else None
+        return {
+            "memory_free": round(memory, 3) if memory is not None else None,
+            "cpu_busy": round(busy, 3) if busy is not None else None,
+            "loop_lag": round(lag, 4) if lag is not None else None,
+        }
+
+    async def adjust(self):
+        self.pressure = await asyncio.to_thread(self.sample)
+        memory, cpu, lag = self.pressure["memory_free"], self.pressure["cpu_busy"], self.pressure["loop_lag"]
+
+        over = [
+            name for name, hit in (
+                ("memory", memory is not None and memory < ADAPTIVE_MEM_LOW),
+                ("cpu", cpu is not None and cpu > ADAPTIVE_CPU_HIGH),
+                ("loop_lag", lag is not None and lag > ADAPTIVE_LAG_HIGH),
+            ) if hit
+        ]
+        if over:
+            self._decrease(ADAPTIVE_DECREASE, f"{', '.join(over)} over the high mark")
+            return
+
+        headroom = (
+            (memory is None or memory > ADAPTIVE_MEM_OK)
+            and (cpu is None or cpu < ADAPTIVE_CPU_OK)
+            and (lag is None or lag < ADAPTIVE_LAG_OK)
+        )
+        # only grow when the limit is what holds jobs back
+        if headroom and self.waiting and time.monotonic() >= self._cooldown_until and self.limit < self.max_limit:
+            await self._set(min(self.max_limit, self.limit + ADAPTIVE_INCREASE), "increase", "headroom and jobs waiting")
+
+    def _decrease(self, factor: float, reason: str):
+        self._cooldown_until = time.monotonic() + ADAPTIVE_COOLDOWN
+        if self.limit > self.min_limit:
+            # no waiters can be woken by a smaller limit, the new value applies as jobs finish
+            self._record(max(float(self.min_limit), self.limit * factor), "decrease", reason)
+
+    async def _set(self, limit: float, action: str, reason: str):
+        async with self._changed:
+            self._record(limit, action, reason)
+            self._changed.notify_all()
+
+    def _record(self, limit: float, action: str, reason: str):
+        previous, self.limit = self.current, limit
+        self.decisions.append({
+            "at": time.time(),
+            "action": action,
+            "reason": reason,
+            "from": previous,
+            "to": self.current,
+            "active": self.active,
+            "waiting": self.waiting,
+            "pressure": dict(self.pressure),
+        })
+        if previous != self.current:
+            logger.info(f"browser job limit {previous} -> {self.current} ({reason})")
+
+    def snapshot(self, limit: int = 10) -> Dict[str, any]:
+        return {
+            "limit": self.current,
+            "min": self.min_limit,
+            "max": self.max_limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "crashes": self.crashes,
+            "pressure": self.pressure,
+            "decisions": list(self.decisions)[-limit:],
+        }
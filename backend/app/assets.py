@@ -0,0 +1,370 @@
+import os
+import re
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import importlib
+import mimetypes
+# types
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+from dataclasses import dataclass
+from urllib.parse import urljoin, urldefrag
+from politeness import DomainScheduler, THROTTLE_STATUSES
+
+# imported with the first client, see _get_client
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+ASSET_STORE_DIR = os.getenv("ASSET_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".asset_store"))
+ASSET_PUBLIC_BASE = os.getenv("ASSET_PUBLIC_BASE", "http://127.0.0.1:8000/assets")
+ASSET_INLINE_MAX_BYTES = int(os.getenv("ASSET_INLINE_MAX_BYTES", 4096))
+ASSET_MAX_BYTES = int(os.getenv("ASSET_MAX_BYTES", 5 * 1024 * 1024))
+ASSET_MAX_CONNECTIONS = int(os.getenv("ASSET_MAX_CONNECTIONS", 10))
+ASSET_TIMEOUT = float(os.getenv("ASSET_TIMEOUT", 10))
+# seconds a url -> blob entry is trusted, older ones are downloaded again (the site may have changed it)
+ASSET_INDEX_TTL = float(os.getenv("ASSET_INDEX_TTL", 24 * 3600))
+# blobs no job result references are removed, oldest first, while the store is over this (0: no cap)
+ASSET_STORE_MAX_BYTES = int(os.getenv("ASSET_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+# blobs touched more recently than this are kept, a running job may not have a result yet
+ASSET_SWEEP_MIN_AGE = float(os.getenv("ASSET_SWEEP_MIN_AGE", 3600))
+
+# a blob's file name, the sha256 of its content plus an extension
+BLOB_NAME = r"[0-9a-f]{64}(?:\.[A-Za-z0-9]+)?"
+
+# asset types worth bundling (scripts are never re-served)
+BUNDLED_TYPES = ("images", "icons", "fonts", "stylesheets")
+
+# ONE DOWNLOADED ASSET
+@dataclass
+class BundledAsset:
+    url: str
+    digest: str  # sha256 of the content
+    content_type: str
+    size: int
+    local_url: str  # data uri or url served by /assets
+    inlined: bool
+
+
+# CONTENT ADDRESSED STORE ON DISK
+class AssetStore:
+    def __init__(self, root: str = ASSET_STORE_DIR, index_ttl: float = ASSET_INDEX_TTL):
+        self.root = os.path.abspath(root)
+        self.index_ttl = index_ttl
+        os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "urls"), exist_ok=True)
+
+    def blob_name(self, digest: str, content_type: str) -> str:
+        ext = mimetypes.guess_extension(content_type or "") or ""
+        return f"{digest}{ext}"
+
+    def blob_path(self, name: str) -> Optional[str]:
+        # only plain file names, never paths
+        if not re.fullmatch(BLOB_NAME, name):
+            return None
+        path = os.path.join(self.root, "blobs", name)
+        return path if os.path.exists(path) else None
+
+    def _url_key(self, url: str) -> str:
+        return os.path.join(self.root, "urls", hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        # url -> {digest, content_type, size} from a previous job, a miss once older than index_ttl
+        try:
+            with open(self._url_key(url), "r") as f:
+                entry = json.load(f)
+            if time.time() - entry.get("fetched_at", 0) > self.index_ttl:
+                return None
+            path = os.path.join(self.root, "blobs", entry["name"])
+            # touched, so the sweep sees it in use
+            os.utime(path)
+            return entry
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def read(self, name: str) -> bytes:
+        with open(os.path.join(self.root, "blobs", name), "rb") as f:
+            return f.read()
+
+    def put(self, url: str, content: bytes, content_type: str) -> Dict:
+        entry = self.put_blob(content, content_type)
+        self._atomic_write(self._url_key(url), json.dumps({**entry, "fetched_at": time.time()}).encode("utf-8"))
+        return entry
+
+    def put_blob(self, content: bytes, content_type: str) -> Dict:
+        # content without a url (screenshots, exported data)
+        digest = hashlib.sha256(content).hexdigest()
+        name = self.blob_name(digest, content_type)
+        path = os.path.join(self.root, "blobs", name)
+
+        # identical content from different urls is stored once
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            self._atomic_write(path, content)
+
+        return {"name": name, "digest": digest, "content_type": content_type, "size": len(content)}
+
+    def sweep(self, referenced: Iterable[str], max_bytes: int = ASSET_STORE_MAX_BYTES, min_age: float = ASSET_SWEEP_MIN_AGE) -> int:
+        # Drops expired url entries, then unreferenced blobs oldest first until the store fits
+        # max_bytes. Returns how many blobs went.
+        now = time.time()
+        urls = os.path.join(self.root, "urls")
+        for name in os.listdir(urls):
+            path = os.path.join(urls, name)
+            try:
+                if now - os.path.getmtime(path) > self.index_ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+        if not max_bytes:
+            return 0
+        blobs = []
+        for name in os.listdir(os.path.join(self.root, "blobs")):
+            try:
+                stat = os.stat(os.path.join(self.root, "blobs", name))
+            except OSError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in blobs)
+
+        referenced = set(referenced)
+        removed = 0
+        for mtime, size, name in sorted(blobs):
+            if total <= max_bytes:
+                break
+            # leftover .tmp files of a crashed write are unreferenced too
+            if name in referenced or now - mtime < min_age:
+                continue
+            try:
+                os.remove(os.path.join(self.root, "blobs", name))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def _atomic_write(self, path: str, data: bytes):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+# DOWNLOADS, DEDUPLICATES AND REWRITES ASSETS FOR GENERATED HTML
+class AssetPipeline:
+    def __init__(
+        self,
+        store: Optional[AssetStore] = None,
+        max_connections: int = ASSET_MAX_CONNECTIONS,
+        inline_max_bytes: int = ASSET_INLINE_MAX_BYTES,
+        max_bytes: int = ASSET_MAX_BYTES,
+        public_base: str = ASSET_PUBLIC_BASE,
+        scheduler: Optional[DomainScheduler] = None,
+    ):
+        self.store = store or AssetStore()
+        self.scheduler = scheduler or DomainScheduler()
+        self.max_connections = max_connections
+        self.inline_max_bytes = inline_max_bytes
+        self.max_bytes = max_bytes
+        self.public_base = public_base.rstrip("/")
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._semaphore = asyncio.Semaphore(max_connections)
+        # url -> in flight download shared by concurrent jobs
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                timeout=ASSET_TIMEOUT,
+                follow_redirects=True,
+                headers={
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+                },
+            )
+        return self._client
+
+    async def warmup(self):
+        # the import is the slow part, done off the loop before the pool is built
+        await asyncio.to_thread(importlib.import_module, "httpx")
+        self._get_client()
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def prefetch(self, assets: Dict[str, List[str]]) -> Dict[str, BundledAsset]:
+        # Download every bundled asset concurrently, returns original url -> BundledAsset
+        urls = []
+        for asset_type in BUNDLED_TYPES:
+            for url in assets.get(asset_type, []):
+                url = urldefrag(url)[0]
+                if url.startswith(("http://", "https://")) and url not in urls:
+                    urls.append(url)
+
+        results = await asyncio.gather(*(self._get(url) for url in urls), return_exceptions=True)
+
+        bundle = {}
+        for url, result in zip(urls, results):
+            if isinstance(result, BundledAsset):
+                bundle[url] = result
+            elif isinstance(result, Exception):
+                logger.warning(f"Asset fetch failed for {url}: {result}")
+
+        logger.info(f"bundled {len(bundle)}/{len(urls)} assets")
+        return bundle
+
+    async def _get(self, url: str) -> Optional[BundledAsset]:
+        # cached from an earlier job, store reads are file i/o and stay off the loop
+        entry = await asyncio.to_thread(self.store.lookup, url)
+        if entry:
+            return await self._to_bundled(url, entry)
+
+        # another job is already downloading this url
+        if url in self._inflight:
+            shared = self._inflight[url]
+            try:
+                return await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                # the job that owned the download was cancelled, not this one: download it here
+                if shared.cancelled() and not asyncio.current_task().cancelling():
+                    return await self._get(url)
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            result = await self._download(url)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # mark retrieved so an unawaited future doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            del self._inflight[url]
+            # cancelled (job deleted, deadline reached), waiters must not wait on it forever
+            if not future.done():
+                future.cancel()
+
+    async def _download(self, url: str) -> Optional[BundledAsset]:
+        # one retry after a 429/503, the scheduler holds it until Retry-After has passed.
+        # The host's slot comes first: a throttled host waits for its token without holding
+        # one of the global connections other hosts' assets need.
+        for attempt in range(2):
+            async with self.scheduler.slot(url), self._semaphore:
+                client = self._get_client()
+                async with client.stream("GET", url) as response:
+                    self.scheduler.report(url, response.status_code, response.headers.get("retry-after"))
+                    if response.status_code in THROTTLE_STATUSES and attempt == 0:
+                        continue
+                    if response.status_code != 200:
+                        logger.warning(f"Asset {url} returned {response.status_code}")
+                        return None
+
+                    chunks = []
+                    size = 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            logger.warning(f"Asset {url} exceeds {self.max_bytes} bytes, skipping")
+                            return None
+                        chunks.append(chunk)
+
+                    content = b"".join(chunks)
+                    content_type = response.headers.get("content-type", "").split(";")[0].strip()
+                    if not content_type:
+                        content_type = mimetypes.guess_type(url)[0] or "application/octet-stream"
+                    break
+
+        if content_type == "text/css":
+            content = self._absolutize_css(content, url)
+
+        entry = await asyncio.to_thread(self.store.put, url, content, content_type)
+        return await self._to_bundled(url, entry)
+
+    def _absolutize_css(self, content: bytes, base_url: str) -> bytes:
+        # relative url(...) references would break once served from the asset store
+        css = content.decode("utf-8", errors="replace")
+
+        def resolve(match):
+            ref = match.group(2).strip()
+            if ref.startswith(("data:", "http://", "https://", "#")):
+                return match.group(0)
+            return f"url({match.group(1)}{urljoin(base_url, ref)}{match.group(1)})"
+
+        return re.sub(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)", resolve, css).encode("utf-8")
+
+    async def _to_bundled(self, url: str, entry: Dict) -> BundledAsset:
+        inlined = entry["size"] <= self.inline_max_bytes
+        if inlined:
+            data = base64.b64encode(await asyncio.to_thread(self.store.read, entry["name"])).decode("utf-8")
+            local_url = f"data:{entry['content_type']};base64,{data}"
+        else:
+            local_url = f"{self.public_base}/{entry['name']}"
+
+        return BundledAsset(
+            url=url,
+            digest=entry["digest"],
+            content_type=entry["content_type"],
+            size=entry["size"],
+            local_url=local_url,
+            inlined=inlined,
+        )
+
+    def rewrite_html(self, html: str, bundle: Dict[str, BundledAsset], base_url: str) -> str:
+        # Point src/href/srcset/url() references at the bundled copies
+        if not bundle or not html:
+            return html
+
+        def local(ref: str) -> Optional[str]:
+            ref = ref.strip()
+            if not ref or ref.startswith(("data:", "#", "javascript:", "mailto:")):
+                return None
+            absolute = urldefrag(urljoin(base_url, ref.replace("&amp;", "&")))[0]
+            asset = bundle.get(absolute)
+            return asset.local_url if asset else None
+
+        def replace_attr(match):
+            new = local(match.group(3))
+            if not new:
+                return match.group(0)
+            return f"{match.group(1)}={match.group(2)}{new}{match.group(2)}"
+
+        def replace_srcset(match):
+            candidates = []
+            for candidate in match.group(3).split(","):
+                parts = candidate.strip().split(None, 1)
+                if parts:
+                    parts[0] = local(parts[0]) or parts[0]
+                candidates.append(" ".join(parts))
+            return f"{match.group(1)}={match.group(2)}{', '.join(candidates)}{match.group(2)}"
+
+        def replace_css_url(match):
+            new = local(match.group(2))
+            if not new:
+                return match.group(0)
+            return f"url({match.group(1)}{new}{match.group(1)})"
+
+        html = re.sub(r"\b(src|href)\s*=\s*(['\"])([^'\"]*)\2", replace_attr, html, flags=re.IGNORECASE)
+        html = re.sub(r"\b(srcset)\s*=\s*(['\"])([^'\"]*)\2", replace_srcset, html, flags=re.IGNORECASE)
+        html = re.sub(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)", replace_css_url, html)
+        return html
+
+    def summary(self, bundle: Dict[str, BundledAsset]) -> Dict[str, int]:
+        return {
+            "assets_bundled": len(bundle),
+            "assets_inlined": len([a for a in bundle.values() if a.inlined]),
+            "asset_bytes": sum(a.size for a in bundle.values()),
+        }
@@ -0,0 +1,253 @@
+import os
+import time
+import asyncio
+import logging
+# types
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional
+from collections import Counter
+from dataclasses import dataclass
+
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, Playwright
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+# any CDP endpoint, http://127.0.0.1:9222 for a local chromium started with --remote-debugging-port
+REMOTE_CDP_URL = os.getenv("REMOTE_CDP_URL")
+REMOTE_POOL_SIZE = int(os.getenv("REMOTE_POOL_SIZE", 4))
+# connections kept open even when nothing runs
+REMOTE_POOL_MIN_IDLE = int(os.getenv("REMOTE_POOL_MIN_IDLE", 0))
+# contexts one connection serves at once, a browserbase session takes one
+REMOTE_CONTEXTS_PER_SESSION = int(os.getenv("REMOTE_CONTEXTS_PER_SESSION", 1))
+REMOTE_SESSION_MAX_AGE = float(os.getenv("REMOTE_SESSION_MAX_AGE", 600))
+REMOTE_SESSION_IDLE = float(os.getenv("REMOTE_SESSION_IDLE", 120))
+REMOTE_KEEPALIVE_INTERVAL = float(os.getenv("REMOTE_KEEPALIVE_INTERVAL", 20))
+# a session unused for longer is pinged before it is handed out again
+REMOTE_HEALTH_CHECK_AFTER = float(os.getenv("REMOTE_HEALTH_CHECK_AFTER", 5))
+REMOTE_PING_TIMEOUT = 5.0
+REMOTE_CONNECT_TIMEOUT = float(os.getenv("REMOTE_CONNECT_TIMEOUT", 15))
+# how long a job waits on a full pool before it takes the local browser
+REMOTE_ACQUIRE_TIMEOUT = float(os.getenv("REMOTE_ACQUIRE_TIMEOUT", 2))
+
+# ONE OPEN CDP CONNECTION
+@dataclass(eq=False)
+class RemoteSession:
+    browser: "Browser"
+    created: float
+    last_used: float
+    in_use: int = 0
+    uses: int = 0
+    # last successful ping
+    checked: float = 0.0
+    # no new contexts, closed once the running ones are released
+    retired: bool = False
+
+    def expired(self, now: float, max_age: float) -> bool:
+        return now - self.created > max_age
+
+
+# KEEPS REMOTE BROWSER CONNECTIONS OPEN AND SHARES THEM ACROSS JOBS
+# acquire() returns None when the pool is full for longer than acquire_timeout or the
+# endpoint can't be reached, callers fall back to the local browser then.
+class RemoteSessionPool:
+    def __init__(
+        self,
+        endpoint: Callable[[], Awaitable[str]],
+        size: int = REMOTE_POOL_SIZE,
+        min_idle: int = REMOTE_POOL_MIN_IDLE,
+        contexts_per_session: int = REMOTE_CONTEXTS_PER_SESSION,
+        max_age: float = REMOTE_SESSION_MAX_AGE,
+        idle_timeout: float = REMOTE_SESSION_IDLE,
+        keepalive_interval: float = REMOTE_KEEPALIVE_INTERVAL,
+        acquire_timeout: float = REMOTE_ACQUIRE_TIMEOUT,
+    ):
+        # endpoint() -> url to connect to, called once per new connection
+        self.endpoint = endpoint
+        self.size = size
+        self.min_idle = min(min_idle, size)
+        self.contexts_per_session = max(1, contexts_per_session)
+        self.max_age = max_age
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.acquire_timeout = acquire_timeout
+        self.sessions: List[RemoteSession] = []
+        self.stats: Counter = Counter()
+        self._connecting = 0
+        self._changed = asyncio.Condition()
+        self._keepalive: Optional[asyncio.Task] = None
+
+    async def acquire(self, playwright: "Playwright") -> Optional[RemoteSession]:
+        self._start_keepalive(playwright)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            async with self._changed:
+                session = self._take_idle()
+                if session is None:
+                    if len(self.sessions) + self._connecting < self.size:
+                        self._connecting += 1
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.stats["saturated"] += 1
+                            return None
+                        try:
+                            await asyncio.wait_for(self._changed.wait(), remaining)
+                        except asyncio.TimeoutError:
+                            pass
+                        continue
+
+            if session is None:
+                return await self._open(playwright)
+
+            if await self._healthy(session):
+                session.uses += 1
+                self.stats["reused"] += 1
+                return session
+            self.stats["health_failures"] += 1
+            session.retired = True
+            await self.release(session)
+
+    async def release(self, session: RemoteSession, broken: bool = False):
+        async with self._changed:
+            session.in_use -= 1
+            session.last_used = time.monotonic()
+            if broken or session.expired(session.last_used, self.max_age) or not session.browser.is_connected():
+                session.retired = True
+            if session.retired and session.in_use == 0 and session in self.sessions:
+                self.sessions.remove(session)
+            else:
+                session = None
+            self._changed.notify_all()
+        if session is not None:
+            await self._close_browser(session)
+
+    async def fill(self, playwright: "Playwright", count: int):
+        # opens connections up front (warmup), stops at the first failure
+        while self._idle_count() + self._connecting < count and len(self.sessions) + self._connecting < self.size:
+            self._connecting += 1
+            session = await self._open(playwright)
+            if session is None:
+                return
+            await self.release(session)
+
+    def _take_idle(self) -> Optional[RemoteSession]:
+        # the most recently used live connection with a free slot
+        now = time.monotonic()
+        candidates = [
+            session for session in self.sessions
+            if not session.retired
+            and session.in_use < self.contexts_per_session
+            and not session.expired(now, self.max_age)
+        ]
+        if not candidates:
+            return None
+        session = max(candidates, key=lambda s: s.last_used)
+        session.in_use += 1
+        return session
+
+    def _idle_count(self) -> int:
+        return sum(1 for session in self.sessions if session.in_use == 0 and not session.retired)
+
+    async def _open(self, playwright: "Playwright") -> Optional[RemoteSession]:
+        # the caller has counted this connection in _connecting
+        session = None
+        try:
+            url = await self.endpoint()
+            browser = await playwright.chromium.connect_over_cdp(url, timeout=REMOTE_CONNECT_TIMEOUT * 1000)
+            now = time.monotonic()
+            session = RemoteSession(browser=browser, created=now, last_used=now, in_use=1, uses=1)
+            self.sessions.append(session)
+            self.stats["connected"] += 1
+        except Exception as e:
+            self.stats["connect_failures"] += 1
+            logger.error(f"Remote browser connect failed: {e}")
+        finally:
+            self._connecting -= 1
+        async with self._changed:
+            self._changed.notify_all()
+        return session
+
+    async def _healthy(self, session: RemoteSession) -> bool:
+        if not session.browser.is_connected():
+            return False
+        if time.monotonic() - max(session.last_used, session.checked) < REMOTE_HEALTH_CHECK_AFTER:
+            return True
+        return await self._ping(session)
+
+    async def _ping(self, session: RemoteSession) -> bool:
+        # one round trip on the connection, also what keeps an idle remote session alive
+        try:
+            cdp = await session.browser.new_browser_cdp_session()
+            try:
+                await asyncio.wait_for(cdp.send("Browser.getVersion"), REMOTE_PING_TIMEOUT)
+            finally:
+                await cdp.detach()
+            session.checked = time.monotonic()
+            return True
+        except Exception as e:
+            logger.warning(f"Remote browser session failed its health check: {e}")
+            return False
+
+    async def _close_browser(self, session: RemoteSession):
+        try:
+            await asyncio.wait_for(session.browser.close(), REMOTE_PING_TIMEOUT)
+        except Exception as e:
+            logger.debug(f"Closing remote browser failed: {e}")
+
+    # KEEPALIVE: pings idle connections, drops old/idle/dead ones, tops up min_idle
+    def _start_keepalive(self, playwright: "Playwright"):
+        if self._keepalive is None or self._keepalive.done():
+            self._keepalive = asyncio.create_task(self._keepalive_loop(playwright))
+
+    async def _keepalive_loop(self, playwright: "Playwright"):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await self._sweep()
+                await self.fill(playwright, self.min_idle)
+            except Exception as e:
+                logger.error(f"Remote pool keepalive failed: {e}")
+
+    async def _sweep(self):
+        now = time.monotonic()
+        async with self._changed:
+            idle = [session for session in self.sessions if session.in_use == 0 and not session.retired]
+            # claimed while checked, so acquire() can't hand them out meanwhile
+            for session in idle:
+                session.in_use += 1
+
+        surplus = max(0, len(idle) - self.min_idle)
+        for session in sorted(idle, key=lambda s: s.last_used):
+            if session.expired(now, self.max_age):
+                self.stats["expired"] += 1
+                session.retired = True
+            elif surplus and now - session.last_used > self.idle_timeout:
+                surplus -= 1
+                session.retired = True
+            elif not await self._ping(session):
+                self.stats["health_failures"] += 1
+                session.retired = True
+
+            # a sweep is not a use, keep the idle clock running
+            last_used = session.last_used
+            await self.release(session)
+            session.last_used = last_used
+
+    def snapshot(self) -> Dict[str, any]:
+        now = time.monotonic()
+        return {
+            "size": self.size,
+            "sessions": len(self.sessions),
+            "in_use": sum(1 for session in self.sessions if session.in_use),
+            "connecting": self._connecting,
+            "oldest_seconds": round(max((now - session.created for session in self.sessions), default=0), 1),
+            "stats": dict(self.stats),
+        }
+
+    async def close(self):
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            self._keepalive = None
+        sessions, self.sessions = self.sessions, []
+        await asyncio.gather(*(self._close_browser(session) for session in sessions))
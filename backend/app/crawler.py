@@ -0,0 +1,182 @@
+import os
+import re
+import asyncio
+import logging
+# types
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+from webscrape import ScrapingResult, WebScrape
+from deadline import DEADLINE_MIN_ATTEMPT, current_deadline
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 3))
+
+# links to these are never pages
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".zip", ".gz", ".tar", ".rar", ".7z", ".dmg", ".exe",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg", ".ico", ".avif",
+    ".mp4", ".webm", ".mp3", ".wav", ".css", ".js", ".json", ".xml", ".txt",
+)
+# query params that only track the visitor, utm_* by prefix and the rest by exact name
+TRACKING_PREFIXES = ("utm_",)
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref"}
+
+def is_tracking_param(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+# NORMALIZE URLS SO THE SAME PAGE IS ONLY SCRAPED ONCE
+def normalize_url(url: str) -> str:
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+
+    # drop default ports
+    port = parsed.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+
+    path = parsed.path or "/"
+    if path != "/" and path.endswith("/"):
+        path = path.rstrip("/")
+
+    # sorted query without tracking params
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not is_tracking_param(key)
+    ))
+
+    return urlunparse((scheme, host, path, "", query, ""))
+
+def same_origin(url: str, origin_url: str) -> bool:
+    a, b = urlparse(url), urlparse(origin_url)
+    return a.scheme == b.scheme and a.netloc.lower() == b.netloc.lower()
+
+# POINT LINKS BETWEEN CRAWLED PAGES AT THE GENERATED FILES
+def rewrite_page_links(html: str, page_url: str, paths: Dict[str, str]) -> str:
+    def replace(match):
+        href = match.group(2).strip()
+        if href.startswith(("#", "mailto:", "tel:", "javascript:", "data:")):
+            return match.group(0)
+        path = paths.get(normalize_url(urljoin(page_url, href.replace("&amp;", "&"))))
+        if not path:
+            return match.group(0)
+        return f"href={match.group(1)}{path}{match.group(1)}"
+
+    return re.sub(r"href\s*=\s*(['\"])([^'\"]*)\1", replace, html, flags=re.IGNORECASE)
+
+# ONE CRAWLED PAGE
+@dataclass
+class CrawledPage:
+    url: str
+    depth: int
+    result: ScrapingResult
+
+
+# BREADTH FIRST SAME-ORIGIN CRAWL OVER THE SHARED BROWSER
+class SiteCrawler:
+    def __init__(self, scraper: WebScrape, max_depth: int = 1, max_pages: int = 5, concurrency: int = CRAWL_CONCURRENCY, screenshots: bool = True):
+        self.scraper = scraper
+        self.screenshots = screenshots
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+
+    async def crawl(
+        self,
+        start_url: str,
+        on_page: Optional[Callable[[CrawledPage, int], Awaitable[None]]] = None,
+    ) -> List[CrawledPage]:
+        start_url = normalize_url(start_url)
+        frontier: asyncio.Queue[Tuple[str, int]] = asyncio.Queue()
+        frontier.put_nowait((start_url, 0))
+        seen = {start_url}
+        pages: List[CrawledPage] = []
+        # pages claimed by workers, stops the frontier overshooting max_pages
+        claimed = 0
+        # urls that found max_pages claimed while some of those were still scraping, one goes
+        # back on the frontier for every claimed page that fails
+        deferred: List[Tuple[str, int]] = []
+        in_flight = 0
+        # unexpected errors (a raising on_page, a bug): the crawl stops and raises the first one
+        errors: List[Exception] = []
+
+        # every page shares one context so stylesheets, fonts and images hit the browser cache
+        async with self.scraper.shared_context() as context:
+
+            async def worker():
+                nonlocal claimed, in_flight
+                while True:
+                    url, depth = await frontier.get()
+                    try:
+                        if errors:
+                            continue
+                        if claimed >= self.max_pages:
+                            if in_flight:
+                                deferred.append((url, depth))
+                            continue
+                        # under a job deadline no page is started once the scrape budget can't fit one,
+                        # the site is generated from what was scraped so far
+                        deadline = current_deadline.get()
+                        if claimed and deadline is not None and deadline.scrape_budget() < DEADLINE_MIN_ATTEMPT:
+                            deadline.degrade("crawl", "pages skipped", f"after {claimed} of {self.max_pages}")
+                            continue
+                        claimed += 1
+
+                        in_flight += 1
+                        try:
+                            result = await self.scraper.scrape_website(url, context=context, screenshots=self.screenshots)
+                        finally:
+                            in_flight -= 1
+                        if not result.success:
+                            logger.warning(f"crawl: {url} failed: {result.error_message}")
+                            claimed -= 1
+                            # queued before this task is done, so frontier.join() waits for it
+                            if deferred:
+                                frontier.put_nowait(deferred.pop(0))
+                            continue
+
+                        page = CrawledPage(url=url, depth=depth, result=result)
+                        pages.append(page)
+                        if on_page:
+                            await on_page(page, len(pages))
+
+                        if depth < self.max_depth:
+                            for link in self._follow(result.links, start_url):
+                                if link not in seen:
+                                    seen.add(link)
+                                    frontier.put_nowait((link, depth + 1))
+                    except Exception as e:
+                        # the worker has to live on, frontier.join() waits for every queued url
+                        logger.error(f"crawl: {url} raised: {e}")
+                        errors.append(e)
+                    finally:
+                        frontier.task_done()
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                await frontier.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        if errors:
+            raise errors[0]
+
+        # start page first, then by depth
+        pages.sort(key=lambda page: (page.url != start_url, page.depth))
+        return pages[:self.max_pages]
+
+    def _follow(self, links: List[str], start_url: str) -> List[str]:
+        follow = []
+        for link in links:
+            if not same_origin(link, start_url):
+                continue
+            if urlparse(link).path.lower().endswith(SKIPPED_EXTENSIONS):
+                continue
+            follow.append(normalize_url(link))
+        return follow
@@ -0,0 +1,89 @@
+import os
+import time
+import logging
+# types
+from typing import Dict, List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+# seconds a single page job may take end to end, 0 (the default) means none unless the request asks.
+# A deadline is also the LLM's latency budget: the standard tier expects ~70s and the complex one
+# ~135s, so anything much under ~90s moves pages off the tier their complexity routes them to.
+# Crawls only get a deadline when they ask for one.
+JOB_DEADLINE = float(os.getenv("JOB_DEADLINE", 0))
+# kept back after generation for asset rewriting, optimize, metadata and export
+DEADLINE_FINISH_RESERVE = float(os.getenv("DEADLINE_FINISH_RESERVE", 2))
+# the pipeline stops waiting on its stages this long before the deadline, to build a template result
+DEADLINE_BACKSTOP_RESERVE = float(os.getenv("DEADLINE_BACKSTOP_RESERVE", 0.5))
+# what the scrape leaves over for the LLM call
+DEADLINE_GENERATION_RESERVE = float(os.getenv("DEADLINE_GENERATION_RESERVE", 15))
+# an LLM call isn't started with less than this, the template preview is the page instead
+DEADLINE_MIN_LLM = float(os.getenv("DEADLINE_MIN_LLM", 6))
+# generation budget below which the prompt is cut down
+DEADLINE_COMPACT_PROMPT = float(os.getenv("DEADLINE_COMPACT_PROMPT", 20))
+# a scrape retry isn't started with less scrape budget than this
+DEADLINE_MIN_ATTEMPT = float(os.getenv("DEADLINE_MIN_ATTEMPT", 6))
+# scrape budget needed for every extractor, below it the ones the prompt doesn't use go first
+DEADLINE_FULL_EXTRACTION = float(os.getenv("DEADLINE_FULL_EXTRACTION", 8))
+# time extraction needs after navigation and settling
+DEADLINE_EXTRACTION_RESERVE = float(os.getenv("DEADLINE_EXTRACTION_RESERVE", 3))
+# one more screenshot viewport, tablet and mobile are skipped without it
+DEADLINE_VIEWPORT_SECONDS = float(os.getenv("DEADLINE_VIEWPORT_SECONDS", 3))
+
+# ONE JOB'S DEADLINE AND WHAT WAS CUT TO MEET IT
+class Deadline:
+    def __init__(self, seconds: float, generation_reserve: float = DEADLINE_GENERATION_RESERVE):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.expires = self.started + seconds
+        # template jobs don't need time for an LLM call
+        self.generation_reserve = generation_reserve
+        self.degraded: List[Dict[str, any]] = []
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        return max(0.0, self.expires - time.monotonic() - reserve)
+
+    def scrape_budget(self) -> float:
+        # what navigation, settling and extraction may use before generation needs the rest
+        return self.remaining(self.generation_reserve + DEADLINE_FINISH_RESERVE)
+
+    def degrade(self, stage: str, action: str, detail: Optional[str] = None):
+        # Records optional work that was cut, once per stage and action
+        if any(entry["stage"] == stage and entry["action"] == action for entry in self.degraded):
+            return
+        self.degraded.append({
+            "stage": stage,
+            "action": action,
+            "detail": detail,
+            "at_s": round(self.elapsed(), 2),
+            "remaining_s": round(self.remaining(), 2),
+        })
+        logger.info(f"deadline: {stage} {action}{f' ({detail})' if detail else ''}, {self.remaining():.1f}s left")
+
+    def to_dict(self) -> Dict[str, any]:
+        elapsed = self.elapsed()
+        return {
+            "seconds": self.seconds,
+            "elapsed_s": round(elapsed, 2),
+            "met": elapsed <= self.seconds,
+            "degraded": list(self.degraded),
+        }
+
+
+# the deadline of the job running in this context, None when it has none
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+@contextmanager
+def job_deadline(seconds: Optional[float], generation_reserve: float = DEADLINE_GENERATION_RESERVE):
+    deadline = Deadline(seconds, generation_reserve) if seconds else None
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
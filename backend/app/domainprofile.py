@@ -0,0 +1,340 @@
+import os
+import re
+import json
+import time
+import random
+import sqlite3
+import logging
+# types
+from typing import Dict, List, Optional
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from politeness import host_of
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+DOMAIN_PROFILES = os.getenv("DOMAIN_PROFILES", "1") == "1"
+DOMAIN_PROFILE_PATH = os.getenv("DOMAIN_PROFILE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "domainprofiles.sqlite3"))
+# evidence halves every this many seconds, a redesigned site is relearned within days
+DOMAIN_PROFILE_HALF_LIFE = float(os.getenv("DOMAIN_PROFILE_HALF_LIFE", 7 * 24 * 3600))
+# decayed scrapes needed before a profile changes anything (1.5: two recent ones)
+DOMAIN_PROFILE_MIN_SAMPLES = float(os.getenv("DOMAIN_PROFILE_MIN_SAMPLES", 1.5))
+# share of profiled first attempts that run the default strategy anyway, keeps the baseline measured
+DOMAIN_PROFILE_EXPLORE = float(os.getenv("DOMAIN_PROFILE_EXPLORE", 0.1))
+# third party hosts costing this much response time per scrape are worth blocking
+HEAVY_HOST_MS = float(os.getenv("HEAVY_HOST_MS", 800))
+MAX_PROFILE_HOSTS = 30
+
+# the default strategy: networkidle, then a fixed 2s for late rendering
+DEFAULT_WAIT_UNTIL = "networkidle"
+DEFAULT_TIMEOUT_MS = 30000
+DEFAULT_SETTLE_MS = 2000
+# requests that can change what the page looks like, hosts serving these are never blocked
+VISUAL_TYPES = ("document", "stylesheet", "image", "font", "media")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    host TEXT PRIMARY KEY,
+    profile TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Installed before any page script runs: remembers when the DOM last changed
+MUTATION_CLOCK_JS = """
+(() => {
+    window.__cloneLastMutation = 0;
+    new MutationObserver(() => { window.__cloneLastMutation = performance.now(); })
+        .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+})();
+"""
+
+# Waits until the DOM has been quiet for `quiet` ms, images in the first viewport are decoded
+# and fonts are loaded, or until `until` ms after navigation start. Returns when the page was ready.
+SETTLE_JS = """
+async ({quiet, until, wait}) => {
+    // wait: most ms to spend in here whatever until says (a job deadline), null for no limit
+    const stop = wait == null ? Infinity : performance.now() + wait;
+    const loaded = () => {
+        const fold = window.innerHeight;
+        for (const img of document.images) {
+            if (!img.complete && img.getBoundingClientRect().top < fold) return false;
+        }
+        return !document.fonts || document.fonts.status === 'loaded';
+    };
+    while (true) {
+        const now = performance.now();
+        const last = window.__cloneLastMutation || 0;
+        const settled = now - last >= quiet && loaded();
+        if (settled || now >= Math.min(until, stop)) {
+            const nav = performance.getEntriesByType('navigation')[0];
+            const dcl = nav ? nav.domContentLoadedEventEnd : 0;
+            return {ready_ms: Math.round(Math.max(dcl, Math.min(last, now))), settled, waited_to: Math.round(now), cut: !settled && now < until};
+        }
+        await new Promise(resolve => setTimeout(resolve, Math.min(100, Math.max(10, Math.min(until, stop) - now))));
+    }
+}
+"""
+
+TAG_RE = re.compile(r"<script\b.*?</script>|<style\b.*?</style>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+
+def needs_javascript(raw_html: str, rendered_chars: int) -> bool:
+    # the rendered page has far more text than the html the server sent
+    raw_chars = len(" ".join(TAG_RE.sub(" ", raw_html).split()))
+    return rendered_chars > max(200, 2 * raw_chars)
+
+
+# HOW ONE SCRAPE WAITS, TIMES OUT AND BLOCKS
+@dataclass
+class ScrapePlan:
+    host: str
+    profiled: bool = False  # False: the default strategy
+    wait_until: str = DEFAULT_WAIT_UNTIL
+    timeout_ms: float = DEFAULT_TIMEOUT_MS
+    # None: a fixed settle_ms after the navigation returned. Otherwise wait for the DOM to be
+    # quiet for quiet_ms, but no longer than settle_until_ms after navigation start.
+    settle_until_ms: Optional[float] = None
+    settle_ms: float = DEFAULT_SETTLE_MS
+    quiet_ms: float = 300
+    block_hosts: List[str] = field(default_factory=list)
+    reason: str = "no profile"
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+# WHAT ONE SCRAPE FOUND OUT ABOUT ITS HOST
+@dataclass
+class ScrapeObservation:
+    plan: ScrapePlan
+    failure: Optional[str] = None  # networkidle_timeout | navigation_timeout | throttled | crashed | deadline | error
+    navigate_ms: Optional[float] = None
+    settle_ms: Optional[float] = None
+    ready_ms: Optional[float] = None  # ms after navigation start the page stopped changing
+    networkidle: Optional[bool] = None  # None: not waited for
+    js_required: Optional[bool] = None
+    # third party host -> {"ms": summed response time, "count": requests, "visual": bool, "script": bool}
+    hosts: Dict[str, Dict[str, any]] = field(default_factory=dict)
+
+    @property
+    def wait_ms(self) -> Optional[float]:
+        # time spent before extraction could start, what profiles are meant to cut
+        if self.navigate_ms is None or self.settle_ms is None:
+            return None
+        return self.navigate_ms + self.settle_ms
+
+    def add_request(self, url: str, resource_type: str, ms: float, first_party: str):
+        host = host_of(url)
+        if not host or host == first_party or host.endswith(f".{first_party}"):
+            return
+        entry = self.hosts.setdefault(host, {"ms": 0.0, "count": 0, "visual": False, "script": False})
+        entry["ms"] += max(0.0, ms)
+        entry["count"] += 1
+        entry["visual"] = entry["visual"] or resource_type in VISUAL_TYPES
+        entry["script"] = entry["script"] or resource_type == "script"
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "plan": self.plan.to_dict(),
+            "failure": self.failure,
+            "navigate_ms": self.navigate_ms,
+            "settle_ms": self.settle_ms,
+            "wait_ms": self.wait_ms,
+            "ready_ms": self.ready_ms,
+            "networkidle": self.networkidle,
+            "js_required": self.js_required,
+            "third_party_hosts": len(self.hosts),
+        }
+
+
+# DECAYED FACTS ABOUT ONE HOST
+# Counts (samples, host costs, failures) decay with DOMAIN_PROFILE_HALF_LIFE, means are running
+# means over the decayed counts, so old scrapes weigh less and a quiet host fades back to defaults.
+@dataclass
+class DomainProfile:
+    host: str
+    updated_at: float = 0.0
+    samples: float = 0.0  # successful scrapes
+    ready_ms: float = 0.0
+    navigate_ms: float = 0.0
+    js_score: float = 0.0  # share of scrapes whose content needed javascript
+    idle_samples: float = 0.0  # scrapes that waited for networkidle
+    idle_rate: float = 0.0  # share of those where it fired
+    hosts: Dict[str, Dict[str, any]] = field(default_factory=dict)
+    failures: Dict[str, float] = field(default_factory=dict)
+
+    def decay(self, now: float):
+        if self.updated_at:
+            factor = 0.5 ** (max(0.0, now - self.updated_at) / DOMAIN_PROFILE_HALF_LIFE)
+            self.samples *= factor
+            self.idle_samples *= factor
+            for entry in self.hosts.values():
+                entry["ms"] *= factor
+                entry["seen"] *= factor
+            self.failures = {mode: count * factor for mode, count in self.failures.items() if count * factor >= 0.05}
+        self.updated_at = now
+
+    def observe(self, observation: ScrapeObservation):
+        if observation.failure:
+            self.failures[observation.failure] = self.failures.get(observation.failure, 0.0) + 1
+        if observation.networkidle is not None:
+            self.idle_samples += 1
+            self.idle_rate += (float(observation.networkidle) - self.idle_rate) / self.idle_samples
+        if observation.failure or observation.ready_ms is None:
+            return
+
+        self.samples += 1
+        self.ready_ms += (observation.ready_ms - self.ready_ms) / self.samples
+        self.navigate_ms += ((observation.navigate_ms or 0.0) - self.navigate_ms) / self.samples
+        if observation.js_required is not None:
+            self.js_score += (float(observation.js_required) - self.js_score) / self.samples
+        for host, seen in observation.hosts.items():
+            entry = self.hosts.setdefault(host, {"ms": 0.0, "seen": 0.0, "visual": False, "script": False})
+            entry["ms"] += seen["ms"]
+            entry["seen"] += 1
+            entry["visual"] = entry["visual"] or seen["visual"]
+            entry["script"] = entry["script"] or seen["script"]
+        # blocked hosts cost nothing this time, they keep their measured cost until a default
+        # (exploring) scrape measures them again
+        for host in observation.plan.block_hosts:
+            entry = self.hosts.get(host)
+            if entry and host not in observation.hosts and entry["seen"]:
+                entry["ms"] += entry["ms"] / entry["seen"]
+                entry["seen"] += 1
+        # the costliest hosts are the ones worth remembering
+        if len(self.hosts) > MAX_PROFILE_HOSTS:
+            keep = sorted(self.hosts, key=lambda h: self.hosts[h]["ms"], reverse=True)[:MAX_PROFILE_HOSTS]
+            self.hosts = {host: self.hosts[host] for host in keep}
+
+    @property
+    def trusted(self) -> bool:
+        return self.samples >= DOMAIN_PROFILE_MIN_SAMPLES
+
+    @property
+    def js_required(self) -> bool:
+        return self.js_score >= 0.5
+
+    def heavy_hosts(self) -> List[str]:
+        # Slow third party hosts that never served anything visible. Scripts are only fair game
+        # when the page renders without javascript, otherwise the app bundle could be one of them.
+        blocked = []
+        for host, entry in self.hosts.items():
+            if entry["visual"] or entry["seen"] < 1 or (entry["script"] and self.js_required):
+                continue
+            if entry["ms"] / self.samples >= HEAVY_HOST_MS:
+                blocked.append(host)
+        return sorted(blocked)
+
+    def plan(self) -> ScrapePlan:
+        # learned strategy: skip networkidle, wait for the DOM to settle around when it usually does
+        timeout_ms = min(DEFAULT_TIMEOUT_MS, max(10000.0, self.navigate_ms * 3))
+        if self.failures.get("navigation_timeout", 0.0) >= 0.5:
+            # slow at times, give it longer than the default
+            timeout_ms = DEFAULT_TIMEOUT_MS * 1.5
+        return ScrapePlan(
+            host=self.host,
+            profiled=True,
+            wait_until="load" if self.js_required else "domcontentloaded",
+            timeout_ms=round(timeout_ms),
+            quiet_ms=300,
+            settle_until_ms=round(min(10000.0, max(500.0, self.ready_ms * 1.25 + 250))),
+            block_hosts=self.heavy_hosts(),
+            reason=f"profile of {self.samples:.1f} scrapes",
+        )
+
+    def to_dict(self) -> Dict[str, any]:
+        return asdict(self)
+
+
+# PROFILES IN SQLITE, SHARED BY THE API PROCESS AND WORKERS
+# All methods block, call them through asyncio.to_thread from async code.
+class DomainProfileStore:
+    def __init__(self, path: str = DOMAIN_PROFILE_PATH, enabled: bool = DOMAIN_PROFILES, explore: float = DOMAIN_PROFILE_EXPLORE):
+        self.path = os.path.abspath(path)
+        self.enabled = enabled
+        self.explore = explore
+        # wait time (navigation + settle) per strategy in this process, the profiles' measured effect
+        self.latency: Dict[str, Dict[str, float]] = {
+            arm: {"scrapes": 0, "wait_ms": 0.0} for arm in ("profiled", "default")
+        }
+        self.stats: Counter = Counter()
+        self._ready = False
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            if not self._ready:
+                conn.executescript(SCHEMA)
+                self._ready = True
+            yield conn
+        finally:
+            conn.close()
+
+    def load(self, host: str) -> Optional[DomainProfile]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT profile FROM profiles WHERE host = ?", (host,)).fetchone()
+        if row is None:
+            return None
+        profile = DomainProfile(**json.loads(row[0]))
+        profile.decay(time.time())
+        return profile
+
+    def plan_for(self, url: str, attempt: int = 0) -> ScrapePlan:
+        host = host_of(url)
+        if not self.enabled:
+            return ScrapePlan(host, reason="profiles disabled")
+        try:
+            profile = self.load(host)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.error(f"Loading domain profile for {host} failed: {e}")
+            return ScrapePlan(host, reason="profile unreadable")
+        if profile is None or not profile.trusted:
+            self.stats["unprofiled"] += 1
+            return ScrapePlan(host)
+        # retries take the learned path, a host known to miss networkidle isn't explored
+        if attempt == 0 and profile.idle_rate >= 0.5 and random.random() < self.explore:
+            self.stats["explored"] += 1
+            return ScrapePlan(host, reason="exploring the default strategy")
+        self.stats["profiled"] += 1
+        return profile.plan()
+
+    def record(self, observation: ScrapeObservation):
+        plan = observation.plan
+        if observation.wait_ms is not None:
+            arm = self.latency["profiled" if plan.profiled else "default"]
+            arm["scrapes"] += 1
+            arm["wait_ms"] += observation.wait_ms
+        if not self.enabled:
+            return
+        try:
+            with self._connect() as conn:
+                # read-modify-write in one transaction, workers may finish the same host at once
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute("SELECT profile FROM profiles WHERE host = ?", (plan.host,)).fetchone()
+                    profile = DomainProfile(**json.loads(row[0])) if row else DomainProfile(plan.host)
+                    now = time.time()
+                    profile.decay(now)
+                    profile.observe(observation)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO profiles (host, profile, updated_at) VALUES (?, ?, ?)",
+                        (plan.host, json.dumps(profile.to_dict()), now),
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            self.stats["recorded"] += 1
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.error(f"Storing domain profile for {plan.host} failed: {e}")
+
+    def snapshot(self) -> Dict[str, any]:
+        latency = {
+            arm: {**values, "mean_wait_ms": round(values["wait_ms"] / values["scrapes"], 1) if values["scrapes"] else None}
+            for arm, values in self.latency.items()
+        }
+        return {"enabled": self.enabled, "explore": self.explore, "stats": dict(self.stats), "latency": latency}
@@ -0,0 +1,340 @@
+import os
+import html
+import logging
+# types
+from typing import Dict, Iterable, List, Optional, Sequence
+from array import array
+from itertools import accumulate, chain
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+# snapshot: one DOMSnapshot.captureSnapshot call, cleaned and outlined from the node table
+# html: page.content() cleaned with bs4 (engines without CDP always use this)
+DOM_CAPTURE_MODES = ("snapshot", "html")
+DOM_CAPTURE = os.getenv("DOM_CAPTURE", "snapshot")
+SKELETON_MAX_LINES = int(os.getenv("SKELETON_MAX_LINES", 400))
+SKELETON_MAX_DEPTH = int(os.getenv("SKELETON_MAX_DEPTH", 12))
+
+# computed styles captured per laid out node, in column order
+SNAPSHOT_STYLES = (
+    "display", "position", "visibility", "color", "background-color",
+    "font-family", "font-size", "font-weight", "flex-direction", "grid-template-columns",
+)
+
+ELEMENT, TEXT, CDATA, COMMENT, DOCUMENT, DOCTYPE, FRAGMENT = 1, 3, 4, 8, 9, 10, 11
+
+# same rules as the bs4 cleaner: scripts, style tags, comments and tracking containers go
+DROP_TAGS = frozenset(("script", "style"))
+TRACKING_MARKERS = ("analytics", "tracking", "gtm", "facebook")
+VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr",
+))
+# their text is serialized as is, not escaped
+RAW_TEXT_TAGS = frozenset(("script", "style", "xmp", "iframe", "noembed", "noframes", "plaintext", "noscript"))
+# always outlined, whatever their display
+LANDMARK_TAGS = frozenset((
+    "header", "nav", "main", "section", "article", "aside", "footer", "form",
+    "h1", "h2", "h3", "h4", "h5", "h6", "img", "svg", "video", "picture",
+    "button", "ul", "ol", "table", "input", "textarea", "select",
+))
+# display values that don't make a box of their own worth outlining
+INLINE_DISPLAYS = frozenset(("inline", "contents", "none", ""))
+SKELETON_SKIP_TAGS = frozenset(("html", "head", "br", "wbr"))
+
+
+# ONE DOCUMENT OF A DOMSnapshot.captureSnapshot RESULT AS COLUMNS
+# Nodes come in document order (a node's descendants directly follow it), so a subtree is the
+# index range [i, end[i]) and dropping one is a single jump. Strings stay in the snapshot's own
+# interned table, every string column holds indices into it (-1 for none).
+class NodeTable:
+    def __init__(self, snapshot: Dict[str, any], document: int = 0):
+        self.strings: List[str] = snapshot["strings"]
+        doc = snapshot["documents"][document]
+        nodes = doc["nodes"]
+        self.url = self.string(doc.get("documentURL", -1))
+
+        self.parent = array("i", nodes["parentIndex"])
+        self.node_type = array("b", nodes["nodeType"])
+        self.name = array("i", nodes["nodeName"])
+        self.value = array("i", nodes.get("nodeValue") or [-1] * len(self.parent))
+        n = len(self.parent)
+
+        # tag ids: a small lowercase tag list, one id per node (0 for non elements)
+        self.tags: List[str] = [""]
+        tag_ids: Dict[int, int] = {}
+        for index in set(self.name[i] for i in range(n) if self.node_type[i] == ELEMENT):
+            tag_ids[index] = len(self.tags)
+            self.tags.append(self._tag_name(self.strings[index]))
+        self.tag = array("H", (tag_ids.get(index, 0) if kind == ELEMENT else 0 for index, kind in zip(self.name, self.node_type)))
+
+        # attributes as CSR: node i's [name, value, ...] pairs are attr_data[attr_offsets[i]:attr_offsets[i + 1]]
+        attributes = nodes.get("attributes") or [[]] * n
+        self.attr_offsets = array("i", chain((0,), accumulate(len(pairs) for pairs in attributes)))
+        self.attr_data = array("i", chain.from_iterable(attributes))
+
+        # pseudo elements and shadow roots aren't part of the serialized markup
+        self.pseudo = bytearray(n)
+        for index in nodes.get("pseudoType", {}).get("index", []):
+            self.pseudo[index] = 1
+        for index in nodes.get("shadowRootType", {}).get("index", []):
+            self.pseudo[index] = 1
+
+        # layout rows: boxes (x, y, w, h) and one column per SNAPSHOT_STYLES entry
+        layout = doc.get("layout", {})
+        self.layout_row = array("i", [-1]) * n
+        for row, index in enumerate(layout.get("nodeIndex", [])):
+            self.layout_row[index] = row
+        self.bounds = array("d", chain.from_iterable(
+            (box + [0.0] * 4)[:4] for box in layout.get("bounds", [])
+        ))
+        styles = array("i", chain.from_iterable(layout.get("styles", [])))
+        width = len(SNAPSHOT_STYLES)
+        rows = len(layout.get("nodeIndex", []))
+        self.styles: Dict[str, array] = {
+            name: styles[column::width] if len(styles) == width * rows else array("i")
+            for column, name in enumerate(SNAPSHOT_STYLES)
+        }
+
+        # end[i]: one past node i's last descendant
+        self.end = array("i", range(1, n + 1))
+        for i in range(n - 1, 0, -1):
+            p = self.parent[i]
+            if p >= 0 and self.end[i] > self.end[p]:
+                self.end[p] = self.end[i]
+
+    @staticmethod
+    def _tag_name(name: str) -> str:
+        # html elements come uppercase, svg/mathml keep their case (linearGradient)
+        return name.lower() if name == name.upper() else name
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def string(self, index: int) -> str:
+        return self.strings[index] if index >= 0 else ""
+
+    def tag_name(self, i: int) -> str:
+        return self.tags[self.tag[i]]
+
+    def attributes(self, i: int) -> Iterable[tuple]:
+        start, stop = self.attr_offsets[i], self.attr_offsets[i + 1]
+        data = self.attr_data
+        for k in range(start, stop - 1, 2):
+            yield self.strings[data[k]], self.string(data[k + 1])
+
+    def attribute(self, i: int, name: str) -> Optional[str]:
+        for key, value in self.attributes(i):
+            if key == name:
+                return value
+        return None
+
+    def box(self, i: int) -> Optional[Sequence[float]]:
+        row = self.layout_row[i]
+        if row < 0 or 4 * row + 4 > len(self.bounds):
+            return None
+        return self.bounds[4 * row:4 * row + 4]
+
+    def style(self, i: int, name: str) -> str:
+        row, column = self.layout_row[i], self.styles.get(name)
+        if row < 0 or column is None or row >= len(column):
+            return ""
+        return self.string(column[row])
+
+    # VECTORIZED SELECTIONS, computed over the string table or the columns, not per parsed node
+    def tag_mask(self, names: Iterable[str]) -> bytearray:
+        wanted = set(names)
+        lut = bytes(1 if tag in wanted else 0 for tag in self.tags)
+        return bytearray(lut[t] for t in self.tag)
+
+    def attribute_mask(self, names: Iterable[str], markers: Sequence[str]) -> bytearray:
+        # nodes having one of the attributes with a value containing a marker
+        names = set(names)
+        name_ids = {index for index, s in enumerate(self.strings) if s in names}
+        # each distinct string is tested once, however many nodes share it
+        flagged = {index for index, s in enumerate(self.strings) if any(m in s for m in markers)}
+        mask = bytearray(len(self))
+        data, offsets = self.attr_data, self.attr_offsets
+        for i in range(len(self)):
+            for k in range(offsets[i], offsets[i + 1] - 1, 2):
+                if data[k] in name_ids and data[k + 1] in flagged:
+                    mask[i] = 1
+                    break
+        return mask
+
+    def subtree_mask(self, roots: bytearray) -> bytearray:
+        # roots plus everything under them, one pass
+        mask = bytearray(len(self))
+        i, n = 0, len(self)
+        while i < n:
+            if roots[i]:
+                stop = self.end[i]
+                mask[i:stop] = b"\x01" * (stop - i)
+                i = stop
+            else:
+                i += 1
+        return mask
+
+    def clean_mask(self) -> bytearray:
+        # 1 for nodes that stay
+        drop = self.tag_mask(DROP_TAGS)
+        tracking = self.attribute_mask(("id", "class"), TRACKING_MARKERS)
+        kinds = self.node_type
+        roots = bytearray(
+            1 if d or t or p or k == COMMENT else 0
+            for d, t, p, k in zip(drop, tracking, self.pseudo, kinds)
+        )
+        removed = self.subtree_mask(roots)
+        return bytearray(1 - r for r in removed)
+
+    def tag_counts(self, keep: Optional[bytearray] = None) -> Counter:
+        counts = Counter(self.tag if keep is None else (t for t, k in zip(self.tag, keep) if k))
+        counts.pop(0, None)
+        return Counter({self.tags[t]: c for t, c in counts.items()})
+
+    # MARKUP FROM THE TABLE
+    def to_html(self, keep: Optional[bytearray] = None) -> str:
+        out: List[str] = []
+        # (end index, tag) of open elements
+        open_tags: List[tuple] = []
+        n, i = len(self), 0
+        raw_depth = 0
+        while i < n:
+            while open_tags and open_tags[-1][0] <= i:
+                _, tag = open_tags.pop()
+                out.append(f"</{tag}>")
+                raw_depth -= tag in RAW_TEXT_TAGS
+            if keep is not None and not keep[i]:
+                i = self.end[i]
+                continue
+
+            kind = self.node_type[i]
+            if kind == ELEMENT:
+                tag = self.tag_name(i)
+                attrs = "".join(
+                    f' {key}="{html.escape(value, quote=True)}"' if value else f" {key}"
+                    for key, value in self.attributes(i)
+                )
+                out.append(f"<{tag}{attrs}>")
+                if tag not in VOID_TAGS:
+                    open_tags.append((self.end[i], tag))
+                    raw_depth += tag in RAW_TEXT_TAGS
+            elif kind in (TEXT, CDATA):
+                text = self.string(self.value[i])
+                out.append(text if raw_depth else html.escape(text, quote=False))
+            elif kind == DOCTYPE:
+                out.append(f"<!DOCTYPE {self.string(self.name[i])}>")
+            # documents and template fragments only hold their children
+            i += 1
+        while open_tags:
+            out.append(f"</{open_tags.pop()[1]}>")
+        return "".join(out)
+
+    # OUTLINE FOR THE PROMPT
+    # One line per box worth knowing about, indented by outline depth:
+    #   section#hero.hero.dark 1920x640@0,80 flex "Build faster"
+    # Runs of identical siblings collapse into one line with a count.
+    def skeleton(self, keep: Optional[bytearray] = None, max_lines: int = SKELETON_MAX_LINES, max_depth: int = SKELETON_MAX_DEPTH) -> str:
+        lines: List[str] = []
+        counts: List[int] = []
+        # (end index, line index, signature of the last outlined child) per outlined ancestor
+        stack: List[list] = [[len(self), -1, None]]
+        n, i = len(self), 0
+        while i < n and len(lines) < max_lines:
+            while stack[-1][0] <= i:
+                stack.pop()
+            if keep is not None and not keep[i]:
+                i = self.end[i]
+                continue
+            if self.node_type[i] != ELEMENT or not self._outlined(i):
+                i += 1
+                continue
+
+            signature = self._signature(i)
+            parent = stack[-1]
+            if parent[2] == signature:
+                # repeated sibling (cards, list items), counted on the first one
+                counts[parent[1]] += 1
+                i = self.end[i]
+                continue
+
+            depth = len(stack) - 1
+            lines.append("  " * min(depth, max_depth) + self._describe(i))
+            counts.append(1)
+            parent[2] = signature
+            parent[1] = len(lines) - 1
+            if depth < max_depth:
+                stack.append([self.end[i], -1, None])
+                i += 1
+            else:
+                i = self.end[i]
+        return "\n".join(line if count == 1 else f"{line} x{count}" for line, count in zip(lines, counts))
+
+    def _outlined(self, i: int) -> bool:
+        tag = self.tag_name(i)
+        if tag in SKELETON_SKIP_TAGS:
+            return False
+        box = self.box(i)
+        if box is None or box[2] < 1 or box[3] < 1:
+            return False
+        return tag in LANDMARK_TAGS or self.style(i, "display") not in INLINE_DISPLAYS
+
+    def _signature(self, i: int) -> str:
+        classes = ".".join((self.attribute(i, "class") or "").split()[:3])
+        return f"{self.tag_name(i)}.{classes}"
+
+    def _describe(self, i: int) -> str:
+        tag = self.tag_name(i)
+        ident = self.attribute(i, "id")
+        classes = (self.attribute(i, "class") or "").split()[:3]
+        label = tag + (f"#{ident}" if ident else "") + "".join(f".{c}" for c in classes)
+        x, y, w, h = self.box(i)
+        parts = [label, f"{round(w)}x{round(h)}@{round(x)},{round(y)}"]
+        display, position = self.style(i, "display"), self.style(i, "position")
+        if display in ("flex", "inline-flex", "grid", "inline-grid"):
+            parts.append(display)
+        if position in ("fixed", "sticky", "absolute"):
+            parts.append(position)
+        text = self._own_text(i)
+        if text:
+            parts.append(f'"{text}"')
+        return " ".join(parts)
+
+    def _own_text(self, i: int, limit: int = 40) -> str:
+        # text of the direct children, where a heading or button label lives
+        text = []
+        j, stop = i + 1, self.end[i]
+        while j < stop:
+            if self.parent[j] == i and self.node_type[j] == TEXT:
+                text.append(self.string(self.value[j]))
+            j = self.end[j] if self.parent[j] == i else j + 1
+        joined = " ".join(" ".join(text).split())
+        return joined[:limit] + ("..." if len(joined) > limit else "")
+
+
+# CAPTURE
+async def capture_snapshot(cdp) -> Dict[str, any]:
+    # One round trip: the whole DOM plus the computed styles above for every laid out node
+    return await cdp.send("DOMSnapshot.captureSnapshot", {
+        "computedStyles": list(SNAPSHOT_STYLES),
+        "includeDOMRects": False,
+        "includePaintOrder": False,
+    })
+
+
+def clean_snapshot(snapshot: Dict[str, any]) -> tuple:
+    # (cleaned html, skeleton, stats) of the main document
+    table = NodeTable(snapshot)
+    keep = table.clean_mask()
+    tags = table.tag_counts(keep)
+    stats = {
+        "mode": "snapshot",
+        "nodes": len(table),
+        "kept": sum(keep),
+        "laid_out": sum(1 for row in table.layout_row if row >= 0),
+        "strings": len(table.strings),
+        "top_tags": dict(tags.most_common(10)),
+    }
+    return table.to_html(keep), table.skeleton(keep), stats
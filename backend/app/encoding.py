@@ -0,0 +1,84 @@
+import gzip
+import json
+import hashlib
+# types
+from typing import Any, Dict, Iterator, Optional, Tuple
+from dataclasses import dataclass, field
+
+# optional speedups, plain json / gzip only without them
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# bodies smaller than this aren't worth compressing
+MIN_COMPRESS_BYTES = 1024
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def dumps(obj: Any) -> bytes:
+    # JSON bytes, orjson is several times faster than json on big html strings
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+def dumps_text(obj: Any) -> str:
+    # websocket text frames, the frontend JSON.parses them
+    return dumps(obj).decode("utf-8")
+
+
+# ONE BODY, ENCODED ONCE FOR EVERY ACCEPT-ENCODING WE SERVE
+@dataclass
+class EncodedBody:
+    media_type: str
+    etag: str  # strong, sha256 of the identity bytes
+    encodings: Dict[str, bytes] = field(default_factory=dict)  # "identity", "gzip", "br"
+
+    @classmethod
+    def build(cls, body: bytes, media_type: str) -> "EncodedBody":
+        encoded = cls(media_type=media_type, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        encoded.encodings["identity"] = body
+        if len(body) >= MIN_COMPRESS_BYTES:
+            encoded.encodings["gzip"] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                encoded.encodings["br"] = brotli.compress(body, quality=5)
+        return encoded
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Tuple[str, bytes]:
+        # best encoding the client accepts, br > gzip > identity
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.encodings and accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding, self.encodings[encoding]
+        return "identity", self.encodings["identity"]
+
+    def size(self) -> int:
+        return sum(len(body) for body in self.encodings.values())
+
+    def sizes(self) -> Dict[str, int]:
+        return {encoding: len(body) for encoding, body in self.encodings.items()}
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    # "gzip, br;q=0.8" -> {"gzip": 1.0, "br": 0.8}
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                pass
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+def chunks(body: bytes, size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
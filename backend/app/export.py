@@ -0,0 +1,184 @@
+import io
+import os
+import re
+import json
+import time
+import logging
+import zipfile
+# types
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from dataclasses import dataclass
+from assets import BLOB_NAME, AssetStore, BundledAsset
+from webscrape import ScrapingResult
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", 64 * 1024))
+# already compressed, deflating them again only costs cpu
+STORED_EXTENSIONS = (".webp", ".png", ".jpg", ".jpeg", ".gif", ".avif", ".ico", ".woff", ".woff2", ".gz", ".zip")
+
+# WHAT A JOB LEAVES BEHIND FOR ITS EXPORT
+# Screenshots and scraped data are written to the asset store as blobs, the result only keeps
+# their names: {"files": {archive path: blob name}, "assets": {url: blob name}}
+def build_manifest(scraping_result: ScrapingResult, asset_bundle: Dict[str, BundledAsset], store: AssetStore) -> Dict[str, Dict[str, str]]:
+    files: Dict[str, str] = {}
+    for viewport in scraping_result.screenshot_names:
+        mime_type = scraping_result.screenshot_mime_type(viewport)
+        entry = store.put_blob(scraping_result.screenshot_bytes(viewport), mime_type)
+        files[f"screenshots/{viewport}{os.path.splitext(entry['name'])[1]}"] = entry["name"]
+        thumbnail = scraping_result.thumbnail_bytes(viewport)
+        if thumbnail:
+            entry = store.put_blob(thumbnail, mime_type)
+            files[f"screenshots/thumbnails/{viewport}{os.path.splitext(entry['name'])[1]}"] = entry["name"]
+
+    data = {
+        "extracted_css": scraping_result.extracted_css,
+        "typography": scraping_result.typography,
+        "layout": scraping_result.layout_info,
+        "colors": scraping_result.color_palette,
+        "page_metadata": scraping_result.metadata,
+    }
+    for name, value in data.items():
+        entry = store.put_blob(json.dumps(value, indent=2, default=str).encode("utf-8"), "application/json")
+        files[f"data/{name}.json"] = entry["name"]
+
+    # inlined assets live in the html already
+    assets = {
+        url: store.blob_name(asset.digest, asset.content_type)
+        for url, asset in asset_bundle.items() if not asset.inlined
+    }
+    return {"files": files, "assets": assets}
+
+def referenced_blobs(result_data: Dict, public_base: str) -> Set[str]:
+    # Blobs a finished result still needs: its export files and assets, and the asset urls in
+    # its html (a failed manifest write leaves those without an entry)
+    pages = list((result_data.get("pages") or {}).values()) or [result_data]
+    names: Set[str] = set()
+    served = re.compile(re.escape(f"{public_base.rstrip('/')}/") + f"({BLOB_NAME})")
+    for page in pages:
+        manifest = page.get("export") or {}
+        names.update(manifest.get("files", {}).values())
+        names.update(manifest.get("assets", {}).values())
+        names.update(served.findall(page.get("generated_html") or ""))
+    return names
+
+
+# ONE FILE IN THE ARCHIVE, bytes already in memory or a blob read in chunks
+@dataclass
+class ZipMember:
+    path: str
+    data: Optional[bytes] = None
+    file: Optional[str] = None
+
+    def chunks(self, size: int) -> Iterator[bytes]:
+        if self.data is not None:
+            for start in range(0, len(self.data), size):
+                yield self.data[start:start + size]
+            return
+        with open(self.file, "rb") as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+def export_members(job_id: str, result_data: Dict, store: AssetStore, public_base: str) -> Iterator[ZipMember]:
+    # Pages, their screenshots and data, shared assets, then a manifest of what made it in.
+    # Lazy, so nothing is read before the client asks for it.
+    def local_html(html: str) -> str:
+        # served asset urls -> the copies in assets/
+        return html.replace(f"{public_base.rstrip('/')}/", "assets/")
+
+    if result_data.get("pages"):
+        # crawl: pages at the root (they link to each other by file name), the rest per page
+        pages = [
+            (path, page["generated_html"], f"{os.path.splitext(path)[0]}/", page.get("export") or {})
+            for path, page in result_data["pages"].items()
+        ]
+    else:
+        pages = [("index.html", result_data["generated_html"], "", result_data.get("export") or {})]
+
+    written: List[str] = []
+    missing: List[str] = []
+    assets: Dict[str, str] = {}
+    for path, html, prefix, manifest in pages:
+        written.append(path)
+        yield ZipMember(path, data=local_html(html).encode("utf-8"))
+        for archive_path, name in manifest.get("files", {}).items():
+            blob = store.blob_path(name)
+            if blob is None:
+                missing.append(prefix + archive_path)
+                continue
+            written.append(prefix + archive_path)
+            yield ZipMember(prefix + archive_path, file=blob)
+        assets.update(manifest.get("assets", {}))
+
+    # assets are content addressed, shared ones go in once
+    asset_paths: Dict[str, str] = {}
+    for name in sorted(set(assets.values())):
+        blob = store.blob_path(name)
+        if blob is None:
+            missing.append(f"assets/{name}")
+            continue
+        written.append(f"assets/{name}")
+        yield ZipMember(f"assets/{name}", file=blob)
+    for url, name in assets.items():
+        if f"assets/{name}" in written:
+            asset_paths[url] = f"assets/{name}"
+
+    summary = {
+        "job_id": job_id,
+        "original_url": result_data["original_url"],
+        "metadata": result_data.get("scraping_metadata"),
+        "files": written,
+        "assets": asset_paths,
+        # blobs that were gone by the time of the export
+        "missing": missing,
+    }
+    yield ZipMember("manifest.json", data=json.dumps(summary, indent=2, default=str).encode("utf-8"))
+
+
+# STREAMING ZIP WRITER
+# zipfile writes into this sink, whatever it wrote is handed on after every chunk, so
+# memory stays at about one chunk no matter how big the archive gets
+class ChunkSink(io.RawIOBase):
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_stream(members: Iterable[ZipMember], chunk_size: int = EXPORT_CHUNK_BYTES) -> Iterator[bytes]:
+    # The sink can't seek, so zipfile writes sizes and crcs after each file (data descriptors)
+    sink = ChunkSink()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(sink, mode="w") as archive:
+        for member in members:
+            info = zipfile.ZipInfo(member.path, date_time=date_time)
+            info.compress_type = zipfile.ZIP_STORED if member.path.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+            with archive.open(info, mode="w") as out:
+                for chunk in member.chunks(chunk_size):
+                    out.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # central directory
+    data = sink.drain()
+    if data:
+        yield data
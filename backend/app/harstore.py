@@ -0,0 +1,105 @@
+import os
+import time
+import uuid
+import hashlib
+import logging
+# types
+from typing import Dict, Optional
+from collections import Counter
+from dataclasses import dataclass
+from urllib.parse import urldefrag
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+# off: live network only
+# record: every navigation is saved as a HAR, per url
+# replay: requests are answered from the url's HAR only, no network at all
+# cache: replay a HAR younger than HAR_MAX_AGE, otherwise scrape live and record
+HAR_MODES = ("off", "record", "replay", "cache")
+HAR_MODE = os.getenv("HAR_MODE", "off")
+HAR_DIR = os.getenv("HAR_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".har"))
+HAR_MAX_AGE = float(os.getenv("HAR_MAX_AGE", 3600))
+
+class HarMissing(Exception):
+    pass
+
+# ONE CONTEXT'S USE OF A HAR
+@dataclass
+class HarSession:
+    url: str
+    mode: str
+    path: str  # what playwright reads (replay) or writes (record)
+    replay: bool
+    age: Optional[float] = None  # seconds since the replayed HAR was recorded
+    succeeded: bool = False
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "mode": self.mode,
+            "source": "replay" if self.replay else "recorded",
+            "age_seconds": round(self.age, 1) if self.age is not None else None,
+        }
+
+
+# HAR FILES ON DISK, ONE PER URL
+# Recordings go to a temp file and only replace the stored HAR once the scrape succeeded,
+# a failed or throttled attempt never poisons later replays.
+class HarStore:
+    def __init__(self, root: str = HAR_DIR, max_age: float = HAR_MAX_AGE):
+        self.root = os.path.abspath(root)
+        self.max_age = max_age
+        self.stats: Counter = Counter()
+
+    def path_for(self, url: str) -> str:
+        # .zip keeps resources as separate entries, playwright picks the format from the extension
+        digest = hashlib.sha256(urldefrag(url)[0].encode("utf-8")).hexdigest()[:40]
+        return os.path.join(self.root, f"{digest}.zip")
+
+    def age(self, url: str) -> Optional[float]:
+        try:
+            return time.time() - os.path.getmtime(self.path_for(url))
+        except OSError:
+            return None
+
+    def plan(self, url: str, mode: str, attempt: int = 0) -> Optional[HarSession]:
+        # What one scrape attempt does with the url's HAR, None when it doesn't use one
+        if mode not in HAR_MODES:
+            raise ValueError(f"Unknown HAR mode: {mode}")
+        if mode == "off":
+            return None
+
+        age = self.age(url)
+        if mode == "replay":
+            if age is None:
+                self.stats["missing"] += 1
+                raise HarMissing(f"No HAR recorded for {url}")
+            self.stats["replayed"] += 1
+            return HarSession(url, mode, self.path_for(url), replay=True, age=age)
+
+        # cache: a failed replay is retried live
+        if mode == "cache" and attempt == 0 and age is not None and age <= self.max_age:
+            self.stats["cache_hits"] += 1
+            return HarSession(url, mode, self.path_for(url), replay=True, age=age)
+        if mode == "cache":
+            self.stats["cache_misses"] += 1
+
+        os.makedirs(self.root, exist_ok=True)
+        final = self.path_for(url)
+        return HarSession(url, mode, f"{final[:-len('.zip')]}.{uuid.uuid4().hex}.tmp.zip", replay=False)
+
+    def finish(self, session: HarSession):
+        # called once the context is closed and playwright has written the recording
+        if session.replay:
+            return
+        try:
+            if session.succeeded and os.path.exists(session.path):
+                os.replace(session.path, self.path_for(session.url))
+                self.stats["recorded"] += 1
+            elif os.path.exists(session.path):
+                os.remove(session.path)
+        except OSError as e:
+            logger.error(f"Storing HAR for {session.url} failed: {e}")
+
+    def snapshot(self) -> Dict[str, any]:
+        return {"max_age_seconds": self.max_age, "stats": dict(self.stats)}
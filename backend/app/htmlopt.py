@@ -0,0 +1,226 @@
+from __future__ import annotations
+import re
+import logging
+# types
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# bs4 is imported on first optimize, extract_html alone doesn't need it
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, Tag
+
+logger = logging.getLogger(__name__)
+
+# external stylesheets known not to fight inline styles (fonts only)
+SAFE_STYLESHEET_HOSTS = ("fonts.googleapis.com", "fonts.bunny.net", "use.typekit.net")
+# text in these is rendered (or parsed) as written
+RAW_TEXT_TAGS = ("pre", "textarea", "script", "style", "code")
+
+FENCE_RE = re.compile(r"```[ \t]*([A-Za-z0-9_-]*)[ \t]*\r?\n(.*?)(?:```|\Z)", re.DOTALL)
+CSS_STRING_RE = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')")
+
+# PULL THE HTML DOCUMENT OUT OF A MODEL RESPONSE
+def extract_html(text: str) -> str:
+    if not text:
+        return ""
+
+    # fenced blocks, prefer the one holding a document; an unclosed fence (truncated output) runs to the end
+    blocks = [(lang.lower(), body.strip()) for lang, body in FENCE_RE.findall(text)]
+    for lang, body in blocks:
+        if re.search(r"<!doctype|<html", body, re.IGNORECASE):
+            return body
+    for lang, body in blocks:
+        if lang == "html" and body:
+            return body
+
+    # bare document with prose around it
+    start = re.search(r"<!doctype|<html", text, re.IGNORECASE)
+    if start:
+        end = text.lower().rfind("</html>")
+        return text[start.start():end + len("</html>") if end > start.start() else len(text)].strip()
+
+    return text.strip()
+
+
+def split_declarations(style: str) -> List[str]:
+    # "a:b; c:url(x;y)" -> ["a:b", "c:url(x;y)"], semicolons in strings and parens are kept
+    declarations, current, depth, quote = [], [], 0, None
+    for char in style:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth = max(0, depth - 1)
+        elif char == ";" and depth == 0:
+            declarations.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    declarations.append("".join(current))
+    return [d.strip() for d in declarations if d.strip()]
+
+def normalize_style(style: str) -> str:
+    # same declarations in the same order -> same key, whitespace only where it matters
+    normalized = []
+    for declaration in split_declarations(style):
+        name, _, value = declaration.partition(":")
+        if not value.strip():
+            continue
+        name = name.strip()
+        # custom properties are case sensitive
+        if not name.startswith("--"):
+            name = name.lower()
+        normalized.append(f"{name}:{minify_css(value.strip())}")
+    return ";".join(normalized)
+
+def minify_css(css: str) -> str:
+    # comments and redundant whitespace out, strings untouched
+    parts = CSS_STRING_RE.split(css)
+    for i in range(0, len(parts), 2):
+        part = re.sub(r"/\*.*?\*/", "", parts[i], flags=re.DOTALL)
+        part = re.sub(r"\s+", " ", part)
+        parts[i] = re.sub(r"\s*([{};])\s*", r"\1", part).replace(";}", "}")
+    return "".join(parts).strip()
+
+
+# SHRINKS GENERATED HTML WITHOUT CHANGING HOW IT RENDERS
+class HtmlOptimizer:
+    def __init__(self, min_repeats: int = 2, class_prefix: str = "_s"):
+        self.min_repeats = min_repeats
+        self.class_prefix = class_prefix
+
+    def optimize(self, html: str) -> Tuple[str, Dict[str, any]]:
+        stats = {"bytes_before": len(html.encode("utf-8")), "classes_created": 0, "styles_lifted": 0, "notes": []}
+        try:
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(html, "html.parser")
+            css_text = " ".join(style.get_text() for style in soup.find_all("style"))
+
+            self._strip_comments(soup)
+            self._lift_styles(soup, css_text, stats)
+            for style in soup.find_all("style"):
+                if style.string:
+                    style.string.replace_with(minify_css(style.string))
+            if re.search(r"white-space\s*:\s*(pre|break-spaces)", css_text + " " + self._inline_css(soup), re.IGNORECASE):
+                stats["notes"].append("kept whitespace, page uses white-space: pre")
+            else:
+                self._collapse_whitespace(soup)
+
+            optimized = str(soup)
+        except Exception as e:
+            logger.warning(f"HTML optimization failed: {e}")
+            stats["notes"].append(f"failed: {e}")
+            optimized = html
+
+        stats["bytes_after"] = len(optimized.encode("utf-8"))
+        stats["saved_ratio"] = round(1 - stats["bytes_after"] / stats["bytes_before"], 3) if stats["bytes_before"] else 0.0
+        return optimized, stats
+
+    def _lift_styles(self, soup: BeautifulSoup, css_text: str, stats: Dict[str, any]):
+        # A lifted rule only matches inline precedence if it is !important and nothing else
+        # on the page can out-rank or rewrite it, otherwise styles stay where they are
+        reason = self._lift_blocker(soup, css_text)
+        if reason:
+            stats["notes"].append(f"kept inline styles, {reason}")
+            return
+
+        elements: Dict[str, List[Tag]] = {}
+        for element in soup.find_all(style=True):
+            key = normalize_style(element["style"])
+            if key and "!important" not in key.lower():
+                elements.setdefault(key, []).append(element)
+
+        repeated = sorted(
+            ((key, tags) for key, tags in elements.items() if len(tags) >= self.min_repeats),
+            key=lambda item: -len(item[1]),
+        )
+        if not repeated:
+            return
+
+        taken = {name for element in soup.find_all(class_=True) for name in element.get("class", [])}
+        lifts, index, saved = [], 0, 0
+        for key, tags in repeated:
+            name = f"{self.class_prefix}{index:x}"
+            while name in taken:
+                index += 1
+                name = f"{self.class_prefix}{index:x}"
+            index += 1
+
+            important = ";".join(f"{declaration}!important" for declaration in split_declarations(key))
+            rule = f".{name}{{{important}}}"
+            # ' style="..."' on every element vs the rule plus ' class="..."' / ' name'
+            inline_bytes = len(tags) * (len(key) + 9)
+            lifted_bytes = len(rule) + sum(len(name) + (1 if element.get("class") else 9) for element in tags)
+            if lifted_bytes < inline_bytes:
+                lifts.append((name, rule, tags))
+                saved += inline_bytes - lifted_bytes
+
+        # into the page's own <style> when it has a plain one, order doesn't matter for !important
+        existing = [style for style in soup.find_all("style") if not style.attrs]
+        head = soup.find("head")
+        overhead = 0 if existing else len("<style></style>") + (0 if head else len("<head></head>"))
+        if saved <= overhead:
+            return
+
+        for name, rule, tags in lifts:
+            for element in tags:
+                del element["style"]
+                element["class"] = element.get("class", []) + [name]
+            stats["classes_created"] += 1
+            stats["styles_lifted"] += len(tags)
+        rules = "".join(rule for _, rule, _ in lifts)
+
+        if existing:
+            existing[-1].string = (existing[-1].string or "") + rules
+            return
+
+        style = soup.new_tag("style")
+        style.string = rules
+        if head is None:
+            head = soup.new_tag("head")
+            (soup.find("html") or soup).insert(0, head)
+        head.append(style)
+
+    def _lift_blocker(self, soup: BeautifulSoup, css_text: str) -> Optional[str]:
+        if "!important" in css_text.lower():
+            return "page stylesheet uses !important"
+        if "@keyframes" in css_text.lower():
+            # animations lose to !important, they don't lose to inline styles
+            return "page uses animations"
+        for script in soup.find_all("script"):
+            if "style" in (script.get_text() or ""):
+                return "scripts touch styles"
+        for link in soup.find_all("link", rel=lambda rel: rel and "stylesheet" in rel):
+            host = urlparse(link.get("href", "")).hostname or ""
+            if host not in SAFE_STYLESHEET_HOSTS:
+                return "page loads an external stylesheet"
+        return None
+
+    def _inline_css(self, soup: BeautifulSoup) -> str:
+        return " ".join(element["style"] for element in soup.find_all(style=True))
+
+    def _strip_comments(self, soup: BeautifulSoup):
+        from bs4 import Comment
+        for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+            # conditional comments still mean something to old browsers
+            if not comment.strip().startswith("[if"):
+                comment.extract()
+
+    def _collapse_whitespace(self, soup: BeautifulSoup):
+        from bs4 import NavigableString
+        # runs of whitespace render as one space under white-space: normal
+        for text in soup.find_all(string=True):
+            # plain text only, not the doctype or comments
+            if type(text) is not NavigableString or text.find_parent(RAW_TEXT_TAGS):
+                continue
+            collapsed = re.sub(r"\s+", " ", text)
+            if collapsed != text:
+                text.replace_with(collapsed)
+
+
+def optimize_html(html: str) -> Tuple[str, Dict[str, any]]:
+    return HtmlOptimizer().optimize(html)
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+from contextlib import contextmanager
+# types
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "jobqueue.sqlite3"))
+# a claimed job whose worker hasn't reported for this long is handed out again
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    state TEXT NOT NULL DEFAULT 'queued',  -- queued | claimed | done | cancelled
+    worker TEXT,
+    created_at REAL NOT NULL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+"""
+
+# SQLITE BACKED JOB QUEUE SHARED BY THE API PROCESS AND WORKERS
+# All methods block, call them through asyncio.to_thread from async code.
+class JobQueue:
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self.path = os.path.abspath(path)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            # WAL lets the api read events while workers write
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+        finally:
+            conn.close()
+
+    # API SIDE
+    def enqueue(self, job_id: str, url: str, options: Optional[Dict] = None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, url, options, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, url, json.dumps(options or {}), time.time()),
+            )
+
+    def cancel(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET state = 'cancelled' WHERE job_id = ? AND state IN ('queued', 'claimed')", (job_id,))
+
+    def read_events(self, after_id: int, limit: int = 500) -> List[Tuple[int, str, Dict]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, job_id, payload FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit),
+            ).fetchall()
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+    def prune_events(self, up_to_id: int):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM events WHERE id <= ?", (up_to_id,))
+
+    def last_event_id(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()
+        return row[0]
+
+    def depth(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    # WORKER SIDE
+    def claim(self, worker: str) -> Optional[Tuple[str, str, Dict]]:
+        now = time.time()
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front so two workers can't claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    """
+                    SELECT job_id, url, options FROM jobs
+                    WHERE state = 'queued' OR (state = 'claimed' AND heartbeat_at < ?)
+                    ORDER BY created_at LIMIT 1
+                    """,
+                    (now - JOB_LEASE_SECONDS,),
+                ).fetchone()
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET state = 'claimed', worker = ?, heartbeat_at = ? WHERE job_id = ?",
+                        (worker, now, row[0]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if not row:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def report(self, job_id: str, payload: Dict) -> bool:
+        # Appends a progress event, returns False if the job was cancelled meanwhile
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            state = conn.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if not state or state[0] == "cancelled":
+                conn.execute("COMMIT")
+                return False
+            conn.execute("INSERT INTO events (job_id, payload) VALUES (?, ?)", (job_id, json.dumps(payload)))
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?", (time.time(), job_id))
+            conn.execute("COMMIT")
+        return True
+
+    def finish(self, job_id: str, payload: Dict) -> bool:
+        # Appends the final event, returns False (and appends nothing) if the job was cancelled meanwhile
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            updated = conn.execute("UPDATE jobs SET state = 'done' WHERE job_id = ? AND state = 'claimed'", (job_id,)).rowcount
+            if updated:
+                conn.execute("INSERT INTO events (job_id, payload) VALUES (?, ?)", (job_id, json.dumps(payload)))
+            conn.execute("COMMIT")
+        return bool(updated)
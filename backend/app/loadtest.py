@@ -0,0 +1,384 @@
+# LOAD TEST HARNESS
+# Drives N virtual clients through POST /api/clone -> ws updates -> GET /result against a
+# local fixture site, with the OpenAI API replaced by a stub served next to it.
+#
+#   python loadtest.py --clients 8 --duration 60                 # starts its own API server
+#   python loadtest.py --target http://127.0.0.1:8000 ...        # existing server, started with
+#                                                                # OPENAI_BASE_URL=<stub>/v1 by you
+#
+# Exits 1 when a threshold (--max-error-rate, --min-jobs-per-minute, --max-p95 name=ms) fails.
+import os
+import sys
+import json
+import math
+import time
+import socket
+import random
+import asyncio
+import argparse
+import subprocess
+import threading
+import httpx
+# types
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ships with uvicorn[standard], only needed to actually run the harness
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+# 1x1 png, served as every fixture image
+PIXEL_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360f8cfc0f01f0005000201b2b3a6"
+    "d40000000049454e44ae426082"
+)
+
+FIXTURE_CSS = """
+body { font-family: Georgia, serif; margin: 0; color: #222; background: #fafafa; }
+header, footer { background: #1d3557; color: #f1faee; padding: 24px; }
+nav a { color: #a8dadc; margin-right: 16px; }
+section { display: grid; grid-template-columns: repeat(3, 1fr); gap: 16px; padding: 32px; }
+.card { background: #fff; border-radius: 8px; padding: 16px; box-shadow: 0 1px 3px rgba(0,0,0,.1); }
+"""
+
+def fixture_page(page: int, sections: int) -> str:
+    cards = "".join(
+        f'<div class="card"><img src="/img/{page}-{i}.png" alt=""><h3>Card {i}</h3><p>Lorem ipsum dolor sit amet {i}.</p></div>'
+        for i in range(6)
+    )
+    body = "".join(f"<section><h2>Section {s}</h2>{cards}</section>" for s in range(sections))
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Fixture page {page}</title>
+<meta name="description" content="Load test fixture">
+<link rel="stylesheet" href="/style.css"></head>
+<body><header><h1>Fixture {page}</h1><nav><a href="/page/{page + 1}">Next</a><a href="/">Home</a></nav></header>
+<main>{body}</main><footer>Footer</footer></body></html>"""
+
+def stub_completion(delay: float, content_bytes: int) -> bytes:
+    sections = "".join(f'<section style="padding:32px;display:grid"><h2>Section {i}</h2></section>' for i in range(content_bytes // 80))
+    html = f"<!DOCTYPE html><html><head><title>stub</title></head><body>{sections}</body></html>"
+    time.sleep(delay)
+    return json.dumps({
+        "id": "chatcmpl-loadtest",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": f"```html\n{html}\n```"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1000, "completion_tokens": len(html) // 4, "total_tokens": 1000 + len(html) // 4},
+    }).encode("utf-8")
+
+
+# FIXTURE SITE + STUB LLM, ONE THREADED HTTP SERVER
+class FixtureServer:
+    def __init__(self, llm_delay: float, llm_bytes: int, sections: int):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, content_type: str, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/style.css":
+                    self._send(200, "text/css", FIXTURE_CSS.encode("utf-8"))
+                elif path.startswith("/img/"):
+                    self._send(200, "image/png", PIXEL_PNG)
+                elif path == "/" or path.startswith("/page/"):
+                    page = int(path.rsplit("/", 1)[-1] or 0) if path != "/" else 0
+                    self._send(200, "text/html; charset=utf-8", fixture_page(page, sections).encode("utf-8"))
+                else:
+                    self._send(404, "text/plain", b"not found")
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.endswith("/chat/completions"):
+                    server.llm_calls += 1
+                    self._send(200, "application/json", stub_completion(llm_delay, llm_bytes))
+                else:
+                    self._send(404, "text/plain", b"not found")
+
+        self.llm_calls = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fixture", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_api_server(fixture: FixtureServer, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"{fixture.url}/v1",
+        "OPENAI_KEY": "loadtest",
+        "ASSET_PUBLIC_BASE": f"http://127.0.0.1:{port}/assets",
+        # the fixture is one host, don't let politeness limits be what we measure
+        "HOST_RATE": os.getenv("HOST_RATE", "1000"),
+        "HOST_BURST": os.getenv("HOST_BURST", "1000"),
+        "HOST_MAX_CONNECTIONS": os.getenv("HOST_MAX_CONNECTIONS", "100"),
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+    )
+
+async def wait_until_up(client: httpx.AsyncClient, target: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f"{target}/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"API at {target} did not come up in {timeout}s")
+
+
+# COLLECTED MEASUREMENTS
+@dataclass
+class Results:
+    latencies: Dict[str, List[float]] = field(default_factory=dict)  # name -> ms
+    errors: Dict[str, int] = field(default_factory=dict)
+    completed: int = 0
+    failed: int = 0
+    rss: List[int] = field(default_factory=list)
+
+    def add(self, name: str, ms: float):
+        self.latencies.setdefault(name, []).append(ms)
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # nearest rank
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# ONE VIRTUAL CLIENT, SUBMIT -> SUBSCRIBE -> FETCH RESULT
+async def run_job(client: httpx.AsyncClient, target: str, url: str, results: Results, job_timeout: float):
+    started = time.perf_counter()
+    response = await client.post(f"{target}/api/clone", json={"url": url})
+    results.add("submit", (time.perf_counter() - started) * 1000)
+    if response.status_code != 200:
+        results.error(f"submit_{response.status_code}")
+        return
+    job_id = response.json()["job_id"]
+
+    ws_url = target.replace("http", "ws", 1) + f"/ws/clone/{job_id}"
+    ws_started = time.perf_counter()
+    status = None
+    try:
+        async with websockets.connect(ws_url, open_timeout=10) as ws:
+            results.add("ws_connect", (time.perf_counter() - ws_started) * 1000)
+            first_update = True
+            async with asyncio.timeout(job_timeout):
+                while status not in ("completed", "failed"):
+                    update = json.loads(await ws.recv())
+                    if first_update:
+                        results.add("ws_first_update", (time.perf_counter() - ws_started) * 1000)
+                        first_update = False
+                    status = update.get("status")
+    except TimeoutError:
+        results.error("job_timeout")
+        return
+    except Exception as e:
+        results.error(f"ws_{type(e).__name__}")
+        return
+
+    results.add("job", (time.perf_counter() - started) * 1000)
+    if status == "failed":
+        results.failed += 1
+        results.error("job_failed")
+        return
+
+    result_started = time.perf_counter()
+    response = await client.get(f"{target}/api/clone/{job_id}/result", headers={"Accept-Encoding": "gzip, br"})
+    results.add("result", (time.perf_counter() - result_started) * 1000)
+    if response.status_code != 200:
+        results.error(f"result_{response.status_code}")
+        return
+
+    results.completed += 1
+    stages = (response.json().get("metadata") or {}).get("stages") or {}
+    for name, timing in (stages.get("stages") or {}).items():
+        results.add(f"stage:{name}", timing["duration_ms"])
+
+    # free server memory, jobs_db would otherwise grow for the whole run
+    await client.delete(f"{target}/api/clone/{job_id}")
+
+async def virtual_client(client: httpx.AsyncClient, target: str, urls: List[str], results: Results, deadline: float, max_jobs: int, job_timeout: float):
+    done = 0
+    while time.monotonic() < deadline and (not max_jobs or done < max_jobs):
+        try:
+            await run_job(client, target, random.choice(urls), results, job_timeout)
+        except httpx.HTTPError as e:
+            results.error(f"http_{type(e).__name__}")
+        done += 1
+
+async def sample_rss(client: httpx.AsyncClient, target: str, results: Results, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            health = (await client.get(f"{target}/health")).json()
+            rss = (health.get("memory") or {}).get("rss_bytes")
+            if rss:
+                results.rss.append(rss)
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), 1.0)
+        except TimeoutError:
+            pass
+
+
+# REPORT + THRESHOLDS
+def build_report(results: Results, elapsed: float, clients: int) -> Dict:
+    attempted = results.completed + results.failed + sum(v for k, v in results.errors.items() if k != "job_failed")
+    return {
+        "clients": clients,
+        "elapsed_s": round(elapsed, 1),
+        "jobs_completed": results.completed,
+        "jobs_per_minute": round(results.completed / elapsed * 60, 2) if elapsed else 0.0,
+        "error_rate": round((attempted - results.completed) / attempted, 4) if attempted else 0.0,
+        "errors": results.errors,
+        "latency_ms": {
+            name: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 1),
+                "p95": round(percentile(values, 95), 1),
+                "p99": round(percentile(values, 99), 1),
+                "max": round(max(values), 1),
+            }
+            for name, values in sorted(results.latencies.items())
+        },
+        "rss_bytes": {"max": max(results.rss), "last": results.rss[-1]} if results.rss else None,
+    }
+
+def check_thresholds(report: Dict, args: argparse.Namespace) -> List[str]:
+    failures = []
+    if report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']} > {args.max_error_rate}")
+    if args.min_jobs_per_minute and report["jobs_per_minute"] < args.min_jobs_per_minute:
+        failures.append(f"jobs/min {report['jobs_per_minute']} < {args.min_jobs_per_minute}")
+    if args.max_rss_mb and report["rss_bytes"] and report["rss_bytes"]["max"] > args.max_rss_mb * 1024 * 1024:
+        failures.append(f"rss {report['rss_bytes']['max'] / 1024 / 1024:.0f}MB > {args.max_rss_mb}MB")
+    for spec in args.max_p95:
+        name, _, limit = spec.partition("=")
+        stats = report["latency_ms"].get(name)
+        if stats is None:
+            failures.append(f"no samples for {name}")
+        elif stats["p95"] > float(limit):
+            failures.append(f"{name} p95 {stats['p95']}ms > {limit}ms")
+    return failures
+
+def print_report(report: Dict):
+    print(f"\n{report['jobs_completed']} jobs in {report['elapsed_s']}s with {report['clients']} clients: "
+          f"{report['jobs_per_minute']} jobs/min, error rate {report['error_rate']}")
+    if report["errors"]:
+        print(f"errors: {report['errors']}")
+    print(f"{'':24}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, stats in report["latency_ms"].items():
+        print(f"{name:24}{stats['count']:>8}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}{stats['max']:>10}")
+    if report["rss_bytes"]:
+        print(f"server rss: max {report['rss_bytes']['max'] / 1024 / 1024:.0f}MB, last {report['rss_bytes']['last'] / 1024 / 1024:.0f}MB")
+
+
+async def run(args: argparse.Namespace) -> int:
+    if websockets is None:
+        print("loadtest needs the websockets package (pip install websockets)")
+        return 2
+
+    fixture = FixtureServer(args.llm_delay_ms / 1000, args.llm_bytes, args.sections)
+    fixture.start()
+    print(f"fixture site and stub LLM at {fixture.url} (OPENAI_BASE_URL={fixture.url}/v1)")
+    server: Optional[subprocess.Popen] = None
+    target = args.target
+    if not target:
+        port = free_port()
+        server = start_api_server(fixture, port)
+        target = f"http://127.0.0.1:{port}"
+
+    # distinct urls so single-flight doesn't collapse the whole run into one job
+    urls = [f"{fixture.url}/page/{i}" for i in range(args.unique_urls)]
+    results = Results()
+    limits = httpx.Limits(max_connections=args.clients * 2 + 4)
+    try:
+        async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+            await wait_until_up(client, target)
+            stop = asyncio.Event()
+            rss_task = asyncio.create_task(sample_rss(client, target, results, stop))
+
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(*(
+                virtual_client(client, target, urls, results, deadline, args.jobs_per_client, args.job_timeout)
+                for _ in range(args.clients)
+            ))
+            elapsed = time.monotonic() - started
+            stop.set()
+            await rss_task
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+        fixture.stop()
+
+    report = build_report(results, elapsed, args.clients)
+    report["llm_calls"] = fixture.llm_calls
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the clone API end to end")
+    parser.add_argument("--target", help="base url of a running API, default starts one")
+    parser.add_argument("--clients", type=int, default=4, help="virtual clients")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to keep submitting")
+    parser.add_argument("--jobs-per-client", type=int, default=0, help="stop each client after this many jobs, 0 = until --duration")
+    parser.add_argument("--job-timeout", type=float, default=180, help="seconds one job may take")
+    parser.add_argument("--unique-urls", type=int, default=20, help="distinct fixture pages to clone")
+    parser.add_argument("--sections", type=int, default=5, help="sections per fixture page")
+    parser.add_argument("--llm-delay-ms", type=float, default=1500, help="stub LLM response time")
+    parser.add_argument("--llm-bytes", type=int, default=8000, help="rough size of the stub LLM's html")
+    parser.add_argument("--json", help="also write the report here")
+    # thresholds
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--min-jobs-per-minute", type=float, default=0)
+    parser.add_argument("--max-rss-mb", type=float, default=0)
+    parser.add_argument("--max-p95", action="append", default=[], metavar="NAME=MS",
+                        help="e.g. result=200, job=30000 or stage:generate=5000, repeatable")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+# types
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", 100)) / 1000
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD_MS", 200)) / 1000
+# debug mode samples the stack of whatever is holding the loop
+LOOP_MONITOR_DEBUG = os.getenv("LOOP_MONITOR_DEBUG", "0") == "1"
+
+# histogram buckets in seconds (prometheus style, cumulative)
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# JOB / STAGE ATTRIBUTION
+# set by the pipeline, read back from the blocked task's context by the watchdog
+current_job: ContextVar[Optional[str]] = ContextVar("current_job", default=None)
+current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+
+@contextmanager
+def job_context(job_id: str):
+    token = current_job.set(job_id)
+    try:
+        yield
+    finally:
+        current_job.reset(token)
+
+@contextmanager
+def stage(name: str):
+    token = current_stage.set(name)
+    try:
+        yield
+    finally:
+        current_stage.reset(token)
+
+
+# MEASURES EVENT LOOP LAG AND CATCHES BLOCKING CALLS
+class LoopMonitor:
+    def __init__(
+        self,
+        interval: float = LOOP_MONITOR_INTERVAL,
+        threshold: float = LOOP_STALL_THRESHOLD,
+        debug: bool = LOOP_MONITOR_DEBUG,
+        max_samples: int = 50,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.ewma_lag = 0.0
+        self.lag_sum = 0.0
+        self.lag_count = 0
+        self.bucket_counts = [0] * len(LAG_BUCKETS)
+        self.stalls = 0
+        self.samples: deque = deque(maxlen=max_samples)
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._sampled_heartbeat: Optional[float] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+
+        if self.debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self._record(max(0.0, loop.time() - start - self.interval))
+            self._heartbeat = time.monotonic()
+
+    def _record(self, lag: float):
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.ewma_lag = 0.9 * self.ewma_lag + 0.1 * lag
+        self.lag_sum += lag
+        self.lag_count += 1
+        for i, bound in enumerate(LAG_BUCKETS):
+            if lag <= bound:
+                self.bucket_counts[i] += 1
+
+        if lag >= self.threshold:
+            self.stalls += 1
+            # the watchdog caught this stall mid-flight, fill in how long it really was
+            if self.samples and self.samples[-1]["heartbeat"] == self._heartbeat:
+                self.samples[-1]["lag_ms"] = round(lag * 1000, 1)
+            logger.warning(f"event loop blocked for {lag * 1000:.0f}ms")
+
+    # DEBUG WATCHDOG THREAD
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 4):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.threshold or self._sampled_heartbeat == heartbeat:
+                continue
+
+            # one sample per stall
+            self._sampled_heartbeat = heartbeat
+            try:
+                self._sample(heartbeat, blocked_for)
+            except Exception as e:
+                logger.error(f"Loop stall sampling failed: {e}")
+
+    def _sample(self, heartbeat: float, blocked_for: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+
+        job_id = stage_name = task_name = None
+        task = asyncio.current_task(self._loop)
+        if task is not None:
+            task_name = task.get_name()
+            # Task.get_context() is 3.12+
+            context = task.get_context() if hasattr(task, "get_context") else None
+            if context is not None:
+                job_id = context.get(current_job)
+                stage_name = context.get(current_stage)
+
+        sample = {
+            "at": time.time(),
+            "heartbeat": heartbeat,
+            "lag_ms": round(blocked_for * 1000, 1),
+            "job_id": job_id,
+            "stage": stage_name,
+            "task": task_name,
+            "stack": traceback.format_stack(frame)[-15:],
+        }
+        self.samples.append(sample)
+        logger.warning(
+            f"event loop blocked {sample['lag_ms']}ms job={job_id} stage={stage_name}\n" + "".join(sample["stack"][-5:])
+        )
+
+    # EXPORT
+    def snapshot(self) -> Dict[str, any]:
+        return {
+            "lag_ms": round(self.last_lag * 1000, 2),
+            "lag_ewma_ms": round(self.ewma_lag * 1000, 2),
+            "lag_max_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+            "stall_threshold_ms": self.threshold * 1000,
+            "debug": self.debug,
+        }
+
+    def stall_samples(self) -> List[Dict[str, any]]:
+        return [{k: v for k, v in sample.items() if k != "heartbeat"} for sample in self.samples]
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP event_loop_lag_seconds Delay between a scheduled wakeup and when the loop ran it",
+            "# TYPE event_loop_lag_seconds histogram",
+        ]
+        for bound, count in zip(LAG_BUCKETS, self.bucket_counts):
+            lines.append(f'event_loop_lag_seconds_bucket{{le="{bound}"}} {count}')
+        lines.append(f'event_loop_lag_seconds_bucket{{le="+Inf"}} {self.lag_count}')
+        lines.append(f"event_loop_lag_seconds_sum {self.lag_sum}")
+        lines.append(f"event_loop_lag_seconds_count {self.lag_count}")
+        lines += [
+            "# HELP event_loop_lag_max_seconds Largest lag seen since start",
+            "# TYPE event_loop_lag_max_seconds gauge",
+            f"event_loop_lag_max_seconds {self.max_lag}",
+            "# HELP event_loop_stalls_total Ticks where lag passed the stall threshold",
+            "# TYPE event_loop_stalls_total counter",
+            f"event_loop_stalls_total {self.stalls}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -3,19 +3,33 @@
 # OPENAI_KEY = ("sk" "-proj-" "H9lOhSho6Xu_WiGCeBPiJ0NBaxzEnbmLS5pJ9M0V66OwCX73Hayqy1UlsdwHC7dsx7rq-fdzl5T3BlbkFJ1_S1WNQV1EW1U7ZKYrehEzubchuFSqc3phLIqqSawKEDv8z5I7sbnuYbySFBmBc-BnUJsisAAA")
 
 import os
+import time
+# measured from here, the heavy libraries (openai, playwright, bs4, httpx) load lazily
+_import_started = time.perf_counter()
 import asyncio
-import uvicorn
 import uuid
-import openai
-from fastapi import FastAPI, WebSocket, BackgroundTasks, HTTPException, Body
+from fastapi import FastAPI, WebSocket, HTTPException, Body, Request, Query
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
-from typing import Dict, List, Optional
-from enum import Enum
+from pydantic import BaseModel, Field, HttpUrl
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
-from webscrape import ScrapingResult, WebScrape
+from dataclasses import asdict
+from webscrape import WebScrape, approx_size
+from assets import AssetPipeline
+from pipeline import CloneOptions, CloneStatus, model_router, run_clone_pipeline, warmup_llm_client
+from jobqueue import JobQueue
+from loopmonitor import LoopMonitor, job_context
+from adaptive import AdaptiveConcurrency
+from politeness import DomainScheduler
+from singleflight import SingleFlight
+from profiling import artifact_path, delete_artifacts, expire_artifacts, list_artifacts
+from encoding import EncodedBody, chunks, dumps, dumps_text
+from export import export_members, referenced_blobs, zip_stream
 from dotenv import load_dotenv
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
 load_dotenv()
 
 # Create FastAPI instance
@@ -34,22 +48,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OpenAI client
-openai_client = openai.OpenAI(
-    api_key=  os.getenv("OPENAI_KEY")
-)
-
 #  MODELS
-class CloneStatus(str, Enum):
-    PENDING = "pending"
-    SCRAPING = "scraping" 
-    PROCESSING = "processing"
-    GENERATING = "generating"
-    COMPLETED = "completed"
-    FAILED = "failed"
-
 class CloneRequest(BaseModel):
     url: str
+    crawl: bool = False  # clone same-origin pages linked from url too
+    max_depth: int = Field(1, ge=0, le=3)
+    max_pages: int = Field(5, ge=1, le=25)
+    share_generation: bool = True  # reuse the LLM output of an identical in-flight job
+    latency_target: Optional[float] = Field(None, gt=0, le=600)  # seconds for generation
+    screenshots: bool = True  # off skips screenshot capture
+    profile: bool = False  # record a python profile and playwright trace as job artifacts
+    # off / record / replay (offline, from the recorded HAR) / cache (replay when fresh), default HAR_MODE
+    har_mode: Optional[Literal["off", "record", "replay", "cache"]] = None
+    # llm, with an instant template preview first / template: the preview only, no LLM cost
+    generator: Literal["llm", "template"] = "llm"
+    # seconds the whole job may take, optional work is cut to meet it. Default JOB_DEADLINE
+    # (unset: none) for single pages and none for crawls, 0 turns it off
+    deadline: Optional[float] = Field(None, ge=0, le=600)
+
+    def options(self) -> CloneOptions:
+        return CloneOptions(
+            crawl=self.crawl,
+            max_depth=self.max_depth,
+            max_pages=self.max_pages,
+            share_generation=self.share_generation,
+            latency_target=self.latency_target,
+            screenshots=self.screenshots,
+            profile=self.profile,
+            har_mode=self.har_mode,
+            generator=self.generator,
+            deadline=self.deadline,
+        )
 
 class CloneJob(BaseModel):
     job_id: str
@@ -60,6 +89,9 @@ class CloneJob(BaseModel):
     completed_at: Optional[str] = None 
     error_message: Optional[str] = None
     result_data: Optional[Dict] = None
+    version: int = 0  # bumped on every change, used as the status ETag
+    page_progress: Optional[Dict] = None  # crawl mode, last page scraped/generated
+    preview_html: Optional[str] = None  # template preview, until the generated page replaces it
     
 
 class CloneResponse(BaseModel):
@@ -67,9 +99,37 @@ class CloneResponse(BaseModel):
     status: CloneStatus
     message: str
 
+# seconds a job waits for its websocket before starting anyway
+WS_ATTACH_GRACE = float(os.getenv("WS_ATTACH_GRACE", 2))
+
+# longest a status long-poll may hold the request
+STATUS_MAX_WAIT = 30
+
+# hand jobs to worker.py processes instead of running them here
+WORKER_MODE = os.getenv("WORKER_MODE", "0") == "1"
+
+# launch the browser and open the http/LLM pools at startup, /health/ready waits for it
+WARMUP = os.getenv("WARMUP", "1") == "1"
+# seconds between attempts while a warmup component keeps failing
+WARMUP_RETRY = float(os.getenv("WARMUP_RETRY", 10))
+
 # db
 jobs_db: Dict[str, CloneJob] = {}
 
+# approx bytes held per job (scrape data while running, result once done)
+job_memory: Dict[str, int] = {}
+
+# finished results, serialized and compressed once: job_id -> {"json": ..., "html": ...}
+result_cache: Dict[str, Dict[str, EncodedBody]] = {}
+
+def process_rss() -> Optional[int]:
+    # resident set size of this process, linux only
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
 #WEBSOCKET MANAGER
 class ConnectionManager:
     def __init__(self):
@@ -90,16 +150,102 @@ class ConnectionManager:
 
         ws = self.active_connections.get(job_id)
         if ws:
-            await ws.send_json(data)
+            await ws.send_text(dumps_text(data))
 
 manager = ConnectionManager()
 
+# Per host token buckets in front of every navigation and asset fetch
+domain_scheduler = DomainScheduler()
+
+# Watches event loop lag, LOOP_MONITOR_DEBUG=1 also samples blocking stacks
+loop_monitor = LoopMonitor()
+
+# How many local browser contexts may run at once, follows memory, cpu and loop lag
+browser_limiter = AdaptiveConcurrency(lag=lambda: loop_monitor.ewma_lag)
+
 # Initialize scraper
 scraper = WebScrape(
     use_browserbase=False,  # Set to True with API key for production
-    browserbase_api_key=os.getenv("BROWSERBASE_KEY")
+    browserbase_api_key=os.getenv("BROWSERBASE_KEY"),
+    scheduler=domain_scheduler,
+    concurrency=browser_limiter
 )
 
+# Downloads images/fonts/icons/stylesheets into a shared on-disk store
+asset_pipeline = AssetPipeline(scheduler=domain_scheduler)
+
+# Identical in-flight jobs attach to one scrape/generation instead of repeating it
+flights = SingleFlight()
+
+# running process_clone_job tasks, so a delete can cancel them
+job_tasks: Dict[str, asyncio.Task] = {}
+
+# sqlite queue shared with worker processes
+job_queue = JobQueue() if WORKER_MODE else None
+
+# STARTUP LIFECYCLE
+# import time, per component warmup timings and whether the instance can take jobs yet
+startup_state: Dict[str, any] = {
+    "import_ms": round(IMPORT_SECONDS * 1000, 1),
+    "warmup_enabled": WARMUP,
+    "warmup_ms": None,
+    "components": {},
+    "ready": False,
+}
+warmup_task: Optional[asyncio.Task] = None
+
+async def warm_component(name: str, warm):
+    # retried until it comes up, readiness stays false meanwhile
+    attempts = 0
+    while True:
+        attempts += 1
+        started = time.perf_counter()
+        try:
+            await warm()
+            startup_state["components"][name] = {"ms": round((time.perf_counter() - started) * 1000, 1), "attempts": attempts, "error": None}
+            return
+        except Exception as e:
+            startup_state["components"][name] = {"ms": None, "attempts": attempts, "error": str(e)}
+            print(f"Warmup of {name} failed (attempt {attempts}): {e}")
+            await asyncio.sleep(WARMUP_RETRY)
+
+async def warmup():
+    started = time.perf_counter()
+    # the api only enqueues in worker mode, workers warm their own browser
+    components = {} if WORKER_MODE else {
+        "browser": scraper.warmup,
+        "http_pool": asset_pipeline.warmup,
+        "llm_client": warmup_llm_client,
+    }
+    await asyncio.gather(*(warm_component(name, warm) for name, warm in components.items()))
+    startup_state["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    startup_state["ready"] = True
+    print(f"Ready: imports {startup_state['import_ms']}ms, warmup {startup_state['warmup_ms']}ms")
+
+@app.on_event("startup")
+async def startup():
+    global warmup_task
+    loop_monitor.start()
+    browser_limiter.start()
+    asyncio.create_task(expire_profiles())
+    asyncio.create_task(sweep_assets())
+    if WORKER_MODE:
+        asyncio.create_task(relay_worker_events())
+    if WARMUP:
+        # in the background, liveness answers while the browser launches
+        warmup_task = asyncio.create_task(warmup())
+    else:
+        startup_state["ready"] = True
+
+@app.on_event("shutdown")
+async def shutdown():
+    if warmup_task is not None:
+        warmup_task.cancel()
+    loop_monitor.stop()
+    browser_limiter.stop()
+    await asset_pipeline.close()
+    await scraper.close()
+
 ################# ROOT
 @app.get("/")
 async def root():
@@ -109,14 +255,17 @@ async def root():
         "endpoints": {
             "start_clone": "POST /api/clone",
             "check_status": "GET /api/clone/{job_id}/status", 
-            "get_result": "GET /api/clone/{job_id}/result"
+            "get_result": "GET /api/clone/{job_id}/result",
+            "get_result_html": "GET /api/clone/{job_id}/result/html",
+            "export": "GET /api/clone/{job_id}/export",
+            "get_page": "GET /api/clone/{job_id}/pages/{path}"
         }
     }
 #################
 
 # clone website
 @app.post("/api/clone", response_model=CloneResponse) 
-async def clone_url(clone_request: CloneRequest, background_tasks: BackgroundTasks):
+async def clone_url(clone_request: CloneRequest):
     try:
         job_id = str(uuid.uuid4())
         
@@ -132,7 +281,12 @@ async def clone_url(clone_request: CloneRequest, background_tasks: BackgroundTas
         jobs_db[job_id] = job
         
         # Start background processing
-        background_tasks.add_task(process_clone_job, job_id, str(clone_request.url))
+        if WORKER_MODE:
+            await asyncio.to_thread(job_queue.enqueue, job_id, str(clone_request.url), asdict(clone_request.options()))
+        else:
+            task = asyncio.create_task(process_clone_job(job_id, str(clone_request.url), clone_request.options()))
+            job_tasks[job_id] = task
+            task.add_done_callback(lambda _: job_tasks.pop(job_id, None))
         
         return CloneResponse(
             job_id=job_id,
@@ -143,302 +297,252 @@ async def clone_url(clone_request: CloneRequest, background_tasks: BackgroundTas
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to start cloning: {str(e)}")
 
-# PROCESS CLONE JOB
-async def process_clone_job(job_id: str, url: str):
+# JOB UPDATES
+# every change bumps job.version (the status ETag) and wakes long-pollers
+job_changed: Dict[str, asyncio.Event] = {}
+
+async def update_job(job_id: str, **fields):
+    job = jobs_db.get(job_id)
+    if job is None:
+        return
+    
+    for key, value in fields.items():
+        setattr(job, key, value)
+    job.version += 1
+    
+    # wake anyone waiting on the previous version
+    event = job_changed.pop(job_id, None)
+    if event:
+        event.set()
+    
+    update = {"status": job.status.value, "progress": job.progress}
+    if job.error_message:
+        update["error_message"] = job.error_message
+    if job.page_progress:
+        update["page"] = job.page_progress
+    # sent once, with the update that set it
+    if fields.get("preview_html"):
+        update["preview_html"] = fields["preview_html"]
+    await manager.send_update(job_id, update)
+
+async def report_progress(
+    job_id: str,
+    status: CloneStatus,
+    progress: int,
+    memory_bytes: Optional[int] = None,
+    page_progress: Optional[Dict] = None,
+    preview_html: Optional[str] = None,
+):
+    # Applies a pipeline report, from this process or relayed from a worker
+    # a worker may still relay progress for a job deleted meanwhile, nothing would free its entries
+    if job_id not in jobs_db:
+        return
+    if memory_bytes is not None:
+        job_memory[job_id] = memory_bytes
+    fields = {"status": status, "progress": progress}
+    if page_progress is not None:
+        fields["page_progress"] = page_progress
+    if preview_html is not None:
+        fields["preview_html"] = preview_html
+    await update_job(job_id, **fields)
+
+async def wait_for_job_change(job_id: str, timeout: float) -> bool:
+    event = job_changed.setdefault(job_id, asyncio.Event())
     try:
-        while job_id not in manager.active_connections:
-            await asyncio.sleep(0.1)
-            
-        jobs_db[job_id].status = CloneStatus.SCRAPING
-        jobs_db[job_id].progress = 10
-        
-        await manager.send_update(
-            job_id,
-            {
-                "status": jobs_db[job_id].status.value,
-                "progress": jobs_db[job_id].progress,
-            }
-        )
-        
-        # Step 1: Scrape the website
-        scraping_result = await scraper.scrape_website(url)
-        
-        if not scraping_result.success:
-            jobs_db[job_id].status = CloneStatus.FAILED
-            jobs_db[job_id].progress = 0
-            jobs_db[job_id].error_message = scraping_result.error_message
-            
-            await manager.send_update(
-                job_id,
-                {
-                    "status": jobs_db[job_id].status.value,
-                    "progress": jobs_db[job_id].progress,
-                    "error_message": jobs_db[job_id].error_message 
-                }
-            )
-                    
-            return
-        
-        # Update progress
-        jobs_db[job_id].progress = 50
-        jobs_db[job_id].status = CloneStatus.PROCESSING
-        
-        await manager.send_update(
-            job_id,
-            {
-                "status": jobs_db[job_id].status.value,
-                "progress": jobs_db[job_id].progress,
-            }
-        )
-        
-        # Step 2: Process the scraped data for LLM
-        processed_data = await process_scraping_data(scraping_result)
-        
-        # Update progress
-        jobs_db[job_id].progress = 70
-        jobs_db[job_id].status = CloneStatus.GENERATING
-        
-        await manager.send_update(
-            job_id,
-            {
-                "status": jobs_db[job_id].status.value,
-                "progress": jobs_db[job_id].progress,
-            }
-        )
-        
-        # Step 3: Generate HTML with LLM (placeholder for now)
-        generated_html = await generate_html_with_llm(processed_data)
-        
-        # Step 4: Update job as completed
-        jobs_db[job_id].status = CloneStatus.COMPLETED
-        jobs_db[job_id].progress = 100
-        
-        await manager.send_update(
-            job_id,
-            {
-                "status": jobs_db[job_id].status.value,
-                "progress": jobs_db[job_id].progress,
-            }
-        )
-                    
-        jobs_db[job_id].completed_at = datetime.now()
-        jobs_db[job_id].result_data = {
-            "original_url": url,
-            "generated_html": generated_html,
-            "scraping_metadata": {
-            "colors_found": len(scraping_result.color_palette),
-            "images_found": len(scraping_result.assets.get("images", [])),
-            "fonts_found": len(scraping_result.typography.get("fonts", [])),
-            "screenshots_taken": list(scraping_result.screenshots.keys()),
-            "layout_type": scraping_result.layout_info.get("type"),
-            "dominant_color": scraping_result.color_palette[0] if scraping_result.color_palette else None,
-            "title": scraping_result.metadata.get("title"),
-            "description": scraping_result.metadata.get("description"),
-            }
-        }
-        
-    except Exception as e:
-        # Handle any errors
-        jobs_db[job_id].status = CloneStatus.FAILED
-        jobs_db[job_id].progress = 0
-        jobs_db[job_id].error_message = str(e)
-        jobs_db[job_id].completed_at = datetime.now()
-        
-        await manager.send_update(
-            job_id,
-            {
-                "status": jobs_db[job_id].status.value,
-                "progress": jobs_db[job_id].progress,
-                "error_message": jobs_db[job_id].error_message 
-            }
-        )
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+async def fail_job(job_id: str, error_message: str):
+    job_memory.pop(job_id, None)
+    await update_job(
+        job_id,
+        status=CloneStatus.FAILED,
+        progress=0,
+        error_message=error_message,
+        completed_at=str(datetime.now()),
+    )
 
-async def process_scraping_data(scraping_result: ScrapingResult) -> Dict:
-    # send to llm to re-create
-    await asyncio.sleep(1)
+async def complete_job(job_id: str, result_data: Dict):
+    # deleted while it ran, nothing would ever free the cached result
+    if job_id not in jobs_db:
+        return
+    # a finished result never changes, so encode it once off the loop
+    encoded = await asyncio.to_thread(encode_result, job_id, result_data)
+    if job_id not in jobs_db:
+        return
+    result_cache[job_id] = encoded
+    job_memory[job_id] = approx_size(result_data) + sum(body.size() for body in encoded.values())
     
-    return {
-        "url": scraping_result.url,
-        "screenshots": scraping_result.screenshots,
-        "dom_structure": scraping_result.dom_structure[:10000],  # Limit size
-        "color_palette": scraping_result.color_palette,
-        "typography": scraping_result.typography,
-        "layout_info": scraping_result.layout_info,
-        "css_info": scraping_result.extracted_css,
-        "metadata": scraping_result.metadata,
+    # result is stored before COMPLETED goes out so /result never races it
+    await update_job(
+        job_id,
+        status=CloneStatus.COMPLETED,
+        progress=100,
+        completed_at=str(datetime.now()),
+        result_data=result_data,
+        preview_html=None,
+    )
+
+def result_payload(job_id: str, result_data: Dict) -> Dict:
+    result = {
+        "job_id": job_id,
+        "original_url": result_data["original_url"],
+        "generated_html": result_data["generated_html"],
+        "metadata": result_data["scraping_metadata"]
     }
     
+    # crawl mode, page list only, html is served per page
+    if result_data.get("pages"):
+        result["pages"] = {
+            path: {"url": page["url"], "title": page["title"], "depth": page["depth"]}
+            for path, page in result_data["pages"].items()
+        }
+    return result
+
+def encode_result(job_id: str, result_data: Dict) -> Dict[str, EncodedBody]:
+    return {
+        "json": EncodedBody.build(dumps(result_payload(job_id, result_data)), "application/json"),
+        "html": EncodedBody.build(result_data["generated_html"].encode("utf-8"), "text/html; charset=utf-8"),
+    }
+
+def encoded_response(request: Request, body: EncodedBody, stream: bool = False) -> Response:
+    # Precomputed body with a strong ETag, compressed if the client accepts it
+    headers = {
+        "ETag": body.etag,
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Vary": "Accept-Encoding",
+    }
+    if request.headers.get("if-none-match") == body.etag:
+        return Response(status_code=304, headers=headers)
     
-async def generate_html_with_llm(processed_data: Dict) -> str:
-    # generate the website with llm
+    encoding, content = body.negotiate(request.headers.get("accept-encoding"))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    if stream:
+        headers["Content-Length"] = str(len(content))
+        return StreamingResponse(chunks(content), media_type=body.media_type, headers=headers)
+    return Response(content, media_type=body.media_type, headers=headers)
+
+# PROCESS CLONE JOB
+async def process_clone_job(job_id: str, url: str, options: CloneOptions):
+    async def report(status: CloneStatus, progress: int, **extra):
+        await report_progress(job_id, status, progress, **extra)
     
     try:
-        # Prepare the prompt with scraped data
-        prompt = create_html_generation_prompt(processed_data)
-        
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",  # or "gpt-3.5-turbo" for cheaper option
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are an expert web developer who recreates websites based on scraped data. 
-                    Generate clean, modern HTML with inline CSS that closely matches the original design.
-                    Make it responsive and professional. Only return the HTML code, no explanations."""
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            max_tokens=4000,
-            temperature=0.3
-        )
-        
-        generated_html = response.choices[0].message.content
-        
-        # Clean up the response (remove markdown code blocks if present)
-        if "```html" in generated_html:
-            generated_html = generated_html.split("```html")[1].split("```")[0].strip()
-        elif "```" in generated_html:
-            generated_html = generated_html.split("```")[1].split("```")[0].strip()
+        # the deadline counts from here, the wait for a websocket is part of the job's time
+        with job_context(job_id), options.deadline_context():
+            # give a websocket client a moment to attach, pollers don't need one
+            for _ in range(int(WS_ATTACH_GRACE / 0.1)):
+                if job_id in manager.active_connections:
+                    break
+                await asyncio.sleep(0.1)
             
-        return generated_html
+            result_data = await run_clone_pipeline(url, scraper, asset_pipeline, report, options, flights)
+        await complete_job(job_id, result_data)
         
     except Exception as e:
-        print(f"Error generating HTML with OpenAI: {e}")
-        return create_fallback_html(processed_data)
-
-def create_html_generation_prompt(processed_data: Dict) -> str:    
-    # Extract key information
-    url = processed_data.get('url', '')
-    colors = processed_data.get('color_palette', [])
-    fonts = processed_data.get('typography', {}).get('fonts', [])
-    layout_info = processed_data.get('layout_info', {})
-    metadata = processed_data.get('metadata', {})
-    dom_structure = processed_data.get('dom_structure', '')
+        # Handle any errors
+        await fail_job(job_id, str(e))
+
+# WORKER EVENTS
+# Workers append progress to the queue, this applies it to jobs_db and the websockets
+async def relay_worker_events():
+    last_id = await asyncio.to_thread(job_queue.last_event_id)
+    while True:
+        try:
+            events = await asyncio.to_thread(job_queue.read_events, last_id)
+            for event_id, job_id, payload in events:
+                last_id = event_id
+                if payload["type"] == "progress":
+                    await report_progress(job_id, CloneStatus(payload["status"]), payload["progress"], **payload.get("extra", {}))
+                elif payload["type"] == "completed":
+                    await complete_job(job_id, payload["result_data"])
+                elif payload["type"] == "failed":
+                    await fail_job(job_id, payload["error_message"])
+            
+            if events:
+                await asyncio.to_thread(job_queue.prune_events, last_id)
+            else:
+                await asyncio.sleep(0.1)
+        except Exception as e:
+            print(f"Relaying worker events failed: {e}")
+            await asyncio.sleep(1)
+
+# status, cheap to poll
+@app.get("/api/clone/{job_id}/status")
+async def get_clone_status(job_id: str, request: Request, wait: float = Query(0, ge=0, le=STATUS_MAX_WAIT)):
+    if job_id not in jobs_db:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    # Include screenshot data if available
-    screenshot_info = ""
-    if processed_data.get('screenshots'):
-        screenshot_info = f"Screenshots available: {list(processed_data['screenshots'].keys())}"
+    job = jobs_db[job_id]
+    etag = f'"{job.version}"'
+    client_etag = request.headers.get("if-none-match")
+    finished = job.status in (CloneStatus.COMPLETED, CloneStatus.FAILED)
     
-    prompt = f"""
-        Please recreate this website as HTML with inline CSS based on the following scraped data:
-
-        **Original URL:** {url}
-
-        **Page Metadata:**
-        - Title: {metadata.get('title', 'N/A')}
-        - Description: {metadata.get('description', 'N/A')}
-
-        **Design Elements:**
-        - Color Palette: {colors[:5]}  # Top 5 colors
-        - Fonts: {fonts[:3]}  # Top 3 fonts
-        - Layout Type: {layout_info.get('type', 'unknown')}
-
-        **DOM Structure Preview:**
-        {dom_structure[:2000]}...
-
-        **Screenshots:** {screenshot_info}
-
-        **Requirements:**
-        1. Create a complete HTML document with inline CSS
-        2. Use the extracted colors and fonts
-        3. Make it responsive and modern
-        4. Include proper semantic HTML structure
-        5. Match the layout and visual hierarchy as closely as possible
-        6. Add hover effects and smooth transitions
-        7. Ensure cross-browser compatibility
-
-        Generate clean, professional HTML that captures the essence and design of the original website as accurately as possible.
-        """
+    # long-poll: hold the request until the version the client has changes
+    if wait and client_etag == etag and not finished:
+        await wait_for_job_change(job_id, wait)
+        job = jobs_db.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        etag = f'"{job.version}"'
     
-    return prompt
-
-#FALLBACK HTML IF GENERATION FAILS
-def create_fallback_html(processed_data: Dict) -> str:
-    colors = processed_data.get('color_palette', ['#ffffff', '#000000'])
-    fonts = processed_data.get('typography', {}).get('fonts', ['Arial', 'sans-serif'])
-    title = processed_data.get('metadata', {}).get('title', 'Cloned Website')
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if client_etag == etag:
+        return Response(status_code=304, headers=headers)
     
-    return f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>{title}</title>
-            <style>
-                * {{
-                    margin: 0;
-                    padding: 0;
-                    box-sizing: border-box;
-                }}
-                
-                body {{
-                    font-family: {fonts[0] if fonts else 'Arial'}, sans-serif;
-                    background-color: {colors[0] if colors else '#ffffff'};
-                    color: {colors[1] if len(colors) > 1 else '#000000'};
-                    line-height: 1.6;
-                    padding: 20px;
-                }}
-                
-                .container {{
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                
-                .header {{
-                    text-align: center;
-                    margin-bottom: 40px;
-                    padding: 40px 0;
-                    background: linear-gradient(135deg, {colors[0] if colors else '#f0f0f0'}, {colors[1] if len(colors) > 1 else '#e0e0e0'});
-                    border-radius: 10px;
-                }}
-                
-                h1 {{
-                    font-size: 2.5rem;
-                    margin-bottom: 10px;
-                    color: {colors[2] if len(colors) > 2 else '#333'};
-                }}
-                
-                .content {{
-                    background: white;
-                    padding: 30px;
-                    border-radius: 10px;
-                    box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>{title}</h1>
-                    <p>Successfully cloned from: {processed_data.get('url', '')}</p>
-                </div>
-                
-                <div class="content">
-                    <h2>Website Clone Generated</h2>
-                    <p>This is a basic clone. The OpenAI API would generate more sophisticated HTML based on the scraped data.</p>
-                    
-                    <div style="margin-top: 20px;">
-                        <h3>Detected Elements:</h3>
-                        <ul>
-                            <li>Colors: {len(colors)} found</li>
-                            <li>Fonts: {len(fonts)} found</li>
-                            <li>Original URL: {processed_data.get('url', '')}</li>
-                        </ul>
-                    </div>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+    return JSONResponse(
+        {
+            "job_id": job_id,
+            "status": job.status.value,
+            "progress": job.progress,
+            "version": job.version,
+            "created_at": job.created_at,
+            "completed_at": job.completed_at,
+            "error_message": job.error_message,
+            "page": job.page_progress,
+            # GET /preview has an interim page until the job completes
+            "preview": job.preview_html is not None,
+        },
+        headers=headers,
+    )
 
 # result
 @app.get("/api/clone/{job_id}/result")
-async def get_clone_result(job_id: str):
+async def get_clone_result(job_id: str, request: Request):
+    return encoded_response(request, completed_result(job_id)["json"])
+
+# the generated page itself, streamed as text/html
+@app.get("/api/clone/{job_id}/result/html")
+async def get_clone_result_html(job_id: str, request: Request):
+    return encoded_response(request, completed_result(job_id)["html"], stream=True)
+
+# template preview of a running job, replaced by /result/html once it completes
+@app.get("/api/clone/{job_id}/preview")
+async def get_clone_preview(job_id: str):
+    if job_id not in jobs_db:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    preview_html = jobs_db[job_id].preview_html
+    if preview_html is None:
+        raise HTTPException(status_code=404, detail="No preview available")
+    return HTMLResponse(preview_html, headers={"Cache-Control": "no-cache"})
+
+# everything as one zip: pages, screenshots, scraped css/typography/layout and assets
+# streamed from the asset store as it is zipped, nothing is buffered or written to disk
+@app.get("/api/clone/{job_id}/export")
+async def export_clone(job_id: str):
+    completed_result(job_id)
+    members = export_members(job_id, jobs_db[job_id].result_data, asset_pipeline.store, asset_pipeline.public_base)
+    return StreamingResponse(
+        zip_stream(members),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="clone-{job_id}.zip"'},
+    )
+
+def completed_result(job_id: str) -> Dict[str, EncodedBody]:
     if job_id not in jobs_db:
         raise HTTPException(status_code=404, detail="Job not found")
     
@@ -447,15 +551,77 @@ async def get_clone_result(job_id: str):
     if job.status != CloneStatus.COMPLETED:
         raise HTTPException(status_code=400, detail=f"Job not completed. Current status: {job.status}")
     
-    if not job.result_data:
+    if job_id not in result_cache:
         raise HTTPException(status_code=500, detail="No result data available")
     
-    return{
-        "job_id": job_id,
-        "original_url": job.result_data["original_url"],
-        "generated_html": job.result_data["generated_html"],
-        "metadata": job.result_data["scraping_metadata"]
-    }
+    return result_cache[job_id]
+
+# crawl mode, one generated page of the site
+# pages link to each other relatively, so they browse fine from here
+@app.get("/api/clone/{job_id}/pages/{path}")
+async def get_clone_page(job_id: str, path: str):
+    if job_id not in jobs_db:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job = jobs_db[job_id]
+    pages = (job.result_data or {}).get("pages") or {}
+    if path not in pages:
+        raise HTTPException(status_code=404, detail="Page not found")
+    
+    return HTMLResponse(pages[path]["generated_html"])
+
+# profiling artifacts of a job started with profile=true
+@app.get("/api/clone/{job_id}/artifacts")
+async def get_clone_artifacts(job_id: str):
+    if job_id not in jobs_db:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "artifacts": await asyncio.to_thread(list_artifacts, job_id)}
+
+@app.get("/api/clone/{job_id}/artifacts/{name}")
+async def get_clone_artifact(job_id: str, name: str):
+    if job_id not in jobs_db:
+        raise HTTPException(status_code=404, detail="Job not found")
+    path = artifact_path(job_id, name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return FileResponse(path, filename=name)
+
+# profiles are for debugging, they don't outlive PROFILE_TTL_HOURS
+async def expire_profiles():
+    while True:
+        try:
+            removed = await asyncio.to_thread(expire_artifacts)
+            if removed:
+                print(f"Expired {removed} job profiles")
+        except Exception as e:
+            print(f"Expiring profiles failed: {e}")
+        await asyncio.sleep(3600)
+
+# the asset store is shared by every job, blobs only finished jobs' results use are kept
+# once it grows past ASSET_STORE_MAX_BYTES
+async def sweep_assets():
+    while True:
+        try:
+            referenced = set()
+            for job in list(jobs_db.values()):
+                if job.result_data:
+                    referenced |= referenced_blobs(job.result_data, asset_pipeline.public_base)
+            removed = await asyncio.to_thread(asset_pipeline.store.sweep, referenced)
+            if removed:
+                print(f"Swept {removed} unused assets")
+        except Exception as e:
+            print(f"Sweeping assets failed: {e}")
+        await asyncio.sleep(3600)
+
+# bundled assets
+@app.get("/assets/{name}")
+async def get_asset(name: str):
+    path = asset_pipeline.store.blob_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    
+    # names are content hashes so they never change
+    return FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
 
 # delete job
 @app.delete("/api/clone/{job_id}")
@@ -464,6 +630,18 @@ async def delete_clone_job(job_id: str):
         raise HTTPException(status_code=404, detail="Job not found")
     
     del jobs_db[job_id]
+    job_memory.pop(job_id, None)
+    result_cache.pop(job_id, None)
+    await asyncio.to_thread(delete_artifacts, job_id)
+    # other jobs attached to the same work keep it running
+    task = job_tasks.pop(job_id, None)
+    if task:
+        task.cancel()
+    if WORKER_MODE:
+        await asyncio.to_thread(job_queue.cancel, job_id)
+    event = job_changed.pop(job_id, None)
+    if event:
+        event.set()
     return {"message": f"Job {job_id} deleted successfully"}
         
 
@@ -473,9 +651,53 @@ async def health_check():
     return {
         "status": "healthy", 
         "service": "website-cloner-api",
-        "active_jobs": len([job for job in jobs_db.values() if job.status not in [CloneStatus.COMPLETED, CloneStatus.FAILED]])
+        "active_jobs": len([job for job in jobs_db.values() if job.status not in [CloneStatus.COMPLETED, CloneStatus.FAILED]]),
+        "memory": {
+            "rss_bytes": process_rss(),
+            "jobs_bytes": sum(job_memory.values()),
+            "per_job_bytes": dict(job_memory),
+        },
+        "queue": await asyncio.to_thread(job_queue.depth) if WORKER_MODE else None,
+        "event_loop": loop_monitor.snapshot(),
+        "hosts": domain_scheduler.snapshot(),
+        "singleflight": flights.snapshot(),
+        "remote_browser": scraper.remote_pool.snapshot() if scraper.remote_pool else None,
+        "har": {"mode": scraper.har_mode, **scraper.har_store.snapshot()},
+        "browser_concurrency": browser_limiter.snapshot(),
+        "domain_profiles": scraper.profiles.snapshot(),
+        "startup": startup_state,
     }
 
+# liveness: the process and its loop answer, never depends on the browser
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+# readiness: 503 until the warm pool is up, load balancers hold traffic until then
+@app.get("/health/ready")
+async def readiness():
+    return JSONResponse(
+        status_code=200 if startup_state["ready"] else 503,
+        content={"ready": startup_state["ready"], "startup": startup_state},
+    )
+
+# recent model routing decisions and how they turned out
+@app.get("/debug/routing")
+async def routing_decisions(limit: int = Query(20, ge=1, le=200)):
+    return model_router.snapshot(limit)
+
+# prometheus metrics
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return loop_monitor.prometheus()
+
+# stacks captured while the event loop was blocked (LOOP_MONITOR_DEBUG=1)
+@app.get("/debug/loop-stalls")
+async def loop_stalls():
+    if not loop_monitor.debug:
+        raise HTTPException(status_code=404, detail="Loop monitor debug mode is off")
+    return {"samples": loop_monitor.stall_samples()}
+
 # websocket
 @app.websocket("/ws/clone/{job_id}")
 async def websocket_endpoint(websocket: WebSocket, job_id: str):
@@ -495,8 +717,9 @@ async def websocket_endpoint(websocket: WebSocket, job_id: str):
 
 # RUN APPLICATION
 def main():
+    import uvicorn
     uvicorn.run(
-        "hello:app",
+        "main:app",
         host="127.0.0.1",
         port=8000,
         reload=True
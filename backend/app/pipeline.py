@@ -0,0 +1,607 @@
+import os
+import time
+import asyncio
+import threading
+from enum import Enum
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, replace
+from webscrape import ScrapingResult, WebScrape
+from assets import AssetPipeline
+from crawler import CrawledPage, SiteCrawler, normalize_url, rewrite_page_links
+from singleflight import SingleFlight
+from routing import ModelRouter, RouteDecision
+from loopmonitor import current_job, stage
+from profiling import list_artifacts, profile_job
+from stagegraph import StageGraph
+from htmlopt import extract_html, optimize_html
+from preview import render_preview
+from deadline import (
+    DEADLINE_BACKSTOP_RESERVE, DEADLINE_COMPACT_PROMPT, DEADLINE_FINISH_RESERVE, DEADLINE_GENERATION_RESERVE, DEADLINE_MIN_LLM, JOB_DEADLINE,
+    current_deadline, job_deadline,
+)
+from export import build_manifest
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# OpenAI client, built on first use (the openai import alone is slow)
+_openai_client = None
+_openai_lock = threading.Lock()
+
+def get_openai_client():
+    global _openai_client
+    with _openai_lock:
+        if _openai_client is None:
+            import openai
+            _openai_client = openai.OpenAI(
+                api_key=  os.getenv("OPENAI_KEY")
+            )
+    return _openai_client
+
+async def warmup_llm_client():
+    # import openai and build its http pool off the loop
+    await asyncio.to_thread(get_openai_client)
+
+# Picks model, max_tokens and timeout from page complexity
+model_router = ModelRouter()
+
+# JOB STATUS
+class CloneStatus(str, Enum):
+    PENDING = "pending"
+    SCRAPING = "scraping" 
+    PROCESSING = "processing"
+    GENERATING = "generating"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+# report(status, progress, **extra) -> pushes progress to wherever the job lives
+Reporter = Callable[..., Awaitable[None]]
+
+class CloneFailed(Exception):
+    pass
+
+# PER JOB OPTIONS
+@dataclass
+class CloneOptions:
+    crawl: bool = False  # follow same-origin links and clone several pages
+    max_depth: int = 1
+    max_pages: int = 5
+    # identical in-flight jobs share the LLM result too, not just the scrape
+    share_generation: bool = True
+    # seconds the LLM step should take, the router trades model size and output for it
+    latency_target: Optional[float] = None
+    # off skips the screenshot stage entirely, generation never needs it
+    screenshots: bool = True
+    # sample the job's python stacks and trace its browser session, stored as job artifacts
+    profile: bool = False
+    # HAR record/replay for the scrape (harstore.HAR_MODES), None uses the scraper's default
+    har_mode: Optional[str] = None
+    # llm: the template preview is pushed right after the scrape and replaced by the LLM page
+    # template: the preview is the result, no LLM call at all
+    generator: str = "llm"
+    # seconds the whole job may take, optional work is cut to meet it. None: JOB_DEADLINE (off
+    # by default) for single pages, no deadline for crawls. 0: no deadline.
+    deadline: Optional[float] = None
+
+    def deadline_seconds(self) -> Optional[float]:
+        if self.deadline is not None:
+            return self.deadline or None
+        return None if self.crawl else (JOB_DEADLINE or None)
+
+    def deadline_context(self):
+        # the job's deadline as current_deadline, template jobs keep nothing back for an LLM call
+        return job_deadline(self.deadline_seconds(), 0.0 if self.generator == "template" else DEADLINE_GENERATION_RESERVE)
+
+    def flight_key(self, url: str) -> Tuple:
+        # jobs with the same key can attach to each other's work. The deadline is part of it:
+        # shared work runs under its creator's deadline and is cut down to fit it.
+        if self.crawl:
+            return (normalize_url(url), "crawl", self.max_depth, self.max_pages, self.screenshots, self.deadline_seconds())
+        return (normalize_url(url), self.screenshots, self.har_mode, self.deadline_seconds())
+
+# generated pages handled at once in crawl mode
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", 2))
+
+async def shared(flights: Optional[SingleFlight], key: Tuple, work: Callable[[Reporter], Awaitable], report: Optional[Reporter]):
+    # Runs work once per key across concurrent jobs when coalescing is on
+    if flights is None:
+        return await work(report)
+    return await flights.do(key, work, report)
+
+# SCRAPE -> PROCESS -> GENERATE, shared by the api process and workers
+async def run_clone_pipeline(
+    url: str,
+    scraper: WebScrape,
+    asset_pipeline: AssetPipeline,
+    report: Reporter,
+    options: Optional[CloneOptions] = None,
+    flights: Optional[SingleFlight] = None,
+) -> Dict:
+    options = options or CloneOptions()
+    if options.profile:
+        return await run_profiled(url, scraper, asset_pipeline, report, options)
+    if options.crawl:
+        return await run_crawl_pipeline(url, scraper, asset_pipeline, report, options, flights)
+    
+    await report(CloneStatus.SCRAPING, 10)
+    key = options.flight_key(url)
+    deadline = current_deadline.get()
+    # screenshots finish in the background after extraction
+    pending_screenshots: Dict[str, asyncio.Task] = {}
+    # the scrape, for a template result when the deadline hits with stages still running
+    scraped: Dict[str, ScrapingResult] = {}
+    
+    # Step 1: Scrape the website, returns once the page is extracted
+    async def scrape() -> ScrapingResult:
+        scraping_result, screenshots_task = await shared(
+            flights,
+            ("scrape", key),
+            lambda _: scraper.scrape_staged(url, screenshots=options.screenshots, links=False, har_mode=options.har_mode),
+            report,
+        )
+        if not scraping_result.success:
+            raise CloneFailed(scraping_result.error_message)
+        if screenshots_task is not None:
+            pending_screenshots["task"] = screenshots_task
+        scraped["result"] = scraping_result
+        
+        # Update progress
+        await report(CloneStatus.PROCESSING, 50, memory_bytes=scraping_result.memory_usage())
+        return scraping_result
+    
+    async def screenshots(scraping_result: ScrapingResult):
+        # shielded, other jobs may share the same screenshots
+        if "task" not in pending_screenshots:
+            return
+        if deadline is None:
+            await asyncio.shield(pending_screenshots["task"])
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(pending_screenshots["task"]), deadline.remaining(DEADLINE_FINISH_RESERVE))
+        except asyncio.TimeoutError:
+            # they still attach to the result when done, the job just doesn't wait
+            deadline.degrade("screenshots", "not waited for")
+    
+    # Step 2+3: the prompt only needs extracted data, so generation overlaps the screenshots
+    async def generate(scraping_result: ScrapingResult) -> Tuple[str, RouteDecision]:
+        return await shared(
+            flights if options.share_generation else None,
+            ("generate", key, options.latency_target, options.generator),
+            lambda rep: generate_html(scraping_result, rep, options.latency_target, options.generator),
+            report,
+        )
+    
+    # interim result while the LLM works, the client shows it until the job completes
+    async def preview(scraping_result: ScrapingResult):
+        await report(CloneStatus.GENERATING, 60, preview_html=render_preview(process_scraping_data(scraping_result)))
+    
+    graph = StageGraph()
+    graph.add("scrape", scrape)
+    add_generation_stages(graph, asset_pipeline, generate)
+    if options.generator == "llm":
+        graph.add("preview", preview, "scrape")
+    
+    # metadata reports screenshot stats, so it waits for them when they're wanted
+    async def metadata(scraping_result: ScrapingResult, generated: Tuple[str, RouteDecision], optimized: Tuple[str, Dict], asset_bundle: Dict, *_) -> Dict:
+        return scraping_metadata(scraping_result, asset_pipeline, asset_bundle, generated[1], optimized[1])
+    
+    # screenshots and scraped data into the asset store for /export
+    async def export(scraping_result: ScrapingResult, asset_bundle: Dict, *_) -> Dict:
+        return await export_manifest(scraping_result, asset_bundle, asset_pipeline)
+    
+    metadata_deps = ["scrape", "generate", "optimize", "assets"]
+    export_deps = ["scrape", "assets"]
+    if options.screenshots:
+        graph.add("screenshots", screenshots, "scrape")
+        metadata_deps.append("screenshots")
+        export_deps.append("screenshots")
+    graph.add("metadata", metadata, *metadata_deps)
+    graph.add("export", export, *export_deps)
+    
+    # the preview goes first so it reaches the client before generation reports progress
+    targets = ["rewrite", "metadata", "export"]
+    if options.generator == "llm":
+        targets.insert(0, "preview")
+    try:
+        # the backstop, stages cut their own optional work well before this
+        results = await asyncio.wait_for(graph.run(*targets), deadline.remaining(DEADLINE_BACKSTOP_RESERVE) if deadline else None)
+    except asyncio.TimeoutError:
+        # without a deadline the timeout came from a stage, not from wait_for
+        if deadline is None:
+            raise
+        if "result" not in scraped:
+            raise CloneFailed(f"Deadline of {deadline.seconds:g}s reached before the page was scraped")
+        deadline.degrade("pipeline", "template result", "stages still running at the deadline")
+        scraping_result = scraped["result"]
+        return {
+            "original_url": url,
+            "generated_html": render_preview(process_scraping_data(scraping_result)),
+            "scraping_metadata": {
+                **scraping_metadata(scraping_result, asset_pipeline, {}),
+                "stages": graph.report(),
+                "deadline": deadline.to_dict(),
+            },
+            "export": {},
+        }
+    
+    return {
+        "original_url": url,
+        "generated_html": results["rewrite"],
+        "scraping_metadata": {
+            **results["metadata"],
+            "stages": graph.report(),
+            "deadline": deadline.to_dict() if deadline else None,
+        },
+        "export": results["export"],
+    }
+
+async def run_profiled(
+    url: str,
+    scraper: WebScrape,
+    asset_pipeline: AssetPipeline,
+    report: Reporter,
+    options: CloneOptions,
+) -> Dict:
+    # never coalesced, the profile has to see all of its own work
+    unprofiled = replace(options, profile=False)
+    with profile_job(current_job.get()) as profile:
+        result_data = await run_clone_pipeline(url, scraper, asset_pipeline, report, unprofiled)
+    result_data["scraping_metadata"]["profile"] = {**profile.summary(), "artifacts": list_artifacts(profile.job_id)}
+    return result_data
+
+async def run_crawl_pipeline(
+    url: str,
+    scraper: WebScrape,
+    asset_pipeline: AssetPipeline,
+    report: Reporter,
+    options: CloneOptions,
+    flights: Optional[SingleFlight] = None,
+) -> Dict:
+    await report(CloneStatus.SCRAPING, 10)
+    key = options.flight_key(url)
+    
+    # Step 1: Crawl same-origin pages, progress 10 -> 50 as pages come in
+    async def crawl(crawl_report: Reporter) -> List[CrawledPage]:
+        async def on_page(page: CrawledPage, pages_done: int):
+            await crawl_report(
+                CloneStatus.SCRAPING,
+                10 + int(40 * pages_done / options.max_pages),
+                page_progress={"stage": "scraped", "url": page.url, "done": pages_done, "max_pages": options.max_pages},
+            )
+        
+        crawler = SiteCrawler(scraper, max_depth=options.max_depth, max_pages=options.max_pages, screenshots=options.screenshots)
+        return await crawler.crawl(url, on_page)
+    
+    with stage("crawl"):
+        pages = await shared(flights, ("crawl", key), crawl, report)
+    
+    if not pages:
+        raise CloneFailed("No pages could be scraped")
+    
+    await report(
+        CloneStatus.PROCESSING,
+        50,
+        memory_bytes=sum(page.result.memory_usage() for page in pages),
+    )
+    
+    # file name per page, links between pages are rewritten to these
+    paths = {page.url: "index.html" if i == 0 else f"page-{i}.html" for i, page in enumerate(pages)}
+    
+    # Step 2+3: generate every page, a few LLM calls at a time
+    semaphore = asyncio.Semaphore(GENERATION_CONCURRENCY)
+    generated = 0
+    # finished pages by url, the rest get a template when the deadline hits
+    done: Dict[str, Tuple[str, Dict, Optional[RouteDecision], Optional[Dict]]] = {}
+    
+    async def generate(page: CrawledPage) -> None:
+        nonlocal generated
+        async with semaphore:
+            html, bundle, route, html_stats = await shared(
+                flights if options.share_generation else None,
+                ("generate", key, page.url, options.latency_target, options.generator),
+                lambda _: generate_page(page.result, asset_pipeline, latency_target=options.latency_target, generator=options.generator),
+                None,
+            )
+        generated += 1
+        await report(
+            CloneStatus.GENERATING,
+            70 + int(25 * generated / len(pages)),
+            page_progress={"stage": "generated", "url": page.url, "done": generated, "total": len(pages)},
+        )
+        done[page.url] = rewrite_page_links(html, page.url, paths), bundle, route, html_stats
+    
+    await report(CloneStatus.GENERATING, 70)
+    deadline = current_deadline.get()
+    try:
+        # the backstop, generate_html falls back to the template on its own once the budget is low
+        await asyncio.wait_for(asyncio.gather(*(generate(page) for page in pages)), deadline.remaining(DEADLINE_BACKSTOP_RESERVE) if deadline else None)
+        backstopped = False
+    except asyncio.TimeoutError:
+        # without a deadline the timeout came from a stage, not from wait_for
+        if deadline is None:
+            raise
+        late = [page for page in pages if page.url not in done]
+        deadline.degrade("pipeline", "template result", f"{len(late)} of {len(pages)} pages still generating at the deadline")
+        for page in late:
+            done[page.url] = rewrite_page_links(render_preview(process_scraping_data(page.result)), page.url, paths), {}, None, None
+        backstopped = True
+    results = [done[page.url] for page in pages]
+    
+    # no time left to store export files once the backstop hit
+    if backstopped:
+        manifests = [{} for _ in pages]
+    else:
+        manifests = await asyncio.gather(*(export_manifest(page.result, bundle, asset_pipeline) for page, (_, bundle, _, _) in zip(pages, results)))
+    
+    site = {}
+    for page, (html, bundle, route, html_stats), manifest in zip(pages, results, manifests):
+        site[paths[page.url]] = {
+            "url": page.url,
+            "depth": page.depth,
+            "title": page.result.metadata.get("title"),
+            "generated_html": html,
+            "scraping_metadata": scraping_metadata(page.result, asset_pipeline, bundle, route, html_stats),
+            "export": manifest,
+        }
+    
+    index = site["index.html"]
+    return {
+        "original_url": url,
+        "generated_html": index["generated_html"],
+        "scraping_metadata": {**index["scraping_metadata"], "deadline": deadline.to_dict() if deadline else None},
+        "pages": site,
+    }
+
+async def export_manifest(scraping_result: ScrapingResult, asset_bundle: Dict, asset_pipeline: AssetPipeline) -> Dict:
+    # a failed write costs the export its files, never the job
+    try:
+        return await asyncio.to_thread(build_manifest, scraping_result, asset_bundle, asset_pipeline.store)
+    except Exception as e:
+        print(f"Storing export files failed: {e}")
+        return {}
+
+def add_generation_stages(graph: StageGraph, asset_pipeline: AssetPipeline, generate: Callable[[ScrapingResult], Awaitable[Tuple[str, RouteDecision]]]):
+    # generate and assets both only need the scrape, rewrite joins them
+    async def assets(scraping_result: ScrapingResult) -> Dict:
+        deadline = current_deadline.get()
+        try:
+            if deadline is None:
+                return await asset_pipeline.prefetch(scraping_result.assets)
+            try:
+                return await asyncio.wait_for(asset_pipeline.prefetch(scraping_result.assets), deadline.remaining(DEADLINE_FINISH_RESERVE))
+            except asyncio.TimeoutError:
+                # the page keeps its hotlinked urls
+                deadline.degrade("assets", "not bundled")
+                return {}
+        except Exception as e:
+            print(f"Asset prefetch failed: {e}")
+            return {}
+    
+    # lift repeated inline styles into classes and minify, off the loop
+    async def optimize(generated: Tuple[str, RouteDecision]) -> Tuple[str, Dict]:
+        return await asyncio.to_thread(optimize_html, generated[0])
+    
+    # Step 4: Swap hotlinked assets for bundled copies
+    async def rewrite(scraping_result: ScrapingResult, optimized: Tuple[str, Dict], asset_bundle: Dict) -> str:
+        return asset_pipeline.rewrite_html(optimized[0], asset_bundle, scraping_result.url)
+    
+    graph.add("generate", generate, "scrape")
+    graph.add("assets", assets, "scrape")
+    graph.add("optimize", optimize, "generate")
+    graph.add("rewrite", rewrite, "scrape", "optimize", "assets")
+
+async def generate_page(
+    scraping_result: ScrapingResult,
+    asset_pipeline: AssetPipeline,
+    report: Optional[Reporter] = None,
+    latency_target: Optional[float] = None,
+    generator: str = "llm",
+) -> Tuple[str, Dict, RouteDecision, Dict]:
+    # Generation plus bundled assets for an already scraped page (crawl mode)
+    async def scrape() -> ScrapingResult:
+        return scraping_result
+    
+    graph = StageGraph()
+    graph.add("scrape", scrape)
+    add_generation_stages(graph, asset_pipeline, lambda result: generate_html(result, report, latency_target, generator))
+    results = await graph.run("rewrite")
+    return results["rewrite"], results["assets"], results["generate"][1], results["optimize"][1]
+
+async def generate_html(
+    scraping_result: ScrapingResult,
+    report: Optional[Reporter] = None,
+    latency_target: Optional[float] = None,
+    generator: str = "llm",
+) -> Tuple[str, Optional[RouteDecision]]:
+    # Step 2: Process the scraped data for LLM
+    processed_data = process_scraping_data(scraping_result)
+    
+    # no-LLM mode, the structural preview is the page
+    if generator == "template":
+        return render_preview(processed_data), None
+    
+    # Update progress
+    if report:
+        await report(CloneStatus.GENERATING, 70)
+    
+    # the job's deadline picks the model and prompt too: a smaller prompt, then a faster
+    # model and output budget, and no LLM call at all when there's no time for one
+    deadline = current_deadline.get()
+    budget, compact = None, False
+    if deadline is not None:
+        budget = deadline.remaining(DEADLINE_FINISH_RESERVE)
+        if budget < DEADLINE_MIN_LLM:
+            deadline.degrade("generate", "template fallback", f"{budget:.1f}s left for the LLM")
+            return render_preview(processed_data), None
+        compact = budget < DEADLINE_COMPACT_PROMPT
+        if compact:
+            deadline.degrade("generate", "smaller prompt")
+    
+    # Step 3: Generate HTML with LLM, sized to the page
+    route = model_router.route(scraping_result, latency_target, budget)
+    if deadline is not None and budget < (latency_target or float("inf")):
+        wanted = model_router.tier_for(route.score)
+        if route.tier != wanted.name:
+            deadline.degrade("generate", "faster model", f"{wanted.name} -> {route.tier}")
+        elif route.max_tokens < wanted.max_tokens:
+            deadline.degrade("generate", "smaller output", f"{route.max_tokens} tokens")
+    generated_html = await generate_html_with_llm(processed_data, route, compact)
+    return generated_html, route
+
+def scraping_metadata(
+    scraping_result: ScrapingResult,
+    asset_pipeline: AssetPipeline,
+    asset_bundle: Dict,
+    route: Optional[RouteDecision] = None,
+    html_stats: Optional[Dict] = None,
+) -> Dict:
+    return {
+        "colors_found": len(scraping_result.color_palette),
+        "images_found": len(scraping_result.assets.get("images", [])),
+        "fonts_found": len(scraping_result.typography.get("fonts", [])),
+        "screenshots_taken": scraping_result.screenshot_names,
+        "screenshot_stats": scraping_result.screenshot_stats,
+        "layout_type": scraping_result.layout_info.get("type"),
+        "dominant_color": scraping_result.color_palette[0] if scraping_result.color_palette else None,
+        "title": scraping_result.metadata.get("title"),
+        "description": scraping_result.metadata.get("description"),
+        **asset_pipeline.summary(asset_bundle),
+        "requests": scraping_result.request_stats,
+        # how much of the page each budgeted element scan saw
+        "extraction_coverage": scraping_result.extraction_coverage,
+        "routing": route.to_dict() if route else None,
+        "html_optimization": html_stats,
+    }
+
+def process_scraping_data(scraping_result: ScrapingResult) -> Dict:
+    # send to llm to re-create
+    # references only, nothing large is copied besides the dom preview
+    return {
+        "url": scraping_result.url,
+        "screenshots": scraping_result.screenshot_names,
+        "dom_structure": scraping_result.dom_structure[:10000],  # Limit size
+        "dom_skeleton": scraping_result.dom_skeleton,
+        "color_palette": scraping_result.color_palette,
+        "typography": scraping_result.typography,
+        "layout_info": scraping_result.layout_info,
+        "css_info": scraping_result.extracted_css,
+        "metadata": scraping_result.metadata,
+        "assets": scraping_result.assets,
+    }
+    
+    
+async def generate_html_with_llm(processed_data: Dict, route: Optional[RouteDecision] = None, compact: bool = False) -> str:
+    # generate the website with llm, route picks model/max_tokens/timeout
+    started = time.perf_counter()
+    
+    try:
+        # Prepare the prompt with scraped data
+        prompt = create_html_generation_prompt(processed_data, compact)
+        
+        openai_client = await asyncio.to_thread(get_openai_client)
+        client = openai_client.with_options(timeout=route.timeout) if route else openai_client
+        if route and route.deadline is not None:
+            # a retry would run past the deadline the timeout was cut to
+            client = client.with_options(max_retries=0)
+        # the client is blocking, a thread keeps the loop free for overlapping stages
+        response = await asyncio.to_thread(
+            client.chat.completions.create,
+            model=route.model if route else "gpt-4o",
+            messages=[
+                {
+                    "role": "system",
+                    "content": """You are an expert web developer who recreates websites based on scraped data. 
+                    Generate clean, modern HTML with inline CSS that closely matches the original design.
+                    Make it responsive and professional. Only return the HTML code, no explanations."""
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            max_tokens=route.max_tokens if route else 4000,
+            temperature=0.3
+        )
+        
+        generated_html = response.choices[0].message.content
+        if route:
+            model_router.record(
+                route,
+                time.perf_counter() - started,
+                output_tokens=response.usage.completion_tokens if response.usage else None,
+                truncated=response.choices[0].finish_reason == "length",
+            )
+        
+        # the document without markdown fences or commentary around it
+        return extract_html(generated_html)
+        
+    except Exception as e:
+        print(f"Error generating HTML with OpenAI: {e}")
+        if route:
+            model_router.record(route, time.perf_counter() - started, error=str(e))
+        deadline = current_deadline.get()
+        if deadline is not None:
+            deadline.degrade("generate", "template fallback", f"LLM call failed: {type(e).__name__}")
+        return render_preview(processed_data)
+
+def create_html_generation_prompt(processed_data: Dict, compact: bool = False) -> str:    
+    # compact: shorter markup and skeleton slices, fewer images, for a call short on time
+    dom_chars, skeleton_chars, image_count = (600, 1500, 5) if compact else (2000, 4000, 10)
+    
+    # Extract key information
+    url = processed_data.get('url', '')
+    colors = processed_data.get('color_palette', [])
+    fonts = processed_data.get('typography', {}).get('fonts', [])
+    layout_info = processed_data.get('layout_info', {})
+    metadata = processed_data.get('metadata', {})
+    dom_structure = processed_data.get('dom_structure', '')
+    dom_skeleton = processed_data.get('dom_skeleton', '')
+    images = processed_data.get('assets', {}).get('images', [])
+    
+    # Include screenshot data if available
+    screenshot_info = ""
+    if processed_data.get('screenshots'):
+        screenshot_info = f"Screenshots available: {list(processed_data['screenshots'])}"
+    
+    # boxes with their sizes and positions say more about the layout than the first few kb of markup
+    skeleton_info = ""
+    if dom_skeleton:
+        skeleton_info = f"""
+        **Layout Skeleton (tag#id.class WIDTHxHEIGHT@X,Y, repeated siblings as xN):**
+        {dom_skeleton[:skeleton_chars]}
+        """
+
+    prompt = f"""
+        Please recreate this website as HTML with inline CSS based on the following scraped data:
+
+        **Original URL:** {url}
+
+        **Page Metadata:**
+        - Title: {metadata.get('title', 'N/A')}
+        - Description: {metadata.get('description', 'N/A')}
+
+        **Design Elements:**
+        - Color Palette: {colors[:5]}  # Top 5 colors
+        - Fonts: {fonts[:3]}  # Top 3 fonts
+        - Layout Type: {layout_info.get('type', 'unknown')}
+        - Images (use these exact URLs): {images[:image_count]}
+
+        **DOM Structure Preview:**
+        {dom_structure[:dom_chars]}...
+        {skeleton_info}
+
+        **Screenshots:** {screenshot_info}
+
+        **Requirements:**
+        1. Create a complete HTML document with inline CSS
+        2. Use the extracted colors, fonts and image URLs
+        3. Make it responsive and modern
+        4. Include proper semantic HTML structure
+        5. Match the layout and visual hierarchy as closely as possible
+        6. Add hover effects and smooth transitions
+        7. Ensure cross-browser compatibility
+
+        Generate clean, professional HTML that captures the essence and design of the original website as accurately as possible.
+        """
+    
+    return prompt
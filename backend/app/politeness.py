@@ -0,0 +1,134 @@
+import os
+import time
+import asyncio
+import logging
+# types
+from typing import Dict, Optional
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# CONFIG (per host)
+HOST_RATE = float(os.getenv("HOST_RATE", 4))  # requests per second, steady state
+HOST_BURST = float(os.getenv("HOST_BURST", 8))
+HOST_MAX_CONNECTIONS = int(os.getenv("HOST_MAX_CONNECTIONS", 4))
+# slowest we'll go after repeated 429/503s
+HOST_MIN_RATE = float(os.getenv("HOST_MIN_RATE", 0.2))
+# longest Retry-After we honor, anything larger is clamped
+MAX_RETRY_AFTER = float(os.getenv("MAX_RETRY_AFTER", 120))
+
+THROTTLE_STATUSES = (429, 503)
+
+def host_of(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Retry-After is either seconds or an http date
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# TOKEN BUCKET + CONNECTION CAP + BACKOFF STATE FOR ONE HOST
+class HostState:
+    def __init__(self, rate: float, burst: float, max_connections: int):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.connections = asyncio.Semaphore(max_connections)
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.requests = 0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire_token(self):
+        # the lock makes waiters queue up in order instead of stampeding
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.requests += 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def slow_down(self, retry_after: Optional[float]):
+        # multiplicative decrease, and pause the host entirely if told to
+        self.throttled += 1
+        self.rate = max(HOST_MIN_RATE, self.rate / 2)
+        self.tokens = 0
+        pause = min(retry_after, MAX_RETRY_AFTER) if retry_after is not None else 1 / self.rate
+        self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def speed_up(self):
+        # additive increase back towards the configured rate
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "rate": round(self.rate, 3),
+            "tokens": round(self.tokens, 2),
+            "paused_for": round(max(0.0, self.blocked_until - time.monotonic()), 2),
+            "requests": self.requests,
+            "throttled": self.throttled,
+        }
+
+
+# GATES EVERY NAVIGATION AND ASSET FETCH BY HOST
+# Hosts are independent: a throttled host never delays jobs for other domains.
+class DomainScheduler:
+    def __init__(self, rate: float = HOST_RATE, burst: float = HOST_BURST, max_connections: int = HOST_MAX_CONNECTIONS):
+        self.rate = rate
+        self.burst = burst
+        self.max_connections = max_connections
+        self.hosts: Dict[str, HostState] = {}
+
+    def _host(self, url: str) -> HostState:
+        host = host_of(url)
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.rate, self.burst, self.max_connections)
+        return self.hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        # Waits for a token and a free connection to url's host
+        state = self._host(url)
+        await state.acquire_token()
+        async with state.connections:
+            yield
+
+    def report(self, url: str, status: Optional[int], retry_after: Optional[str] = None):
+        # Feed back a response status so the host rate adapts
+        state = self._host(url)
+        if status in THROTTLE_STATUSES:
+            seconds = parse_retry_after(retry_after)
+            state.slow_down(seconds)
+            logger.warning(f"{host_of(url)} returned {status}, rate now {state.rate:.2f}/s, paused {seconds or 0:.1f}s")
+        elif status is not None and status < 400:
+            state.speed_up()
+
+    def snapshot(self, limit: int = 20) -> Dict[str, Dict[str, any]]:
+        busiest = sorted(self.hosts.items(), key=lambda item: -item[1].requests)[:limit]
+        return {host: state.to_dict() for host, state in busiest}
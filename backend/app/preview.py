@@ -0,0 +1,172 @@
+import re
+import html
+# types
+from typing import Dict, List, Optional
+
+# CONFIG
+PREVIEW_MAX_IMAGES = 6
+PREVIEW_MAX_SECTIONS = 5
+# computed styles carried over from the page, sizes and offsets belong to the original layout
+PREVIEW_PROPERTIES = (
+    "background-color", "color", "font-family", "font-size", "font-weight", "line-height",
+    "text-align", "border", "border-radius", "box-shadow", "padding",
+    "display", "flex-direction", "justify-content", "align-items", "grid-template-columns",
+)
+# common_patterns selectors (see _extract_css_info) that have an element in the template
+PREVIEW_SELECTORS = (
+    "h1", "h2", "h3", "h4", "p", "a", "button", ".container", ".header", ".footer",
+    "nav", ".nav", ".btn", ".card", ".hero",
+)
+
+UNSAFE_VALUE_RE = re.compile(r"[;{}<>\\]|/\*|url\(", re.IGNORECASE)
+CLASS_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_-]{0,40}$")
+
+def _value(value) -> Optional[str]:
+    # a computed style value that can't break out of its declaration
+    if not isinstance(value, str) or not value.strip() or UNSAFE_VALUE_RE.search(value):
+        return None
+    return value.strip()
+
+def _font(family: Optional[str]) -> str:
+    family = _value(family or "")
+    if not family:
+        return "system-ui, sans-serif"
+    family = family.split(",")[0].strip("\"' ")
+    return f"'{family}', system-ui, sans-serif" if family else "system-ui, sans-serif"
+
+def _declarations(styles: Dict[str, str], properties=PREVIEW_PROPERTIES) -> str:
+    out = []
+    for prop in properties:
+        value = _value(styles.get(prop)) if styles else None
+        if value:
+            out.append(f"{prop}: {value if prop != 'font-family' else _font(value)};")
+    return " ".join(out)
+
+def _classes(entry: Dict, index: int = 0) -> str:
+    # the page's own class names on the matching element, so its patterns still apply
+    try:
+        names = entry.get("classes", [])[index]
+    except (IndexError, AttributeError):
+        return ""
+    return " ".join(name for name in names if isinstance(name, str) and CLASS_RE.match(name))
+
+def _columns(grid_info: Dict[str, Dict]) -> int:
+    # widest grid on the page (computed templates are px lists), flex rows count as three
+    columns = 0
+    for info in (grid_info or {}).values():
+        template = info.get("grid-template-columns") or ""
+        if info.get("display") == "grid" and template not in ("", "none"):
+            repeat = re.search(r"repeat\(\s*(\d+)", template)
+            columns = max(columns, int(repeat.group(1)) if repeat else len(template.split()))
+        elif info.get("display") == "flex" and info.get("flex-direction", "row") == "row":
+            columns = max(columns, 3)
+    return min(max(columns, 2), 4)
+
+
+# STRUCTURAL PREVIEW FROM SCRAPED DATA
+# Deterministic and local: the page's landmarks (layout_info.structure) in order, dressed in its
+# palette, fonts, heading sizes and the computed styles of its common elements. Known text
+# (title, description) is real, everything else is placeholder bars. Takes process_scraping_data's dict.
+def render_preview(processed_data: Dict) -> str:
+    metadata = processed_data.get("metadata") or {}
+    typography = processed_data.get("typography") or {}
+    layout = processed_data.get("layout_info") or {}
+    css = processed_data.get("css_info") or {}
+    colors = [c for c in processed_data.get("color_palette") or [] if _value(c)]
+    images = [src for src in (processed_data.get("assets") or {}).get("images", []) if isinstance(src, str) and src.startswith(("http://", "https://"))][:PREVIEW_MAX_IMAGES]
+
+    title = html.escape(metadata.get("title") or processed_data.get("url") or "Preview")
+    description = html.escape(metadata.get("description") or "")
+    structure = {entry.get("tag"): entry for entry in layout.get("structure") or [] if isinstance(entry, dict)}
+
+    body_styles = css.get("body_styles") or {}
+    background = _value(body_styles.get("background-color")) or (colors[0] if colors else "#ffffff")
+    text = _value(body_styles.get("color")) or (colors[1] if len(colors) > 1 else "#1f2937")
+    accent = next((c for c in colors if c not in (background, text)), "#4a90e2")
+    fonts = typography.get("fonts") or []
+    body_text = typography.get("body_text") or {}
+    columns = _columns(layout.get("grid_info"))
+
+    # BASE STYLES, the page's own patterns come after and win
+    rules = [
+        "*{margin:0;padding:0;box-sizing:border-box}",
+        f"body{{font-family:{_font(body_text.get('font-family') or (fonts[0] if fonts else None))};background:{background};color:{text};line-height:1.6}}",
+        ".container{max-width:1200px;margin:0 auto;padding:0 24px}",
+        f".header{{padding:16px 0;border-bottom:1px solid color-mix(in srgb,{text} 12%,transparent)}}",
+        ".header .container,.nav{display:flex;align-items:center;justify-content:space-between;gap:24px}",
+        ".nav{list-style:none}",
+        f".logo{{font-weight:700;font-size:1.25rem;color:{accent}}}",
+        ".hero{padding:80px 0;text-align:center}",
+        ".hero p{max-width:640px;margin:16px auto 0;opacity:.8}",
+        f".btn{{display:inline-block;margin-top:24px;padding:12px 28px;border-radius:6px;background:{accent};color:#fff;text-decoration:none}}",
+        "section{padding:56px 0}",
+        f".grid{{display:grid;grid-template-columns:repeat({columns},1fr);gap:24px;margin-top:24px}}",
+        f".card{{padding:20px;border-radius:10px;border:1px solid color-mix(in srgb,{text} 12%,transparent)}}",
+        ".card img,.hero img{width:100%;height:160px;object-fit:cover;border-radius:6px;margin-bottom:12px}",
+        ".hero img{height:320px;margin:32px 0 0}",
+        f".bar{{display:block;height:.8em;border-radius:4px;margin:.5em 0;background:color-mix(in srgb,{text} 14%,transparent)}}",
+        ".bar.short{width:40%}.bar.mid{width:70%}",
+        ".layout{display:grid;grid-template-columns:1fr 280px;gap:32px}",
+        f".footer{{padding:40px 0;margin-top:40px;border-top:1px solid color-mix(in srgb,{text} 12%,transparent);opacity:.85}}",
+        "@media (max-width:768px){.grid,.layout{grid-template-columns:1fr}.nav{display:none}}",
+    ]
+    for tag, styles in (typography.get("headings") or {}).items():
+        if re.fullmatch(r"h[1-6]", tag):
+            rules.append(f"{tag}{{{_declarations(styles, ('font-size', 'font-weight', 'line-height', 'font-family'))}}}")
+    for pattern in css.get("common_patterns") or []:
+        selector = pattern.get("selector")
+        declarations = _declarations(pattern.get("styles") or {})
+        if selector in PREVIEW_SELECTORS and declarations:
+            rules.append(f"{selector}{{{declarations}}}")
+
+    def bars(*widths: str) -> str:
+        return "".join(f'<div class="bar {width}"></div>' for width in widths)
+
+    def card(index: int) -> str:
+        image = f'<img src="{html.escape(images[index % len(images)])}" alt="">' if images else ""
+        return f'<div class="card">{image}<h3>{bars("mid")}</h3>{bars("", "", "short")}</div>'
+
+    # BODY, landmarks in reading order
+    parts: List[str] = []
+    if "header" in structure or "nav" in structure:
+        nav = ""
+        if "nav" in structure:
+            nav = f'<nav class="nav {_classes(structure["nav"])}">' + "".join(
+                f'<a href="#" style="width:{width}px" class="bar"></a>' for width in (64, 80, 56, 72)
+            ) + "</nav>"
+        parts.append(
+            f'<header class="header {_classes(structure.get("header", {}))}"><div class="container">'
+            f'<div class="logo">{title}</div>{nav}</div></header>'
+        )
+
+    hero_image = f'<img src="{html.escape(images[0])}" alt="">' if images else ""
+    main = [
+        f'<section class="hero"><div class="container"><h1>{title}</h1>'
+        f'{f"<p>{description}</p>" if description else bars("mid")}'
+        f'<a href="#" class="btn">&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;</a>{hero_image}</div></section>'
+    ]
+    sections = (structure.get("section", {}).get("count", 0) or 0) + (structure.get("article", {}).get("count", 0) or 0)
+    for index in range(min(max(sections, 2), PREVIEW_MAX_SECTIONS)):
+        main.append(
+            f'<section class="{_classes(structure.get("section", {}), index % 3)}"><div class="container">'
+            f'<h2>{bars("short")}</h2><div class="grid">{"".join(card(index * columns + i) for i in range(columns))}</div></div></section>'
+        )
+    if "aside" in structure:
+        parts.append(
+            f'<main class="container layout"><div>{"".join(main)}</div>'
+            f'<aside class="{_classes(structure["aside"])}"><div class="card">{bars("mid", "", "", "short")}</div></aside></main>'
+        )
+    else:
+        parts.append(f"<main>{''.join(main)}</main>")
+
+    parts.append(
+        f'<footer class="footer {_classes(structure.get("footer", {}))}"><div class="container">'
+        f'{bars("mid", "short")}<p>&copy; {title}</p></div></footer>'
+    )
+
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">'
+        '<meta name="viewport" content="width=device-width, initial-scale=1.0">'
+        f"<title>{title}</title><style>{''.join(rules)}</style></head>"
+        f"<body>{''.join(parts)}</body></html>"
+    )
@@ -0,0 +1,217 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+# types
+from typing import Dict, List, Optional
+from loopmonitor import current_stage
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".profiles"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", 5)) / 1000
+# a trace bigger than this is dropped, only its size is kept
+PROFILE_MAX_TRACE_BYTES = int(os.getenv("PROFILE_MAX_TRACE_BYTES", 50 * 1024 * 1024))
+# total for one job, later artifacts are dropped once it is reached
+PROFILE_MAX_JOB_BYTES = int(os.getenv("PROFILE_MAX_JOB_BYTES", 100 * 1024 * 1024))
+PROFILE_TTL = float(os.getenv("PROFILE_TTL_HOURS", 24)) * 3600
+# distinct stacks kept in the folded output
+PROFILE_MAX_STACKS = 2000
+MAX_STACK_DEPTH = 60
+
+# the profile of the job running in this context, None (the normal case) costs nothing
+current_profile: ContextVar[Optional["JobProfile"]] = ContextVar("current_profile", default=None)
+
+def job_dir(job_id: str) -> Optional[str]:
+    # job ids are uuids, never paths
+    if not re.fullmatch(r"[0-9a-fA-F-]{1,64}", job_id or ""):
+        return None
+    return os.path.join(os.path.abspath(PROFILE_DIR), job_id)
+
+
+# ONE JOB'S SAMPLES AND ARTIFACTS
+class JobProfile:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.dir = job_dir(job_id)
+        os.makedirs(self.dir, exist_ok=True)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.time()
+        self.traces = 0
+        self.notes: List[str] = []
+
+    def add_sample(self, stack: str):
+        self.samples += 1
+        self.stacks[stack] += 1
+
+    def trace_path(self) -> str:
+        self.traces += 1
+        return os.path.join(self.dir, f"trace-{self.traces}.zip")
+
+    def keep_trace(self, path: str):
+        # Enforce the size limits on a trace playwright just wrote
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size > PROFILE_MAX_TRACE_BYTES or self.used_bytes() > PROFILE_MAX_JOB_BYTES:
+            os.remove(path)
+            self.notes.append(f"{os.path.basename(path)} dropped, {size} bytes is over the limit")
+
+    def used_bytes(self) -> int:
+        return sum(entry["bytes"] for entry in list_artifacts(self.job_id))
+
+    def write(self):
+        # folded stacks (flamegraph.pl / speedscope) plus a readable summary
+        top = self.stacks.most_common(PROFILE_MAX_STACKS)
+        with open(os.path.join(self.dir, "profile.folded"), "w") as f:
+            for stack, count in top:
+                f.write(f"{stack} {count}\n")
+
+        with open(os.path.join(self.dir, "profile.json"), "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def summary(self) -> Dict[str, any]:
+        by_stage: Counter = Counter()
+        self_time: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            by_stage[frames[0]] += count
+            self_time[frames[-1]] += count
+
+        return {
+            "job_id": self.job_id,
+            "sample_interval_ms": PROFILE_SAMPLE_INTERVAL * 1000,
+            "samples": self.samples,
+            "cpu_ms_estimate": round(self.samples * PROFILE_SAMPLE_INTERVAL * 1000, 1),
+            "wall_ms": round((time.time() - self.started) * 1000, 1),
+            "by_stage": dict(by_stage.most_common()),
+            "top_functions": dict(self_time.most_common(25)),
+            "notes": self.notes,
+        }
+
+
+# SAMPLES THE EVENT LOOP THREAD WHILE ANY PROFILED JOB RUNS
+# A sample goes to the job whose task holds the loop, so concurrent jobs don't mix.
+# Work pushed to threads (the LLM call, html optimizing) shows up in stage timings instead.
+class LoopSampler:
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.active = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop: Optional[threading.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def attach(self):
+        with self._lock:
+            self.active += 1
+            if self._thread is None:
+                self._loop = asyncio.get_running_loop()
+                self._loop_thread_id = threading.get_ident()
+                # each thread gets its own stop flag, a restart never revives an old one
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), name="job-profiler", daemon=True)
+                self._thread.start()
+
+    def detach(self):
+        with self._lock:
+            self.active -= 1
+            if self.active == 0 and self._thread is not None:
+                # nothing profiled anymore, no thread left behind
+                self._stop.set()
+                self._thread = None
+
+    def _run(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            try:
+                self._sample()
+            except Exception as e:
+                logger.debug(f"profile sample failed: {e}")
+
+    def _sample(self):
+        task = asyncio.current_task(self._loop)
+        # Task.get_context() is 3.12+
+        if task is None or not hasattr(task, "get_context"):
+            return
+        context = task.get_context()
+        profile = context.get(current_profile)
+        if profile is None:
+            return
+
+        frame = sys._current_frames().get(self._loop_thread_id)
+        frames = []
+        while frame is not None and len(frames) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if not frames:
+            return
+
+        stage_name = context.get(current_stage) or "job"
+        profile.add_sample(";".join([stage_name] + frames[::-1]))
+
+
+sampler = LoopSampler()
+
+@contextmanager
+def profile_job(job_id: str):
+    # Samples the job's code on the loop and collects its browser traces, writes everything on exit
+    profile = JobProfile(job_id)
+    token = current_profile.set(profile)
+    sampler.attach()
+    try:
+        yield profile
+    finally:
+        sampler.detach()
+        current_profile.reset(token)
+        try:
+            profile.write()
+        except OSError as e:
+            logger.error(f"Writing profile for {job_id} failed: {e}")
+
+
+# ARTIFACT ACCESS AND EXPIRY
+def list_artifacts(job_id: str) -> List[Dict[str, any]]:
+    path = job_dir(job_id)
+    if not path or not os.path.isdir(path):
+        return []
+    return [
+        {"name": name, "bytes": os.path.getsize(os.path.join(path, name))}
+        for name in sorted(os.listdir(path))
+        if not name.endswith(".tmp")
+    ]
+
+def artifact_path(job_id: str, name: str) -> Optional[str]:
+    path = job_dir(job_id)
+    if not path or not re.fullmatch(r"[A-Za-z0-9_.-]+", name) or name.startswith("."):
+        return None
+    path = os.path.join(path, name)
+    return path if os.path.isfile(path) else None
+
+def delete_artifacts(job_id: str):
+    path = job_dir(job_id)
+    if path and os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+def expire_artifacts(ttl: float = PROFILE_TTL) -> int:
+    # Removes job artifact dirs older than ttl, returns how many went
+    root = os.path.abspath(PROFILE_DIR)
+    if not os.path.isdir(root):
+        return 0
+    removed = 0
+    cutoff = time.time() - ttl
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import logging
+# types
+from typing import Any, Dict, List, Optional
+from collections import deque
+from dataclasses import dataclass, asdict
+from webscrape import ScrapingResult
+
+logger = logging.getLogger(__name__)
+
+# CONFIG
+# where decisions are appended as json lines, unset keeps them in memory only
+MODEL_ROUTER_LOG = os.getenv("MODEL_ROUTER_LOG")
+MODEL_ROUTER_HISTORY = int(os.getenv("MODEL_ROUTER_HISTORY", 200))
+
+# what counts as "a lot" for each complexity feature
+DOM_CHARS_HIGH = 200_000
+STRUCTURE_HIGH = 40
+PATTERNS_HIGH = 15
+PAGE_HEIGHT_HIGH = 10_000
+
+# feature -> weight, sums to 1
+WEIGHTS = {"dom_chars": 0.35, "structure": 0.25, "patterns": 0.15, "page_height": 0.25}
+
+# ONE MODEL CONFIGURATION THE ROUTER CAN PICK
+@dataclass
+class ModelTier:
+    name: str
+    model: str
+    max_tokens: int
+    timeout: float  # seconds for the whole completion
+    max_score: float  # pages scoring up to this go here
+    # latency model: first token delay + output tokens / throughput, refined by observations
+    base_latency: float
+    tokens_per_second: float
+
+    def expected_latency(self, max_tokens: int) -> float:
+        return self.base_latency + max_tokens / self.tokens_per_second
+
+def default_tiers() -> List[ModelTier]:
+    return [
+        ModelTier(
+            name="simple",
+            model=os.getenv("ROUTER_SIMPLE_MODEL", "gpt-4o-mini"),
+            max_tokens=int(os.getenv("ROUTER_SIMPLE_MAX_TOKENS", 2500)),
+            timeout=float(os.getenv("ROUTER_SIMPLE_TIMEOUT", 45)),
+            max_score=0.3,
+            base_latency=1.0,
+            tokens_per_second=90.0,
+        ),
+        ModelTier(
+            name="standard",
+            model=os.getenv("ROUTER_STANDARD_MODEL", "gpt-4o"),
+            max_tokens=int(os.getenv("ROUTER_STANDARD_MAX_TOKENS", 4000)),
+            timeout=float(os.getenv("ROUTER_STANDARD_TIMEOUT", 90)),
+            max_score=0.65,
+            base_latency=1.5,
+            tokens_per_second=60.0,
+        ),
+        ModelTier(
+            name="complex",
+            model=os.getenv("ROUTER_COMPLEX_MODEL", "gpt-4o"),
+            max_tokens=int(os.getenv("ROUTER_COMPLEX_MAX_TOKENS", 8000)),
+            timeout=float(os.getenv("ROUTER_COMPLEX_TIMEOUT", 180)),
+            max_score=1.0,
+            base_latency=1.5,
+            tokens_per_second=60.0,
+        ),
+    ]
+
+# smallest output budget worth asking for, below this the page comes back cut off
+MIN_MAX_TOKENS = 1000
+
+# WHAT THE ROUTER CHOSE FOR ONE GENERATION, AND HOW IT WENT
+@dataclass
+class RouteDecision:
+    url: str
+    score: float
+    features: Dict[str, float]
+    tier: str
+    model: str
+    max_tokens: int
+    timeout: float
+    expected_seconds: float
+    latency_target: Optional[float] = None
+    deadline: Optional[float] = None  # seconds the job's deadline left for the call
+    # filled in by ModelRouter.record
+    elapsed_seconds: Optional[float] = None
+    output_tokens: Optional[int] = None
+    truncated: Optional[bool] = None
+    error: Optional[str] = None
+    decided_at: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def complexity_features(scraping_result: ScrapingResult) -> Dict[str, float]:
+    # Raw measurements the score is built from, all already extracted by the scraper
+    structure = scraping_result.layout_info.get("structure") or []
+    desktop = scraping_result.screenshot_stats.get("desktop", {})
+    return {
+        "dom_chars": len(scraping_result.dom_structure),
+        "structure": sum(item.get("count", 1) for item in structure if isinstance(item, dict)),
+        "patterns": len(scraping_result.extracted_css.get("common_patterns") or []),
+        # measured during extraction, screenshots may not have finished yet
+        "page_height": scraping_result.layout_info.get("page_height") or desktop.get("page_height", 0),
+    }
+
+def complexity_score(features: Dict[str, float]) -> float:
+    # 0 (one section landing page) .. 1 (dense dashboard)
+    highs = {"dom_chars": DOM_CHARS_HIGH, "structure": STRUCTURE_HIGH, "patterns": PATTERNS_HIGH, "page_height": PAGE_HEIGHT_HIGH}
+    return round(sum(WEIGHTS[name] * min(1.0, features[name] / highs[name]) for name in WEIGHTS), 3)
+
+
+# PICKS MODEL, OUTPUT BUDGET AND TIMEOUT PER PAGE
+class ModelRouter:
+    def __init__(self, tiers: Optional[List[ModelTier]] = None, log_path: Optional[str] = MODEL_ROUTER_LOG, history: int = MODEL_ROUTER_HISTORY):
+        self.tiers = tiers or default_tiers()
+        self.log_path = log_path
+        self.decisions: deque = deque(maxlen=history)
+
+    def tier_for(self, score: float) -> ModelTier:
+        return next(tier for tier in self.tiers if score <= tier.max_score)
+
+    def route(self, scraping_result: ScrapingResult, latency_target: Optional[float] = None, deadline: Optional[float] = None) -> RouteDecision:
+        # deadline: hard cap on the call, routes like a latency target and bounds the timeout
+        features = complexity_features(scraping_result)
+        score = complexity_score(features)
+        tier = self.tier_for(score)
+        max_tokens = tier.max_tokens
+        requested = latency_target
+        if deadline is not None:
+            latency_target = min(latency_target or deadline, deadline)
+
+        # step down to cheaper tiers, then shrink the budget, until the target fits
+        if latency_target:
+            for candidate in reversed(self.tiers[:self.tiers.index(tier) + 1]):
+                tier = candidate
+                if tier.expected_latency(tier.max_tokens) <= latency_target:
+                    break
+            max_tokens = tier.max_tokens
+            if tier.expected_latency(max_tokens) > latency_target:
+                budget = int((latency_target - tier.base_latency) * tier.tokens_per_second)
+                max_tokens = max(MIN_MAX_TOKENS, min(max_tokens, budget))
+
+        timeout = tier.timeout
+        if latency_target:
+            # some slack over the target, a late page beats none
+            timeout = min(timeout, max(latency_target * 1.5, tier.expected_latency(max_tokens)))
+        if deadline is not None:
+            timeout = min(timeout, deadline)
+
+        decision = RouteDecision(
+            url=scraping_result.url,
+            score=score,
+            features=features,
+            tier=tier.name,
+            model=tier.model,
+            max_tokens=max_tokens,
+            timeout=round(timeout, 1),
+            expected_seconds=round(tier.expected_latency(max_tokens), 1),
+            latency_target=requested,
+            deadline=round(deadline, 1) if deadline is not None else None,
+            decided_at=time.time(),
+        )
+        logger.info(f"routing {decision.url} (score {score}) to {tier.name}: {tier.model}, {max_tokens} tokens, {decision.timeout}s")
+        return decision
+
+    def record(
+        self,
+        decision: RouteDecision,
+        elapsed_seconds: float,
+        output_tokens: Optional[int] = None,
+        truncated: Optional[bool] = None,
+        error: Optional[str] = None,
+    ):
+        # Outcome of a routed generation, kept so decisions can be checked later
+        decision.elapsed_seconds = round(elapsed_seconds, 2)
+        decision.output_tokens = output_tokens
+        decision.truncated = truncated
+        decision.error = error
+        self.decisions.append(decision)
+
+        # refine the tier's throughput estimate from what the model actually did
+        tier = next((tier for tier in self.tiers if tier.name == decision.tier), None)
+        if tier and output_tokens and not error:
+            generating = max(0.1, elapsed_seconds - tier.base_latency)
+            tier.tokens_per_second = 0.8 * tier.tokens_per_second + 0.2 * (output_tokens / generating)
+
+        if self.log_path:
+            try:
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(decision.to_dict()) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not write routing log: {e}")
+
+    def snapshot(self, limit: int = 20) -> Dict[str, Any]:
+        by_tier: Dict[str, Dict[str, float]] = {}
+        for decision in self.decisions:
+            stats = by_tier.setdefault(decision.tier, {"count": 0, "total_seconds": 0.0, "truncated": 0, "errors": 0, "missed_target": 0})
+            stats["count"] += 1
+            stats["total_seconds"] += decision.elapsed_seconds or 0
+            stats["truncated"] += 1 if decision.truncated else 0
+            stats["errors"] += 1 if decision.error else 0
+            if decision.latency_target and (decision.elapsed_seconds or 0) > decision.latency_target:
+                stats["missed_target"] += 1
+
+        for stats in by_tier.values():
+            stats["avg_seconds"] = round(stats.pop("total_seconds") / stats["count"], 2)
+
+        return {
+            "tiers": by_tier,
+            "tokens_per_second": {tier.name: round(tier.tokens_per_second, 1) for tier in self.tiers},
+            "recent": [decision.to_dict() for decision in list(self.decisions)[-limit:]],
+        }
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+# types
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# report(status, progress, **extra), same shape as pipeline.Reporter
+Reporter = Callable[..., Awaitable[None]]
+
+# ONE PIECE OF WORK SHARED BY SEVERAL JOBS
+class Flight:
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        # token -> (job's reporter, job's waiting task)
+        self.subscribers: Dict[object, Tuple[Optional[Reporter], asyncio.Task]] = {}
+        self.last_report: Optional[Tuple[tuple, dict]] = None
+
+    async def fanout(self, *args, **kwargs):
+        # Every attached job gets the progress of the shared work
+        self.last_report = (args, kwargs)
+        for report, waiter in list(self.subscribers.values()):
+            if report is None:
+                continue
+            try:
+                await report(*args, **kwargs)
+            except Exception as e:
+                # e.g. the job was cancelled, detach it without stopping the work
+                logger.info(f"detaching subscriber: {e}")
+                waiter.cancel()
+
+
+# COALESCES CONCURRENT CALLS WITH THE SAME KEY INTO ONE
+# The work runs detached from whichever job started it, so cancelling that job
+# leaves the others attached. It is only cancelled when nobody waits on it anymore.
+class SingleFlight:
+    def __init__(self):
+        self.flights: Dict[Hashable, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, work: Callable[[Reporter], Awaitable[Any]], report: Optional[Reporter] = None) -> Any:
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = Flight()
+            self.flights[key] = flight
+            self.started += 1
+            flight.task = asyncio.create_task(work(flight.fanout))
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+            # catch the late joiner up with the latest progress
+            if report and flight.last_report:
+                args, kwargs = flight.last_report
+                await report(*args, **kwargs)
+
+        token = object()
+        flight.subscribers[token] = (report, asyncio.current_task())
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            del flight.subscribers[token]
+            if not flight.subscribers and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        # nobody may be left to read a failure
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self.flights),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
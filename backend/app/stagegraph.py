@@ -0,0 +1,96 @@
+import time
+import asyncio
+import logging
+# types
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass
+from loopmonitor import stage
+
+logger = logging.getLogger(__name__)
+
+# ONE NODE OF THE GRAPH, fn gets the results of its deps in order
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[..., Awaitable[Any]]
+    deps: Tuple[str, ...]
+
+
+# RUNS STAGES AS SOON AS THEIR INPUTS ARE READY
+# Only stages some target depends on are run, so a stage nobody consumes costs nothing.
+# Wall time follows the critical path rather than the sum of all stages.
+class StageGraph:
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        # name -> (start, end) seconds relative to run()
+        self.timings: Dict[str, Tuple[float, float]] = {}
+
+    def add(self, name: str, fn: Callable[..., Awaitable[Any]], *deps: str):
+        self.stages[name] = Stage(name, fn, deps)
+
+    def needed(self, targets: Iterable[str]) -> List[str]:
+        # targets plus everything they depend on, dependencies first
+        order: List[str] = []
+        def visit(name: str, path: Tuple[str, ...] = ()):
+            if name in path:
+                raise ValueError(f"Stage cycle: {' -> '.join(path + (name,))}")
+            if name in order:
+                return
+            for dep in self.stages[name].deps:
+                visit(dep, path + (name,))
+            order.append(name)
+        for target in targets:
+            visit(target)
+        return order
+
+    async def run(self, *targets: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(node: Stage):
+            inputs = [await tasks[dep] for dep in node.deps]
+            begin = time.perf_counter() - started
+            try:
+                with stage(node.name):
+                    return await node.fn(*inputs)
+            finally:
+                self.timings[node.name] = (begin, time.perf_counter() - started)
+
+        for name in self.needed(targets):
+            tasks[name] = asyncio.create_task(run_stage(self.stages[name]))
+
+        skipped = [name for name in self.stages if name not in tasks]
+        if skipped:
+            logger.info(f"skipping unused stages: {skipped}")
+
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            # one stage failed (or we were cancelled), nothing else is worth finishing
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+        return {name: task.result() for name, task in tasks.items()}
+
+    def critical_path(self) -> List[str]:
+        # walk back from the last stage to finish through whichever dep finished last
+        if not self.timings:
+            return []
+        name: Optional[str] = max(self.timings, key=lambda n: self.timings[n][1])
+        path = []
+        while name:
+            path.append(name)
+            deps = [dep for dep in self.stages[name].deps if dep in self.timings]
+            name = max(deps, key=lambda n: self.timings[n][1]) if deps else None
+        return path[::-1]
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "stages": {
+                name: {"start_ms": round(start * 1000, 1), "duration_ms": round((end - start) * 1000, 1)}
+                for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0])
+            },
+            "critical_path": self.critical_path(),
+            "wall_ms": round(max((end for _, end in self.timings.values()), default=0) * 1000, 1),
+        }
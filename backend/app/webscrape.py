@@ -1,18 +1,37 @@
+from __future__ import annotations
 import os
-import requests
 import asyncio
 import random
 import re
+import sys
+import time
+import zlib
 import base64
 import logging
-from browserbase import Browserbase
+import importlib
 from urllib.parse import urlparse
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
 # types
-from typing import List, Dict, Optional
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 from dataclasses import dataclass
-from playwright.async_api import async_playwright, Page
+from contextlib import asynccontextmanager, nullcontext
+from loopmonitor import stage
+from politeness import DomainScheduler, THROTTLE_STATUSES, host_of
+from profiling import JobProfile, current_profile
+from browserpool import REMOTE_CDP_URL, RemoteSession, RemoteSessionPool
+from harstore import HAR_MODE, HarMissing, HarSession, HarStore
+from adaptive import AdaptiveConcurrency
+from domsnapshot import DOM_CAPTURE, DOM_CAPTURE_MODES, capture_snapshot, clean_snapshot
+from domainprofile import MUTATION_CLOCK_JS, SETTLE_JS, DomainProfileStore, ScrapeObservation, ScrapePlan, needs_javascript
+from deadline import (
+    DEADLINE_EXTRACTION_RESERVE, DEADLINE_FINISH_RESERVE, DEADLINE_FULL_EXTRACTION, DEADLINE_MIN_ATTEMPT,
+    DEADLINE_VIEWPORT_SECONDS, current_deadline,
+)
+
+# playwright, bs4, browserbase and requests are imported where first used, importing
+# this module stays cheap and the cost lands in warmup() or the first scrape
+if TYPE_CHECKING:
+    from playwright.async_api import Browser, BrowserContext, Page
 
 # CONFIGURE LOGGING
 logging.basicConfig(level=logging.INFO)
@@ -21,88 +40,578 @@ logger = logging.getLogger(__name__)
 # load dotenv
 load_dotenv()
 
-# HOLDS ALL INFORMATION SCRAPED FROM WEBSITE
+# SIZE CAPS FOR SCRAPED DATA (override with env vars)
+@dataclass
+class ScrapeLimits:
+    max_dom_chars: int = int(os.getenv("SCRAPE_MAX_DOM_CHARS", 500_000))
+    max_screenshot_bytes: int = int(os.getenv("SCRAPE_MAX_SCREENSHOT_BYTES", 8 * 1024 * 1024))
+    max_css_patterns: int = int(os.getenv("SCRAPE_MAX_CSS_PATTERNS", 15))
+    max_css_variables: int = int(os.getenv("SCRAPE_MAX_CSS_VARIABLES", 100))
+    max_colors: int = int(os.getenv("SCRAPE_MAX_COLORS", 15))
+    max_fonts: int = int(os.getenv("SCRAPE_MAX_FONTS", 20))
+    max_layout_items: int = int(os.getenv("SCRAPE_MAX_LAYOUT_ITEMS", 30))
+    max_assets_per_type: int = int(os.getenv("SCRAPE_MAX_ASSETS_PER_TYPE", 20))
+    max_metadata_chars: int = int(os.getenv("SCRAPE_MAX_METADATA_CHARS", 2000))
+    max_links: int = int(os.getenv("SCRAPE_MAX_LINKS", 200))
+
+
+# TIME AND NODE BUDGET FOR ONE IN-PAGE EXTRACTOR
+@dataclass
+class ExtractionBudget:
+    ms: float  # wall time for the element scan
+    nodes: int  # elements sampled at most
+    # elements in a row that add nothing new before the scan stops early
+    patience: int = 0
+    # hit tests per side over the viewport, sampled before the rest of the page
+    grid: int = int(os.getenv("EXTRACT_VIEWPORT_GRID", 6))
+
+    def __post_init__(self):
+        self.patience = self.patience or max(60, self.nodes // 4)
+
+    def to_js(self) -> Dict[str, any]:
+        return {"ms": self.ms, "nodes": self.nodes, "patience": self.patience, "grid": self.grid}
+
+def extraction_budgets() -> Dict[str, ExtractionBudget]:
+    # EXTRACT_<NAME>_MS / EXTRACT_<NAME>_NODES override the defaults per extractor
+    defaults = {"animations": (150, 1500), "colors": (250, 800), "typography": (120, 400), "layout": (120, 600)}
+    return {
+        name: ExtractionBudget(
+            ms=float(os.getenv(f"EXTRACT_{name.upper()}_MS", ms)),
+            nodes=int(os.getenv(f"EXTRACT_{name.upper()}_NODES", nodes)),
+        )
+        for name, (ms, nodes) in defaults.items()
+    }
+
+
+# HOW SCREENSHOTS ARE CAPTURED AND ENCODED (override with env vars)
 @dataclass
+class ScreenshotOptions:
+    format: str = os.getenv("SCREENSHOT_FORMAT", "webp")  # webp, jpeg or png
+    quality: int = int(os.getenv("SCREENSHOT_QUALITY", 80))  # ignored for png
+    # tall and infinite scroll pages are cut off here
+    max_height: int = int(os.getenv("SCREENSHOT_MAX_HEIGHT", 8000))
+    # 0 disables thumbnails
+    thumbnail_width: int = int(os.getenv("SCREENSHOT_THUMBNAIL_WIDTH", 320))
+    # reuse the previous viewport's image when the layout didn't respond to the resize
+    dedupe_viewports: bool = os.getenv("SCREENSHOT_DEDUPE_VIEWPORTS", "1") == "1"
+
+    def __post_init__(self):
+        self.format = self.format.lower()
+        if self.format not in ("webp", "jpeg", "png"):
+            raise ValueError(f"Unsupported screenshot format: {self.format}")
+
+    @property
+    def mime_type(self) -> str:
+        return f"image/{self.format}"
+
+# webp can't encode anything taller than this
+WEBP_MAX_DIMENSION = 16383
+
+# Page height plus the size and vertical position of every element. Widths that just follow the
+# viewport are ignored, so a layout that doesn't respond to a resize signs the same.
+LAYOUT_SIGNATURE_JS = """
+() => {
+    const root = document.documentElement;
+    const height = Math.max(root.scrollHeight, document.body ? document.body.scrollHeight : 0);
+    const parts = [height];
+    const elements = document.body ? document.body.getElementsByTagName('*') : [];
+    for (let i = 0; i < elements.length && i < 2000; i++) {
+        const rect = elements[i].getBoundingClientRect();
+        const width = Math.abs(rect.width - window.innerWidth) <= 1 ? 'full' : Math.round(rect.width);
+        parts.push(width, Math.round(rect.height), Math.round(rect.top + window.scrollY));
+    }
+    return { height: height, signature: parts.join(',') };
+}
+"""
+
+
+# Installs window.__cloneSampler(budget, visit) in the page. It visits a stratified sample of
+# the body's elements: first what is on screen (hit tests on a grid over the viewport), then
+# document order in strata that get finer each pass, so stopping early still covers the page
+# top to bottom. visit(el, rect) returns true when the element added something new, 'done'
+# to stop. Stops on the time or node budget or after `patience` visits with nothing new, and
+# returns how much of the page was covered.
+DOM_SAMPLER_JS = """
+() => {
+    window.__cloneSampler = (budget, visit) => {
+        const started = performance.now();
+        const all = document.body ? document.body.getElementsByTagName('*') : [];
+        const total = all.length;
+        const pageHeight = Math.max(document.documentElement.scrollHeight, 1);
+        const seen = new Set();
+        // sampled elements per quarter of the page height
+        const bands = [0, 0, 0, 0];
+        let sampled = 0, visible = 0, sinceNew = 0, stopped = null;
+
+        const take = (el) => {
+            if (!el || seen.has(el) || el === document.body || el === document.documentElement) return true;
+            if (sampled >= budget.nodes) { stopped = 'nodes'; return false; }
+            if (performance.now() - started > budget.ms) { stopped = 'time'; return false; }
+            seen.add(el);
+            sampled++;
+            const rect = el.getBoundingClientRect();
+            if (rect.bottom > 0 && rect.top < window.innerHeight) visible++;
+            const band = Math.floor((rect.top + window.scrollY) / pageHeight * bands.length);
+            bands[Math.min(bands.length - 1, Math.max(0, band))]++;
+            const found = visit(el, rect);
+            if (found === 'done') { stopped = 'done'; return false; }
+            if (found) sinceNew = 0;
+            else if (++sinceNew >= budget.patience) { stopped = 'saturated'; return false; }
+            return true;
+        };
+
+        viewport: for (let row = 0; row < budget.grid; row++) {
+            for (let col = 0; col < budget.grid; col++) {
+                const x = (col + 0.5) * window.innerWidth / budget.grid;
+                const y = (row + 0.5) * window.innerHeight / budget.grid;
+                for (const el of document.elementsFromPoint(x, y)) {
+                    if (!take(el)) break viewport;
+                }
+            }
+        }
+
+        if (!stopped && total) {
+            const strata = Math.min(total, budget.nodes);
+            const size = total / strata;
+            const visited = new Uint8Array(strata);
+            let step = 1;
+            while (step < strata) step *= 2;
+            document: for (; step >= 1; step /= 2) {
+                for (let i = 0; i < strata; i += step) {
+                    if (visited[i]) continue;
+                    visited[i] = 1;
+                    if (!take(all[Math.min(total - 1, Math.floor((i + Math.random()) * size))])) break document;
+                }
+            }
+        }
+
+        return {
+            total_nodes: total,
+            sampled: sampled,
+            visible: visible,
+            bands: bands,
+            ratio: total ? Math.round(sampled / total * 1000) / 1000 : 1,
+            elapsed_ms: Math.round((performance.now() - started) * 10) / 10,
+            stopped: stopped || 'complete',
+            budget_ms: budget.ms,
+            budget_nodes: budget.nodes
+        };
+    };
+}
+"""
+
+
+# rough deep size of plain python data, used for memory accounting
+def approx_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(approx_size(item) for item in obj)
+    return size
+
+
+# AGGREGATES NETWORK REQUESTS AS THEY STREAM IN
+class RequestStats:
+    __slots__ = ("counts", "urls", "hosts", "max_urls_per_type")
+
+    def __init__(self, max_urls_per_type: int = 20):
+        self.counts: Dict[str, int] = {}
+        self.urls: Dict[str, Dict[str, None]] = {}  # insertion ordered set
+        self.hosts: Dict[str, int] = {}
+        self.max_urls_per_type = max_urls_per_type
+
+    def add(self, url: str, resource_type: str):
+        self.counts[resource_type] = self.counts.get(resource_type, 0) + 1
+
+        host = urlparse(url).netloc
+        if host:
+            self.hosts[host] = self.hosts.get(host, 0) + 1
+
+        # only the first few urls per type are kept
+        urls = self.urls.setdefault(resource_type, {})
+        if len(urls) < self.max_urls_per_type:
+            urls[url] = None
+
+    def urls_for(self, resource_type: str) -> List[str]:
+        return list(self.urls.get(resource_type, {}))
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "total": sum(self.counts.values()),
+            "by_type": dict(self.counts),
+            "top_hosts": dict(sorted(self.hosts.items(), key=lambda item: -item[1])[:10]),
+        }
+
+
+# HOLDS ALL INFORMATION SCRAPED FROM WEBSITE
 class ScrapingResult:
-    url: str
-    screenshots: Dict[str, str]  # base64 images
-    dom_structure: str
-    extracted_css: Dict[str, any]
-    typography: Dict[str, any]
-    color_palette: List[str]
-    layout_info: Dict[str, any]
-    assets: Dict[str, str] # urls
-    metadata: Dict[str, any]
-    success: bool
-    error_message: Optional[str] = None
-    
+    # large fields (dom, screenshots) are kept compact and decoded on access
+    __slots__ = (
+        "url", "_dom", "_screenshots", "extracted_css", "typography", "color_palette",
+        "layout_info", "assets", "metadata", "request_stats", "links", "success", "error_message",
+        "_thumbnails", "screenshot_stats", "extraction_coverage", "dom_skeleton",
+    )
+
+    def __init__(
+        self,
+        url: str,
+        screenshots: Dict[str, bytes],  # raw image bytes
+        dom_structure: str,
+        extracted_css: Dict[str, any],
+        typography: Dict[str, any],
+        color_palette: List[str],
+        layout_info: Dict[str, any],
+        assets: Dict[str, List[str]],  # urls
+        metadata: Dict[str, any],
+        success: bool,
+        error_message: Optional[str] = None,
+        request_stats: Optional[Dict[str, any]] = None,
+        links: Optional[List[str]] = None,
+        limits: Optional[ScrapeLimits] = None,
+        thumbnails: Optional[Dict[str, bytes]] = None,
+        screenshot_stats: Optional[Dict[str, Dict[str, any]]] = None,  # per viewport
+        extraction_coverage: Optional[Dict[str, Dict[str, any]]] = None,  # per extractor
+        dom_skeleton: str = "",  # outline of the laid out boxes, snapshot capture only
+    ):
+        limits = limits or ScrapeLimits()
+        self.url = url
+        self.dom_structure = dom_structure[:limits.max_dom_chars]
+        self._screenshots = {
+            name: data for name, data in screenshots.items()
+            if len(data) <= limits.max_screenshot_bytes
+        }
+        self._thumbnails = thumbnails or {}
+        self.screenshot_stats = screenshot_stats or {}
+        self.extracted_css = self._cap_css(extracted_css, limits)
+        self.typography = self._cap_typography(typography, limits)
+        self.color_palette = color_palette[:limits.max_colors]
+        self.layout_info = self._cap_layout(layout_info, limits)
+        self.assets = {kind: urls[:limits.max_assets_per_type] for kind, urls in assets.items()}
+        self.metadata = {
+            key: value[:limits.max_metadata_chars] if isinstance(value, str) else value
+            for key, value in metadata.items()
+        }
+        self.request_stats = request_stats or {}
+        self.extraction_coverage = extraction_coverage or {}
+        self.dom_skeleton = dom_skeleton
+        self.links = (links or [])[:limits.max_links]
+        self.success = success
+        self.error_message = error_message
+
+    # DOM is stored zlib compressed, html shrinks ~5-10x
+    @property
+    def dom_structure(self) -> str:
+        return zlib.decompress(self._dom).decode("utf-8") if self._dom else ""
+
+    @dom_structure.setter
+    def dom_structure(self, html: str):
+        self._dom = zlib.compress(html.encode("utf-8"), 1) if html else b""
+
+    # screenshots are kept as raw bytes, base64 only when someone asks
+    @property
+    def screenshots(self) -> Dict[str, str]:
+        return {name: base64.b64encode(data).decode("utf-8") for name, data in self._screenshots.items()}
+
+    @property
+    def screenshot_names(self) -> List[str]:
+        return list(self._screenshots)
+
+    def screenshot_bytes(self, name: str) -> Optional[bytes]:
+        return self._screenshots.get(name)
+
+    def attach_screenshots(
+        self,
+        screenshots: Dict[str, bytes],
+        thumbnails: Dict[str, bytes],
+        screenshot_stats: Dict[str, Dict[str, any]],
+        limits: Optional[ScrapeLimits] = None,
+    ):
+        # Screenshots finish after extraction, they are added to the result in place
+        limits = limits or ScrapeLimits()
+        self._screenshots = {
+            name: data for name, data in screenshots.items()
+            if len(data) <= limits.max_screenshot_bytes
+        }
+        self._thumbnails = thumbnails
+        self.screenshot_stats = screenshot_stats
+
+    def thumbnail_bytes(self, name: str) -> Optional[bytes]:
+        return self._thumbnails.get(name)
+
+    def screenshot_mime_type(self, name: str) -> str:
+        return self.screenshot_stats.get(name, {}).get("mime_type", "image/png")
+
+    def memory_usage(self) -> int:
+        size = sys.getsizeof(self) + len(self._dom) + len(self.dom_skeleton)
+        # deduplicated viewports share one bytes object
+        images = {id(data): data for data in (*self._screenshots.values(), *self._thumbnails.values())}
+        size += sum(len(data) for data in images.values())
+        for field in ("extracted_css", "typography", "color_palette", "layout_info", "assets", "metadata", "request_stats", "links", "screenshot_stats", "extraction_coverage"):
+            size += approx_size(getattr(self, field))
+        return size
+
+    @staticmethod
+    def _cap_css(css: Dict[str, any], limits: ScrapeLimits) -> Dict[str, any]:
+        css = dict(css)
+        if css.get("common_patterns"):
+            css["common_patterns"] = css["common_patterns"][:limits.max_css_patterns]
+        if css.get("animations"):
+            css["animations"] = css["animations"][:limits.max_layout_items]
+        if css.get("css_variables"):
+            css["css_variables"] = dict(list(css["css_variables"].items())[:limits.max_css_variables])
+        return css
+
+    @staticmethod
+    def _cap_typography(typography: Dict[str, any], limits: ScrapeLimits) -> Dict[str, any]:
+        typography = dict(typography)
+        if typography.get("fonts"):
+            typography["fonts"] = typography["fonts"][:limits.max_fonts]
+        return typography
+
+    @staticmethod
+    def _cap_layout(layout: Dict[str, any], limits: ScrapeLimits) -> Dict[str, any]:
+        layout = dict(layout)
+        if layout.get("structure"):
+            layout["structure"] = layout["structure"][:limits.max_layout_items]
+        if layout.get("grid_info"):
+            layout["grid_info"] = dict(list(layout["grid_info"].items())[:limits.max_layout_items])
+        return layout
+
 class WebScrape:
     logger.info("scraping website")
     
-    def create_session():
-        bb = Browserbase(api_key=os.getenv("BROWSERBASE_KEY"))
+    def create_session(self):
+        from browserbase import Browserbase
+        bb = Browserbase(api_key=self.browserbase_api_key or os.getenv("BROWSERBASE_KEY"))
         session = bb.sessions.create(
             project_id=os.getenv("BROWSERBASE_ID"),
         )
         return session
 
     
-    def __init__(self, use_browserbase: bool = True, browserbase_api_key: str = ""):
+    def __init__(
+        self,
+        use_browserbase: bool = True,
+        browserbase_api_key: str = "",
+        limits: Optional[ScrapeLimits] = None,
+        scheduler: Optional[DomainScheduler] = None,
+        screenshot_options: Optional[ScreenshotOptions] = None,
+        budgets: Optional[Dict[str, ExtractionBudget]] = None,
+        har_mode: str = HAR_MODE,
+        har_store: Optional[HarStore] = None,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        dom_capture: str = DOM_CAPTURE,
+        profiles: Optional[DomainProfileStore] = None,
+    ):
         self.use_browserbase = use_browserbase
         self.browserbase_api_key = browserbase_api_key
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        self.limits = limits or ScrapeLimits()
+        self.screenshot_options = screenshot_options or ScreenshotOptions()
+        # per extractor limits for the in-page element scans
+        self.budgets = budgets or extraction_budgets()
+        if dom_capture not in DOM_CAPTURE_MODES:
+            raise ValueError(f"Unknown DOM capture mode: {dom_capture}")
+        self.dom_capture = dom_capture
+        # learned per host wait strategy, timeouts and blocked third party hosts
+        self.profiles = profiles or DomainProfileStore()
+        # record/replay navigations as per url HAR files, scrapes can override the mode
+        self.har_mode = har_mode
+        self.har_store = har_store or HarStore()
+        # context -> the HAR it records to or replays from
+        self._har: Dict[BrowserContext, HarSession] = {}
+        # limits contexts on the local browser, remote ones don't load this host
+        self.concurrency = concurrency
+        self._slotted: set = set()
+        # per host rate limits, shared with the asset pipeline when passed in
+        self.scheduler = scheduler or DomainScheduler()
+        self.playwright = None
+        self.browser: Optional[Browser] = None
+        self._browser_lock = asyncio.Lock()
+        self._playwright_lock = asyncio.Lock()
+        # pooled remote connections (REMOTE_CDP_URL or browserbase), the local browser is the fallback
+        remote = REMOTE_CDP_URL or (use_browserbase and browserbase_api_key)
+        self.remote_pool = RemoteSessionPool(self._remote_endpoint) if remote else None
+        # context -> remote session it runs on
+        self._remote: Dict[BrowserContext, RemoteSession] = {}
+        # context -> profile of the job tracing it
+        self._traced: Dict[BrowserContext, "JobProfile"] = {}
+        self._session = None
+
+    @property
+    def session(self):
+        # plain http session, built on first use
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            })
+        return self._session
 
+    async def warmup(self):
+        # Launches the shared local browser ahead of the first job, remote sessions are per context
+        await asyncio.to_thread(importlib.import_module, "bs4")
+        if self.remote_pool is None:
+            await self._get_browser()
+            return
+        await self._start_playwright()
+        await self.remote_pool.fill(self.playwright, max(1, self.remote_pool.min_idle))
+
+    async def _start_playwright(self):
+        async with self._playwright_lock:
+            if self.playwright is None:
+                from playwright.async_api import async_playwright
+                self.playwright = await async_playwright().start()
+
+    async def _remote_endpoint(self) -> str:
+        if REMOTE_CDP_URL:
+            return REMOTE_CDP_URL
+        if os.getenv("BROWSERBASE_ID"):
+            # a session created through the api, so it runs under the project's settings
+            session = await asyncio.to_thread(self.create_session)
+            return session.connect_url
+        return f"wss://connect.browserbase.com?apiKey={self.browserbase_api_key}"
+
+        
+    async def scrape_website(
+        self,
+        url: str,
+        max_retries: int = 3,
+        context: Optional[BrowserContext] = None,
+        screenshots: bool = True,
+        links: bool = True,
+        har_mode: Optional[str] = None,
+    ) -> ScrapingResult:
+        # context: reuse a caller owned context (crawls share one so the http cache is shared)
+        result, pending = await self.scrape_staged(url, max_retries, context, screenshots, links, har_mode)
+        if pending is not None:
+            await pending
+        return result
+    
+    async def scrape_staged(
+        self,
+        url: str,
+        max_retries: int = 3,
+        context: Optional[BrowserContext] = None,
+        screenshots: bool = True,
+        links: bool = True,
+        har_mode: Optional[str] = None,
+    ) -> Tuple[ScrapingResult, Optional[asyncio.Task]]:
+        # Returns as soon as the page is extracted. Screenshots keep running on the
+        # open page in the returned task, which attaches them to the result when done.
+        # har_mode (see harstore.py) only applies to scrapes in their own context, a shared
+        # context spans many urls and always goes to the network.
+        if not self._is_valid_url(url):
+            return self._create_error_result(url, "Invalid URL"), None
+        har_mode = har_mode or self.har_mode
+        # a job deadline stops retries the scrape budget can't fit, the first attempt always runs
+        deadline = current_deadline.get()
+        last_error = "Max retries exceeded"
         
-    async def scrape_website(self, url: str, max_retries: int = 3) -> ScrapingResult:
         for attempt in range(max_retries):
+            if deadline is not None and attempt > 0 and deadline.scrape_budget() < DEADLINE_MIN_ATTEMPT:
+                deadline.degrade("scrape", "retries skipped", f"after attempt {attempt} of {max_retries}")
+                return self._create_error_result(url, last_error), None
+            owned_context = None
+            page = None
             try:
                 logger.info(f"attempt {attempt} for {url} ")
                 
-                if not self._is_valid_url(url):
-                    return self._create_error_result();
-                
-                await self._initialize_browser()
+                if context is None:
+                    owned_context = await self._new_context()
+                    await self._attach_har(owned_context, url, har_mode, attempt)
 
-                result = await self._perform_scraping(url)
+                result, page = await self._perform_scraping(context or owned_context, url, links, attempt)
                 
                 if result.success:
-                    return result
+                    har = self._har.get(owned_context)
+                    if har is not None:
+                        har.succeeded = True
+                        result.request_stats["har"] = har.to_dict()
+                    if not screenshots:
+                        return result, None
+                    # the task owns the page (and context) from here on
+                    pending = asyncio.create_task(self._finish_screenshots(result, page, owned_context))
+                    page = owned_context = None
+                    return result, pending
+                last_error = result.error_message or last_error
                 
+            except HarMissing as e:
+                # nothing to replay, retrying can't change that
+                return self._create_error_result(url, str(e)), None
             except Exception as e:
                 logger.error(f"Scraping attempt {attempt + 1} failed: {str(e)}")
                 if attempt == max_retries - 1:
-                    return self._create_error_result();
-                
+                    return self._create_error_result(url, str(e)), None
+                last_error = str(e)
                 
-                # sleep
+                # sleep, never past the scrape budget
                 jitter = random.uniform(0, 1)
-                await asyncio.sleep((2 ** attempt) + jitter) 
+                backoff = (2 ** attempt) + jitter
+                if deadline is not None:
+                    backoff = min(backoff, deadline.scrape_budget())
+                await asyncio.sleep(backoff) 
             finally:
-                await self._cleanup_browser()
+                if page is not None:
+                    await page.close()
+                if owned_context is not None:
+                    await self._close_context(owned_context)
         
         # fallback failure
-        return ScrapingResult(
-            url=url, screenshots={}, dom_structure="", 
-            extracted_css={}, color_palette=[], typography={}, 
-            layout_info={}, assets={}, metadata={},
-            success=False, error_message="Max retries exceeded"
+        return self._create_error_result(url, "Max retries exceeded"), None
+    
+    def _renderer_crashed(self, url: str, observation: Optional[ScrapeObservation] = None):
+        logger.error(f"Renderer crashed on {url}")
+        if observation is not None:
+            observation.failure = "crashed"
+        if self.concurrency is not None:
+            self.concurrency.record_crash(f"renderer crashed on {url}")
+    
+    async def _attach_har(self, context: BrowserContext, url: str, mode: str, attempt: int):
+        session = self.har_store.plan(url, mode, attempt)
+        if session is None:
+            return
+        await context.route_from_har(
+            session.path,
+            # strict replay never touches the network, the cache tier lets misses through
+            not_found="abort" if mode == "replay" else "fallback",
+            update=not session.replay,
+            update_content="attach",
+            update_mode="full",
         )
-        
-    async def _initialize_browser(self):
+        self._har[context] = session
+    
+    async def _finish_screenshots(self, result: ScrapingResult, page: Page, owned_context: Optional[BrowserContext]):
         try:
-            playwright = await async_playwright().start()
+            with stage("screenshots"):
+                screenshots, thumbnails, screenshot_stats = await self._capture_screenshots(page)
+            result.attach_screenshots(screenshots, thumbnails, screenshot_stats, self.limits)
+        finally:
+            await page.close()
+            if owned_context is not None:
+                await self._close_context(owned_context)
+    
+    @asynccontextmanager
+    async def shared_context(self):
+        # One context for several scrapes of the same site
+        context = await self._new_context()
+        try:
+            yield context
+        finally:
+            await self._close_context(context)
+        
+    async def _get_browser(self) -> Browser:
+        # The local browser is launched once and shared, every scrape gets its own context
+        async with self._browser_lock:
+            if self.browser is not None and self.browser.is_connected():
+                return self.browser
             
-            if self.use_browserbase and self.browserbase_api_key:
-                # Connect to Browserbase
-                self.browser = await playwright.chromium.connect_over_cdp(
-                    f"wss://connect.browserbase.com?apiKey={self.browserbase_api_key}"
-                )
-            else:
+            try:
+                await self._start_playwright()
+                
                 # Launch local browser
-                self.browser = await playwright.chromium.launch(
+                self.browser = await self.playwright.chromium.launch(
                     headless=True,
                     args=[
                         '--no-sandbox',
@@ -112,86 +621,296 @@ class WebScrape:
                         '--disable-features=VizDisplayCompositor'
                     ]
                 )
-            
-            # Create context with mobile user agent for better compatibility
-            self.context = await self.browser.new_context(
+                return self.browser
+                
+            except Exception as e:
+                logger.error(f"Browser initialization failed: {str(e)}")
+                raise
+    
+    async def _new_context(self) -> BrowserContext:
+        # a pooled remote connection when one is free, the local browser otherwise
+        session = None
+        if self.remote_pool is not None:
+            await self._start_playwright()
+            session = await self.remote_pool.acquire(self.playwright)
+            if session is None:
+                self.remote_pool.stats["local_fallbacks"] += 1
+        slotted = session is None and self.concurrency is not None
+        if slotted:
+            await self.concurrency.acquire()
+        
+        # Create context with desktop user agent for better compatibility
+        try:
+            browser = session.browser if session is not None else await self._get_browser()
+            context = await browser.new_context(
                 viewport={'width': 1920, 'height': 1080},
                 user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             )
-            
-        except Exception as e:
-            logger.error(f"Browser initialization failed: {str(e)}")
+        except BaseException:
+            if session is not None:
+                await self.remote_pool.release(session, broken=True)
+            if slotted:
+                await self.concurrency.release()
             raise
+        if session is not None:
+            self._remote[context] = session
+        if slotted:
+            self._slotted.add(context)
         
-    async def _perform_scraping(self, url: str) -> ScrapingResult:
+        # profiled jobs record a playwright trace (network, screenshots, dom snapshots)
+        profile = current_profile.get()
+        if profile is not None:
+            try:
+                await context.tracing.start(screenshots=True, snapshots=True)
+                self._traced[context] = profile
+            except Exception as e:
+                logger.error(f"Starting trace failed: {str(e)}")
+        return context
+    
+    async def _close_context(self, context: BrowserContext):
+        profile = self._traced.pop(context, None)
+        if profile is not None:
+            try:
+                path = profile.trace_path()
+                await context.tracing.stop(path=path)
+                profile.keep_trace(path)
+            except Exception as e:
+                logger.error(f"Saving trace failed: {str(e)}")
+        
+        session = self._remote.pop(context, None)
+        broken = False
+        try:
+            await context.close()
+        except Exception as e:
+            broken = True
+            logger.error(f"Context cleanup failed: {str(e)}")
+        # the connection goes back to the pool, the local browser stays up
+        if session is not None:
+            await self.remote_pool.release(session, broken)
+        
+        # the recording is written on close, kept only if the scrape succeeded
+        har = self._har.pop(context, None)
+        if har is not None:
+            await asyncio.to_thread(self.har_store.finish, har)
+        
+        if context in self._slotted:
+            self._slotted.discard(context)
+            await self.concurrency.release()
+        
+    async def _perform_scraping(self, context: BrowserContext, url: str, links: bool = True, attempt: int = 0) -> Tuple[ScrapingResult, Optional[Page]]:
+        # On success the page is returned still open for screenshots, the caller closes it
+        page = None
+        # a replayed page never reaches the host, so it doesn't count against its limits
+        # and has no timings worth learning from
+        har = self._har.get(context)
+        replaying = har is not None and har.replay
+        if replaying:
+            plan = ScrapePlan(host_of(url), reason="har replay")
+        else:
+            plan = await asyncio.to_thread(self.profiles.plan_for, url, attempt)
+        observation = ScrapeObservation(plan)
+        deadline = current_deadline.get()
+        # navigation gets what the scrape budget leaves after extraction
+        timeout_ms = plan.timeout_ms
+        if deadline is not None:
+            timeout_ms = min(timeout_ms, max(1000.0, (deadline.scrape_budget() - DEADLINE_EXTRACTION_RESERVE) * 1000))
+            if timeout_ms < plan.timeout_ms:
+                deadline.degrade("scrape", "navigation timeout shortened", f"{timeout_ms / 1000:.1f}s")
         try:
             # Create new page
-            page = await self.context.new_page()
+            page = await context.new_page()
+            # an OOM-killed renderer means too many pages for this host right now
+            page.on("crash", lambda _: self._renderer_crashed(url, observation))
             
             # Set up request/response interception for better asset tracking
-            requests_log = []
+            request_stats = RequestStats(self.limits.max_assets_per_type)
+            
+            def handle_request(request):
+                request_stats.add(request.url, request.resource_type)
             
-            async def handle_request(request):
-                requests_log.append({
-                    'url': request.url,
-                    'resource_type': request.resource_type,
-                    'method': request.method
-                })
+            # what third party hosts cost, for the profile's blocking rules
+            first_party = plan.host[4:] if plan.host.startswith("www.") else plan.host
+            def handle_finished(request):
+                observation.add_request(request.url, request.resource_type, request.timing.get("responseEnd", -1), first_party)
             
             page.on('request', handle_request)
+            page.on('requestfinished', handle_finished)
+            await page.add_init_script(MUTATION_CLOCK_JS)
+            for host in plan.block_hosts:
+                await page.route(f"**://{host}/**", lambda route: route.abort())
             
             # Navigate to URL with timeout
-            await page.goto(url, wait_until='networkidle', timeout=30000)
-            
-            # Wait for page to be fully loaded
-            await page.wait_for_timeout(2000)
-            
-            # Take screenshots at different viewport sizes
-            screenshots = await self._capture_screenshots(page)
-            
-            # Extract DOM structure
-            dom_structure = await page.content()
-            
-            # Extract CSS information
-            extracted_css = await self._extract_css_info(page)
-            
-            # Extract color palette
-            color_palette = await self._extract_color_palette(page)
-            
-            # Extract typography
-            typography = await self._extract_typography(page)
-            
-            # Extract layout information
-            layout_info = await self._extract_layout_info(page)
+            with stage("navigate"):
+                started = time.perf_counter()
+                async with nullcontext() if replaying else self.scheduler.slot(url):
+                    response = await page.goto(url, wait_until=plan.wait_until, timeout=timeout_ms)
+                observation.navigate_ms = round((time.perf_counter() - started) * 1000, 1)
+                if plan.wait_until == "networkidle":
+                    observation.networkidle = True
+                
+                if response is not None and not replaying:
+                    self.scheduler.report(url, response.status, response.headers.get('retry-after'))
+                    # the next attempt waits in scheduler.slot until the host's pause is over
+                    if response.status in THROTTLE_STATUSES:
+                        observation.failure = "throttled"
+                        return self._create_error_result(url, f"Throttled by host ({response.status})"), None
+                
+                # Wait for page to be fully loaded: a fixed pause by default, until the DOM
+                # settles around the host's usual readiness time with a profile, both cut short
+                # to what the deadline leaves before extraction
+                started = time.perf_counter()
+                max_wait_ms = None
+                if deadline is not None:
+                    max_wait_ms = max(0.0, (deadline.scrape_budget() - DEADLINE_EXTRACTION_RESERVE) * 1000)
+                if plan.settle_until_ms is None:
+                    cut = max_wait_ms is not None and max_wait_ms < plan.settle_ms
+                    await page.wait_for_timeout(max_wait_ms if cut else plan.settle_ms)
+                    settle = await page.evaluate(SETTLE_JS, {"quiet": 0, "until": 0})
+                else:
+                    settle = await page.evaluate(SETTLE_JS, {"quiet": plan.quiet_ms, "until": plan.settle_until_ms, "wait": max_wait_ms})
+                    cut = settle["cut"]
+                observation.settle_ms = round((time.perf_counter() - started) * 1000, 1)
+                observation.ready_ms = settle["ready_ms"]
+                if cut:
+                    deadline.degrade("scrape", "settle shortened", f"{observation.settle_ms:.0f}ms")
+                    # a wait cut short says nothing about when the page is ready
+                    observation.ready_ms = None
+                observation.js_required = await self._needs_javascript(page, response)
             
-            # Extract assets from requests and DOM
-            assets = await self._extract_assets(page, requests_log, url)
+            # Extract at the desktop viewport, before screenshots start resizing the page
+            with stage("extract"):
+                # Extract DOM structure, as a node table snapshot or serialized html
+                snapshot, dom_structure = await self._capture_dom(page)
+                
+                # element scans below sample the page within their budget, coverage says how much they saw
+                await page.evaluate(DOM_SAMPLER_JS)
+                coverage: Dict[str, Dict[str, any]] = {}
+                skipped = self._skipped_extractors(deadline)
+                
+                # Extract CSS information
+                extracted_css = {} if "css" in skipped else await self._extract_css_info(page, coverage)
+                
+                # Extract color palette
+                color_palette = await self._extract_color_palette(page, coverage)
+                
+                # Extract typography
+                typography = {"fonts": [], "headings": {}, "body_text": {}} if "typography" in skipped else await self._extract_typography(page, coverage)
+                
+                # Extract layout information
+                layout_info = {"structure": [], "grid_info": {}} if "layout" in skipped else await self._extract_layout_info(page, coverage)
+                
+                # Extract assets from requests and DOM
+                assets = await self._extract_assets(page, request_stats, url)
+                
+                # Extract metadata
+                metadata = await self._extract_metadata(page)
+                
+                # Extract links, only crawls follow them
+                links = await self._extract_links(page, url) if links else []
             
-            # Extract metadata
-            metadata = await self._extract_metadata(page)
-      
-            await page.close()
+            with stage("clean_dom"):
+                dom_skeleton = ""
+                if snapshot is not None:
+                    # off the loop, big pages take a few hundred ms
+                    dom_structure, dom_skeleton, coverage["dom"] = await asyncio.to_thread(clean_snapshot, snapshot)
+                    snapshot = None
+                else:
+                    dom_structure = self._clean_dom(dom_structure)
+                    coverage["dom"] = {"mode": "html"}
             
-            return ScrapingResult(
+            result = ScrapingResult(
                 url=url,
-                screenshots=screenshots,
-                dom_structure=self._clean_dom(dom_structure),
+                screenshots={},
+                dom_structure=dom_structure,
                 extracted_css=extracted_css,
                 color_palette=color_palette,
                 typography=typography,
                 layout_info=layout_info,
                 assets=assets,
                 metadata=metadata,
-                success=True
+                success=True,
+                request_stats={**request_stats.to_dict(), "profile": observation.to_dict()},
+                links=links,
+                limits=self.limits,
+                extraction_coverage=coverage,
+                dom_skeleton=dom_skeleton
             )
+            # handed to the caller, still open
+            open_page, page = page, None
+            return result, open_page
             
         except Exception as e:
             logger.error(f"Scraping execution failed: {str(e)}")
-            return self._create_error_result(url, str(e))
+            if observation.failure is None and timeout_ms < plan.timeout_ms and observation.navigate_ms is None:
+                # the deadline's timeout ran out, not the host's
+                observation.failure = "deadline"
+            elif observation.failure is None:
+                observation.failure = await self._failure_mode(page, e, observation)
+            return self._create_error_result(url, str(e)), None
+        finally:
+            if page is not None:
+                await page.close()
+            if not replaying:
+                await asyncio.to_thread(self.profiles.record, observation)
+    
+    def _skipped_extractors(self, deadline) -> List[str]:
+        # Under deadline pressure the extractors the prompt doesn't use go first (css_info only
+        # feeds the template preview), then layout and typography. Colors, assets and metadata
+        # always run, the generated page can't do without them.
+        if deadline is None:
+            return []
+        budget = deadline.scrape_budget()
+        if budget >= DEADLINE_FULL_EXTRACTION:
+            return []
+        skipped = ["css"] if budget >= DEADLINE_FULL_EXTRACTION / 2 else ["css", "layout", "typography"]
+        deadline.degrade("scrape", "extractors skipped", ", ".join(skipped))
+        return skipped
+    
+    async def _failure_mode(self, page: Optional[Page], error: Exception, observation: ScrapeObservation) -> str:
+        # A navigation timeout on a page that did load means networkidle never came
+        if observation.navigate_ms is not None or type(error).__name__ != "TimeoutError":
+            return "error"
+        if observation.plan.wait_until == "networkidle" and page is not None:
+            try:
+                if await page.evaluate("document.readyState") == "complete":
+                    observation.networkidle = False
+                    return "networkidle_timeout"
+            except Exception:
+                pass
+        return "navigation_timeout"
+    
+    async def _needs_javascript(self, page: Page, response) -> Optional[bool]:
+        # compares the html the server sent with the text the rendered page shows
+        if response is None:
+            return None
+        try:
+            raw_html = await response.text()
+            rendered_chars = await page.evaluate("document.body ? document.body.innerText.length : 0")
+            return needs_javascript(raw_html, rendered_chars)
+        except Exception:
+            return None
+    
+    # DOM CAPTURE
+    async def _capture_dom(self, page: Page) -> Tuple[Optional[Dict[str, any]], Optional[str]]:
+        # (snapshot, None) from one DOMSnapshot call, or (None, html) in html mode and without CDP
+        if self.dom_capture == "snapshot":
+            try:
+                cdp = await page.context.new_cdp_session(page)
+                try:
+                    return await capture_snapshot(cdp), None
+                finally:
+                    await cdp.detach()
+            except Exception as e:
+                logger.warning(f"DOM snapshot failed, using page.content(): {str(e)}")
+        return None, await page.content()
     
     # SCREENSHOT DATA FROM WEBSITE  
-    async def _capture_screenshots(self, page: Page) -> Dict[str, str]:
-        screenshots = {}
+    async def _capture_screenshots(self, page: Page) -> Tuple[Dict[str, bytes], Dict[str, bytes], Dict[str, Dict[str, any]]]:
+        # returns (screenshots, thumbnails, per viewport stats)
+        options = self.screenshot_options
+        screenshots, thumbnails, stats = {}, {}, {}
+        # layout signature -> viewport already captured with it
+        captured: Dict[str, str] = {}
         
         viewports = {
             "desktop": {"width": 1920, "height": 1080},
@@ -199,28 +918,104 @@ class WebScrape:
             "mobile": {"width": 375, "height": 667}
         }
         
+        # CDP can encode webp and scale thumbnails in the browser, other engines fall back to page.screenshot
         try:
+            cdp = await page.context.new_cdp_session(page)
+        except Exception:
+            cdp = None
+        
+        try:
+            deadline = current_deadline.get()
             for viewport_name, viewport_size in viewports.items():
+                # desktop always, tablet and mobile only while the deadline has room for them
+                if deadline is not None and viewport_name != "desktop" and deadline.remaining(DEADLINE_FINISH_RESERVE) < DEADLINE_VIEWPORT_SECONDS:
+                    skipped = [name for name in viewports if name != "desktop" and name not in screenshots]
+                    deadline.degrade("screenshots", "viewports skipped", ", ".join(skipped))
+                    break
                 # Set viewport
                 await page.set_viewport_size(viewport_size)
                 await page.wait_for_timeout(1000)
+                started = time.perf_counter()
                 
-                # Take full page screenshot
-                screenshot_bytes = await page.screenshot(
-                    full_page=True,
-                    type='png'
-                )
+                layout = await page.evaluate(LAYOUT_SIGNATURE_JS)
+                if options.dedupe_viewports and layout["signature"] in captured:
+                    # same layout as a wider viewport, reuse its image instead of encoding again
+                    same_as = captured[layout["signature"]]
+                    screenshots[viewport_name] = screenshots[same_as]
+                    if same_as in thumbnails:
+                        thumbnails[viewport_name] = thumbnails[same_as]
+                    stats[viewport_name] = {
+                        **stats[same_as],
+                        "same_as": same_as,
+                        "capture_ms": round((time.perf_counter() - started) * 1000, 1),
+                    }
+                    continue
+                
+                width = viewport_size["width"]
+                height = min(layout["height"], options.max_height)
+                if options.format == "webp":
+                    height = min(height, WEBP_MAX_DIMENSION)
+                height = max(height, 1)
                 
-                # Convert to base64
-                screenshots[viewport_name] = base64.b64encode(screenshot_bytes).decode('utf-8')
+                data = await self._screenshot(page, cdp, width, height)
+                thumbnail = None
+                if options.thumbnail_width and cdp is not None:
+                    thumbnail = await self._screenshot(
+                        page, cdp, width, min(height, viewport_size["height"]),
+                        scale=min(1.0, options.thumbnail_width / width),
+                    )
+                    thumbnails[viewport_name] = thumbnail
+                
+                # Kept raw, ScrapingResult base64 encodes on demand
+                screenshots[viewport_name] = data
+                captured[layout["signature"]] = viewport_name
+                stats[viewport_name] = {
+                    "mime_type": options.mime_type if cdp is not None or options.format != "webp" else "image/png",
+                    "width": width,
+                    "height": height,
+                    "page_height": layout["height"],
+                    "truncated": layout["height"] > height,
+                    "bytes": len(data),
+                    "thumbnail_bytes": len(thumbnail) if thumbnail else 0,
+                    "capture_ms": round((time.perf_counter() - started) * 1000, 1),
+                }
                 
         except Exception as e:
             logger.error(f"Screenshot capture failed: {str(e)}")
+        finally:
+            if cdp is not None:
+                try:
+                    await cdp.detach()
+                except Exception:
+                    pass
+        
+        return screenshots, thumbnails, stats
+    
+    async def _screenshot(self, page: Page, cdp, width: int, height: int, scale: float = 1.0) -> bytes:
+        # Captures the top width x height css pixels of the page
+        options = self.screenshot_options
+        if cdp is not None:
+            params = {
+                "format": options.format,
+                "clip": {"x": 0, "y": 0, "width": width, "height": height, "scale": scale},
+                "captureBeyondViewport": True,
+            }
+            if options.format != "png":
+                params["quality"] = options.quality
+            response = await cdp.send("Page.captureScreenshot", params)
+            return base64.b64decode(response["data"])
         
-        return screenshots
+        # playwright has no webp, png is the lossless fallback
+        image_type = "jpeg" if options.format == "jpeg" else "png"
+        return await page.screenshot(
+            full_page=True,
+            clip={"x": 0, "y": 0, "width": width, "height": height},
+            type=image_type,
+            quality=options.quality if image_type == "jpeg" else None,
+        )
 
     
-    async def _extract_css_info(self, page: Page) -> Dict[str, any]:
+    async def _extract_css_info(self, page: Page, coverage: Dict[str, Dict[str, any]]) -> Dict[str, any]:
         css_info = {
             "body_styles": {},
             "header_styles": {},
@@ -234,7 +1029,7 @@ class WebScrape:
         try:
             # Extract all CSS info in a single page.evaluate call for better performance
             extracted_data = await page.evaluate("""
-                () => {
+                (budget) => {
                     const getComputedStyles = (element, properties) => {
                         if (!element) return null;
                         const styles = window.getComputedStyle(element);
@@ -307,21 +1102,27 @@ class WebScrape:
                     }
                     result.css_variables = cssVars;
                     
-                    // Detect animations
-                    const animatedElements = document.querySelectorAll('*');
+                    // Detect animations on a sample of the page, transition-property is 'all' by default so the duration decides
                     const animations = [];
-                    animatedElements.forEach(el => {
+                    const animationKeys = new Set();
+                    result.coverage = window.__cloneSampler(budget, el => {
                         const styles = window.getComputedStyle(el);
-                        if (styles.animationName !== 'none' || styles.transitionProperty !== 'none') {
-                            animations.push({
-                                selector: el.tagName.toLowerCase() + (el.className ? '.' + el.className.split(' ')[0] : ''),
-                                animation: styles.animationName,
-                                transition: styles.transitionProperty,
-                                duration: styles.animationDuration || styles.transitionDuration
-                            });
-                        }
+                        const transitions = styles.transitionDuration.split(',').some(d => parseFloat(d) > 0);
+                        if (styles.animationName === 'none' && !transitions) return false;
+                        const className = typeof el.className === 'string' ? el.className.trim().split(/\\s+/)[0] : '';
+                        const animation = {
+                            selector: el.tagName.toLowerCase() + (className ? '.' + className : ''),
+                            animation: styles.animationName,
+                            transition: transitions ? styles.transitionProperty : 'none',
+                            duration: styles.animationName !== 'none' ? styles.animationDuration : styles.transitionDuration
+                        };
+                        const key = animation.selector + '|' + animation.animation + '|' + animation.transition;
+                        if (animationKeys.has(key)) return false;
+                        animationKeys.add(key);
+                        animations.push(animation);
+                        return animations.length >= 10 ? 'done' : true;
                     });
-                    result.animations = animations.slice(0, 10); // Limit to 10
+                    result.animations = animations;
                     
                     // Extract media query breakpoints from stylesheets
                     const breakpoints = new Set();
@@ -349,8 +1150,9 @@ class WebScrape:
                     
                     return result;
                 }
-            """)
+            """, self.budgets["animations"].to_js())
             
+            coverage["animations"] = extracted_data.pop("coverage", None)
             # Merge extracted data
             css_info.update(extracted_data)
             
@@ -404,15 +1206,15 @@ class WebScrape:
                 }
                 if cleaned_pattern['styles']:  # Only keep patterns with actual styles
                     cleaned_patterns.append(cleaned_pattern)
-            css_info['common_patterns'] = cleaned_patterns[:15]  # Limit to 15 most important
+            css_info['common_patterns'] = cleaned_patterns[:self.limits.max_css_patterns]  # Limit to most important
         
         return css_info
 
     # COLOR DATA FROM WEBSITE
-    async def _extract_color_palette(self, page: Page) -> List[str]:
+    async def _extract_color_palette(self, page: Page, coverage: Dict[str, Dict[str, any]]) -> List[str]:
         try:
-            colors = await page.evaluate("""
-                () => {
+            extracted = await page.evaluate("""
+                (budget) => {
                     const colors = new Set();
                     
                     // Helper to normalize colors to hex
@@ -448,55 +1250,53 @@ class WebScrape:
                         return namedColors[color.toLowerCase()] || null;
                     }
                     
-                    // 1. Extract from all elements with explicit colors
+                    // 1. Extract from a sample of the visible elements with explicit colors
                     console.log('Scanning elements...');
-                    const allElements = document.querySelectorAll('*');
+                    const addColor = (color) => {
+                        const normalized = normalizeColor(color);
+                        if (!normalized || colors.has(normalized)) return false;
+                        colors.add(normalized);
+                        return true;
+                    };
                     
-                    Array.from(allElements).forEach((element, index) => {
-                        if (index > 500) return; // Limit for performance
+                    const coverage = window.__cloneSampler(budget, (element, rect) => {
+                        // Only check visible elements
+                        if (rect.width <= 5 || rect.height <= 5) return false;
                         
                         const styles = window.getComputedStyle(element);
-                        const rect = element.getBoundingClientRect();
+                        let found = false;
+                        const colorProps = [
+                            styles.backgroundColor,
+                            styles.color,
+                            styles.borderTopColor,
+                            styles.borderRightColor,
+                            styles.borderBottomColor,
+                            styles.borderLeftColor,
+                            styles.outlineColor,
+                            styles.textDecorationColor,
+                            styles.caretColor,
+                            styles.columnRuleColor
+                        ];
                         
-                        // Only check visible elements
-                        if (rect.width > 5 && rect.height > 5) {
-                            const colorProps = [
-                                styles.backgroundColor,
-                                styles.color,
-                                styles.borderTopColor,
-                                styles.borderRightColor,
-                                styles.borderBottomColor,
-                                styles.borderLeftColor,
-                                styles.outlineColor,
-                                styles.textDecorationColor,
-                                styles.caretColor,
-                                styles.columnRuleColor
-                            ];
-                            
-                            colorProps.forEach(color => {
-                                const normalized = normalizeColor(color);
-                                if (normalized && normalized !== '#000000' && normalized !== '#ffffff') {
-                                    colors.add(normalized);
-                                    console.log(`Found color: ${normalized} on element:`, element.tagName);
-                                }
-                            });
-                            
-                            // Check for background images with gradients!!
-                            const bgImage = styles.backgroundImage;
-                            if (bgImage && bgImage !== 'none') {
-                                // Extract colors from gradients
-                                const gradientColors = bgImage.match(/#[0-9a-fA-F]{3,6}|rgb\\([^)]+\\)|rgba\\([^)]+\\)/g);
-                                if (gradientColors) {
-                                    gradientColors.forEach(color => {
-                                        const normalized = normalizeColor(color);
-                                        if (normalized) {
-                                            colors.add(normalized);
-                                            console.log(`Found gradient color: ${normalized}`);
-                                        }
-                                    });
-                                }
+                        colorProps.forEach(color => {
+                            const normalized = normalizeColor(color);
+                            if (normalized && normalized !== '#000000' && normalized !== '#ffffff' && addColor(normalized)) {
+                                found = true;
+                            }
+                        });
+                        
+                        // Check for background images with gradients!!
+                        const bgImage = styles.backgroundImage;
+                        if (bgImage && bgImage !== 'none') {
+                            // Extract colors from gradients
+                            const gradientColors = bgImage.match(/#[0-9a-fA-F]{3,6}|rgb\\([^)]+\\)|rgba\\([^)]+\\)/g);
+                            if (gradientColors) {
+                                gradientColors.forEach(color => {
+                                    if (addColor(color)) found = true;
+                                });
                             }
                         }
+                        return found;
                     });
                     
                     // 2. Extract from inline styles
@@ -510,7 +1310,6 @@ class WebScrape:
                                 const normalized = normalizeColor(color);
                                 if (normalized) {
                                     colors.add(normalized);
-                                    console.log(`Found inline style color: ${normalized}`);
                                 }
                             });
                         }
@@ -530,7 +1329,6 @@ class WebScrape:
                                                 const normalized = normalizeColor(color);
                                                 if (normalized && normalized !== '#000000' && normalized !== '#ffffff') {
                                                     colors.add(normalized);
-                                                    console.log(`Found CSS color: ${normalized}`);
                                                 }
                                             });
                                         }
@@ -547,32 +1345,38 @@ class WebScrape:
                     const finalColors = Array.from(colors);
                     console.log(`Total unique colors found: ${finalColors.length}`, finalColors);
                     
-                    return finalColors.slice(0, 20);
+                    return { colors: finalColors.slice(0, 20), coverage: coverage };
                 }
-            """)
+            """, self.budgets["colors"].to_js())
             
+            colors = extracted["colors"]
+            coverage["colors"] = extracted["coverage"]
             print(f"Extracted {len(colors)} colors: {colors}")
             
-            return list(set(colors))[:15] if colors else ['#4a90e2', '#f39c12', '#e74c3c']
+            return list(dict.fromkeys(colors))[:self.limits.max_colors] if colors else ['#4a90e2', '#f39c12', '#e74c3c']
             
         except Exception as e:
             print(f"Error extracting colors: {e}")
             return ['#4a90e2', '#f39c12', '#e74c3c']
     
     # TYPOGRAPHY FROM WEBSITE     
-    async def _extract_typography(self, page: Page) -> Dict[str, any]:
+    async def _extract_typography(self, page: Page, coverage: Dict[str, Dict[str, any]]) -> Dict[str, any]:
         try:
             typography = await page.evaluate("""
-                () => {
-                    const fonts = new Set();
+                (budget) => {
+                    // font family -> sampled elements using it, most used first
+                    const fonts = new Map();
                     const headings = {};
-                    const bodyText = {};
+                    let bodyText = {};
                     
-                    // Extract font families
-                    const elements = Array.from(document.querySelectorAll('*')).slice(0, 50);
-                    elements.forEach(element => {
+                    // Extract font families from a sample of the elements that hold text
+                    const fontCoverage = window.__cloneSampler(budget, element => {
+                        const hasText = Array.prototype.some.call(element.childNodes, node => node.nodeType === Node.TEXT_NODE && node.nodeValue.trim());
+                        if (!hasText) return false;
                         const fontFamily = window.getComputedStyle(element).fontFamily;
-                        if (fontFamily) fonts.add(fontFamily);
+                        if (!fontFamily) return false;
+                        fonts.set(fontFamily, (fonts.get(fontFamily) || 0) + 1);
+                        return fonts.get(fontFamily) === 1;
                     });
                     
                     // Extract heading styles
@@ -603,13 +1407,15 @@ class WebScrape:
                     }
                     
                     return {
-                        fonts: Array.from(fonts),
+                        fonts: Array.from(fonts.entries()).sort((a, b) => b[1] - a[1]).map(entry => entry[0]),
                         headings: headings,
-                        body_text: bodyText
+                        body_text: bodyText,
+                        coverage: fontCoverage
                     };
                 }
-            """)
+            """, self.budgets["typography"].to_js())
             
+            coverage["typography"] = typography.pop("coverage", None)
             return typography
             
         except Exception as e:
@@ -617,10 +1423,10 @@ class WebScrape:
             return {"fonts": [], "headings": {}, "body_text": {}}
 
     # LAYOUT FROM WEBSITE
-    async def _extract_layout_info(self, page: Page) -> Dict[str, any]:
+    async def _extract_layout_info(self, page: Page, coverage: Dict[str, Dict[str, any]]) -> Dict[str, any]:
         try:
             layout = await page.evaluate("""
-                () => {
+                (budget) => {
                     const structure = [];
                     const gridInfo = {};
                     
@@ -640,33 +1446,39 @@ class WebScrape:
                         }
                     });
                     
-                    // Check for grid/flexbox layouts
-                    const allElements = Array.from(document.querySelectorAll('*')).slice(0, 30);
-                    allElements.forEach(element => {
+                    // Check for grid/flexbox layouts on a sample of the page
+                    const layoutCoverage = window.__cloneSampler(budget, element => {
                         const styles = window.getComputedStyle(element);
                         const display = styles.display;
                         
                         if (display === 'grid' || display === 'flex') {
                             const tagName = element.tagName.toLowerCase();
-                            const className = element.className || 'no-class';
+                            const className = (typeof element.className === 'string' && element.className) || 'no-class';
+                            const key = `${tagName}.${className}`;
+                            if (key in gridInfo) return false;
                             
-                            gridInfo[`${tagName}.${className}`] = {
+                            gridInfo[key] = {
                                 display: display,
                                 'justify-content': styles.justifyContent,
                                 'align-items': styles.alignItems,
                                 'grid-template-columns': styles.gridTemplateColumns,
                                 'flex-direction': styles.flexDirection
                             };
+                            return true;
                         }
+                        return false;
                     });
                     
                     return {
+                        coverage: layoutCoverage,
                         structure: structure,
-                        grid_info: gridInfo
+                        grid_info: gridInfo,
+                        page_height: Math.max(document.documentElement.scrollHeight, document.body ? document.body.scrollHeight : 0)
                     };
                 }
-            """)
+            """, self.budgets["layout"].to_js())
             
+            coverage["layout"] = layout.pop("coverage", None)
             return layout
             
         except Exception as e:
@@ -675,7 +1487,7 @@ class WebScrape:
 
     
     # ASSETS FROM WEBSITE
-    async def _extract_assets(self, page: Page, requests_log: List, base_url: str) -> Dict[str, List[str]]:
+    async def _extract_assets(self, page: Page, request_stats: RequestStats, base_url: str) -> Dict[str, List[str]]:
         assets = {
             "images": [],
             "stylesheets": [],
@@ -733,22 +1545,14 @@ class WebScrape:
                 assets[asset_type].extend(urls)
             
             # Extract from network requests
-            for request in requests_log:
-                url = request['url']
-                resource_type = request['resource_type']
-                
-                if resource_type == 'image':
-                    assets['images'].append(url)
-                elif resource_type == 'stylesheet':
-                    assets['stylesheets'].append(url)
-                elif resource_type == 'font':
-                    assets['fonts'].append(url)
-                elif resource_type == 'script':
-                    assets['scripts'].append(url)
+            assets['images'].extend(request_stats.urls_for('image'))
+            assets['stylesheets'].extend(request_stats.urls_for('stylesheet'))
+            assets['fonts'].extend(request_stats.urls_for('font'))
+            assets['scripts'].extend(request_stats.urls_for('script'))
             
             # Remove duplicates and limit count
             for asset_type in assets:
-                assets[asset_type] = list(set(assets[asset_type]))[:20]
+                assets[asset_type] = list(dict.fromkeys(assets[asset_type]))[:self.limits.max_assets_per_type]
                 
         except Exception as e:
             logger.error(f"Asset extraction failed: {str(e)}")
@@ -801,7 +1605,22 @@ class WebScrape:
             logger.error(f"Metadata extraction failed: {str(e)}")
             return {}
         
+    # SAME PAGE LINKS, used by crawl mode
+    async def _extract_links(self, page: Page, base_url: str) -> List[str]:
+        try:
+            links = await page.evaluate("""
+                () => Array.from(document.querySelectorAll('a[href]'))
+                    .map(a => a.href)
+                    .filter(href => href.startsWith('http'))
+            """)
+            return list(dict.fromkeys(links))[:self.limits.max_links]
+            
+        except Exception as e:
+            logger.error(f"Link extraction failed: {str(e)}")
+            return []
+        
     def _clean_dom(self, html: str) -> str:
+        from bs4 import BeautifulSoup
         try:
             soup = BeautifulSoup(html, 'html.parser')
             
@@ -853,15 +1672,16 @@ class WebScrape:
         )
                  
     
-    # BROWSER CLEANUP
-    async def _cleanup_browser(self):
+    # BROWSER SHUTDOWN
+    async def close(self):
         try:
-            if self.context:
-                await self.context.close()
-                self.context = None
+            if self.remote_pool is not None:
+                await self.remote_pool.close()
             if self.browser:
                 await self.browser.close()
                 self.browser = None
+            if self.playwright:
+                await self.playwright.stop()
+                self.playwright = None
         except Exception as e:
             logger.error(f"Browser cleanup failed: {str(e)}")
-        
\ No newline at end of file
@@ -0,0 +1,145 @@
+# Worker mode: run scrape + generation jobs in separate processes.
+#
+#   WORKER_MODE=1 uv run fastapi dev            (api only enqueues)
+#   uv run python worker.py --workers 4         (each worker owns a browser)
+#
+# Jobs and progress go through the sqlite queue in jobqueue.py, no broker needed.
+
+import os
+import time
+import socket
+import asyncio
+import argparse
+import logging
+import multiprocessing
+import multiprocessing.connection
+from jobqueue import JobQueue
+from webscrape import WebScrape
+from assets import AssetPipeline
+from pipeline import CloneOptions, CloneStatus, run_clone_pipeline, warmup_llm_client
+from loopmonitor import LoopMonitor, job_context
+from adaptive import ADAPTIVE_INITIAL, AdaptiveConcurrency
+from politeness import DomainScheduler
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# seconds between claim attempts when the queue is empty
+POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", 0.5))
+
+class JobCancelled(Exception):
+    pass
+
+async def run_job(queue: JobQueue, job_id: str, url: str, options: CloneOptions, scraper: WebScrape, asset_pipeline: AssetPipeline, flights: SingleFlight):
+    async def report(status: CloneStatus, progress: int, **extra):
+        payload = {"type": "progress", "status": status.value, "progress": progress, "extra": extra}
+        if not await asyncio.to_thread(queue.report, job_id, payload):
+            raise JobCancelled(job_id)
+
+    try:
+        # the deadline counts from the claim, time spent queued isn't the job's
+        with job_context(job_id), options.deadline_context():
+            result_data = await run_clone_pipeline(url, scraper, asset_pipeline, report, options, flights)
+        if not await asyncio.to_thread(queue.finish, job_id, {"type": "completed", "result_data": result_data}):
+            logger.info(f"job {job_id} cancelled, result dropped")
+    except (JobCancelled, asyncio.CancelledError):
+        # a cancelled job attached to shared work is detached by cancelling its task
+        logger.info(f"job {job_id} cancelled")
+    except Exception as e:
+        await asyncio.to_thread(queue.finish, job_id, {"type": "failed", "error_message": str(e)})
+
+async def worker_loop(worker_name: str, concurrency: int):
+    queue = JobQueue()
+    # host limits are per worker process
+    domain_scheduler = DomainScheduler()
+    # stalls are logged, workers don't serve metrics
+    loop_monitor = LoopMonitor()
+    # --concurrency is the ceiling, the limiter decides how much of it the host can take right now
+    browser_limiter = AdaptiveConcurrency(lag=lambda: loop_monitor.ewma_lag, max_limit=concurrency, initial=min(concurrency, ADAPTIVE_INITIAL))
+    scraper = WebScrape(
+        use_browserbase=False,
+        browserbase_api_key=os.getenv("BROWSERBASE_KEY"),
+        scheduler=domain_scheduler,
+        concurrency=browser_limiter
+    )
+    asset_pipeline = AssetPipeline(scheduler=domain_scheduler)
+    # coalescing only sees jobs claimed by this worker
+    flights = SingleFlight()
+    running = set()
+    loop_monitor.start()
+    browser_limiter.start()
+
+    # browser and pools up before the first claim, if that fails the first job pays for it
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(scraper.warmup(), asset_pipeline.warmup(), warmup_llm_client())
+    except Exception as e:
+        logger.error(f"{worker_name} warmup failed: {e}")
+
+    logger.info(f"{worker_name} ready in {time.perf_counter() - started:.2f}s, concurrency {concurrency}")
+    try:
+        while True:
+            # one job more than the limit, so it waits on a slot and the limiter sees the demand
+            if len(running) >= min(concurrency, browser_limiter.current + 1):
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            claimed = await asyncio.to_thread(queue.claim, worker_name)
+            if not claimed:
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            job_id, url, options = claimed
+            logger.info(f"{worker_name} picked up {job_id} ({url})")
+            task = asyncio.create_task(run_job(queue, job_id, url, CloneOptions(**options), scraper, asset_pipeline, flights))
+            running.add(task)
+            task.add_done_callback(running.discard)
+    finally:
+        loop_monitor.stop()
+        browser_limiter.stop()
+        await asset_pipeline.close()
+        await scraper.close()
+
+def worker_main(index: int, concurrency: int):
+    logging.basicConfig(level=logging.INFO)
+    worker_name = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    try:
+        asyncio.run(worker_loop(worker_name, concurrency))
+    except KeyboardInterrupt:
+        pass
+
+# SUPERVISOR, restarts workers that die (e.g. chromium OOM)
+def main():
+    parser = argparse.ArgumentParser(description="Run clone workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WORKER_CONCURRENCY", 1)), help="jobs per worker")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # make sure the schema exists before workers race to create it
+    JobQueue()
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = {}
+    try:
+        while True:
+            for index in range(args.workers):
+                process = processes.get(index)
+                if process is None or not process.is_alive():
+                    if process is not None:
+                        logger.warning(f"worker {index} exited with {process.exitcode}, restarting")
+                    process = ctx.Process(target=worker_main, args=(index, args.concurrency), daemon=True)
+                    process.start()
+                    processes[index] = process
+            multiprocessing.connection.wait([p.sentinel for p in processes.values()])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import asyncio
+
+from assets import AssetPipeline, AssetStore, BundledAsset
+
+
+class SlowPipeline(AssetPipeline):
+    # downloads block until released, no network
+    def __init__(self, store: AssetStore):
+        super().__init__(store=store)
+        self.release = asyncio.Event()
+        self.downloads = 0
+
+    async def _download(self, url: str) -> BundledAsset:
+        self.downloads += 1
+        await self.release.wait()
+        return BundledAsset(url=url, digest="0" * 64, content_type="image/png", size=1, local_url=url, inlined=False)
+
+
+async def until(condition):
+    # store lookups run in a thread, a few loop turns aren't enough
+    for _ in range(1000):
+        if condition():
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError("condition never became true")
+
+
+def test_waiter_survives_cancelled_owner(tmp_path):
+    async def run():
+        pipeline = SlowPipeline(AssetStore(str(tmp_path)))
+        url = "https://example.com/a.png"
+        owner = asyncio.create_task(pipeline._get(url))
+        await until(lambda: pipeline.downloads == 1)
+        waiter = asyncio.create_task(pipeline._get(url))
+        await asyncio.sleep(0.05)
+
+        owner.cancel()
+        await until(lambda: pipeline.downloads == 2)
+        pipeline.release.set()
+        result = await asyncio.wait_for(waiter, 1)
+
+        assert owner.cancelled()
+        assert result.url == url
+        # the waiter took the download over
+        assert pipeline.downloads == 2
+        assert url not in pipeline._inflight
+
+    asyncio.run(run())
+
+
+def test_waiter_shares_the_owners_download(tmp_path):
+    async def run():
+        pipeline = SlowPipeline(AssetStore(str(tmp_path)))
+        url = "https://example.com/a.png"
+        tasks = [asyncio.create_task(pipeline._get(url)) for _ in range(3)]
+        await until(lambda: pipeline.downloads == 1)
+        await asyncio.sleep(0.05)
+        pipeline.release.set()
+        results = await asyncio.wait_for(asyncio.gather(*tasks), 1)
+
+        assert pipeline.downloads == 1
+        assert {result.url for result in results} == {url}
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_stays_cancelled(tmp_path):
+    async def run():
+        pipeline = SlowPipeline(AssetStore(str(tmp_path)))
+        url = "https://example.com/a.png"
+        owner = asyncio.create_task(pipeline._get(url))
+        await until(lambda: pipeline.downloads == 1)
+        waiter = asyncio.create_task(pipeline._get(url))
+        await asyncio.sleep(0.05)
+
+        waiter.cancel()
+        await asyncio.sleep(0.05)
+        pipeline.release.set()
+
+        assert (await asyncio.wait_for(owner, 1)).url == url
+        assert waiter.cancelled()
+        assert pipeline.downloads == 1
+
+    asyncio.run(run())
+
+
+def test_cached_assets_come_from_the_store(tmp_path):
+    async def run():
+        store = AssetStore(str(tmp_path))
+        store.put("https://example.com/small.png", b"\x89PNG", "image/png")
+        store.put("https://example.com/big.png", b"x" * 10_000, "image/png")
+        pipeline = SlowPipeline(store)
+
+        small = await pipeline._get("https://example.com/small.png")
+        big = await pipeline._get("https://example.com/big.png")
+
+        assert pipeline.downloads == 0
+        assert small.inlined and small.local_url == "data:image/png;base64,iVBORw=="
+        assert not big.inlined and big.local_url.endswith(f"/{big.digest}.png")
+
+    asyncio.run(run())
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {"content-type": "image/png"}
+
+    async def aiter_bytes(self):
+        yield b"\x89PNG" * 2000
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeClient:
+    def stream(self, method, url):
+        return FakeResponse()
+
+
+def test_throttled_host_does_not_hold_global_slots(tmp_path):
+    async def run():
+        pipeline = AssetPipeline(store=AssetStore(str(tmp_path)), max_connections=2)
+        pipeline._client = FakeClient()
+        # slow.example is paused for a minute, as after a 429 with Retry-After: 60
+        pipeline.scheduler._host("https://slow.example/").slow_down(60)
+
+        blocked = [asyncio.create_task(pipeline._get(f"https://slow.example/{i}.png")) for i in range(4)]
+        await asyncio.sleep(0.05)
+        try:
+            fast = await asyncio.wait_for(pipeline._get("https://fast.example/a.png"), 2)
+            assert fast.url == "https://fast.example/a.png"
+            assert not any(task.done() for task in blocked)
+        finally:
+            for task in blocked:
+                task.cancel()
+            await asyncio.gather(*blocked, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_index_entries_expire(tmp_path):
+    store = AssetStore(str(tmp_path), index_ttl=60)
+    url = "https://example.com/a.png"
+    store.put(url, b"png", "image/png")
+    assert store.lookup(url)["size"] == 3
+
+    # the site may have replaced it since, so it's downloaded again
+    store.index_ttl = -1
+    assert store.lookup(url) is None
+
+
+def test_sweep_removes_unreferenced_blobs_oldest_first(tmp_path):
+    import os
+
+    store = AssetStore(str(tmp_path))
+    old, older, kept = (store.put_blob(content, "image/png")["name"] for content in (b"a" * 100, b"b" * 100, b"c" * 100))
+    for age, name in ((200, old), (300, older), (400, kept)):
+        path = os.path.join(store.root, "blobs", name)
+        os.utime(path, (os.path.getatime(path) - age, os.path.getmtime(path) - age))
+    fresh = store.put_blob(b"d" * 100, "image/png")["name"]
+
+    # kept is referenced and fresh too young, removing older gets the store under the cap
+    removed = store.sweep({kept}, max_bytes=300, min_age=60)
+
+    assert removed == 1
+    assert sorted(os.listdir(os.path.join(store.root, "blobs"))) == sorted([old, kept, fresh])
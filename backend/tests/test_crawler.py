@@ -0,0 +1,99 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from crawler import SiteCrawler, normalize_url
+from deadline import job_deadline
+from webscrape import ScrapingResult
+
+SITE = {
+    "https://example.com/": ["https://example.com/a", "https://example.com/b", "https://other.com/x"],
+    "https://example.com/a": ["https://example.com/c"],
+    "https://example.com/b": [],
+    "https://example.com/c": [],
+}
+
+
+class FakeScraper:
+    def __init__(self, fail=(), broken=()):
+        self.fail = fail
+        self.broken = broken
+        self.scraped = []
+
+    @asynccontextmanager
+    async def shared_context(self):
+        yield None
+
+    async def scrape_website(self, url, context=None, screenshots=True):
+        await asyncio.sleep(0)
+        self.scraped.append(url)
+        if url in self.fail:
+            raise RuntimeError(f"boom {url}")
+        if url in self.broken:
+            await asyncio.sleep(0.01)
+            return ScrapingResult(url=url, screenshots={}, dom_structure="", extracted_css={}, color_palette=[], typography={},
+                                  layout_info={}, assets={}, metadata={}, success=False, error_message="broken")
+        return ScrapingResult(url=url, screenshots={}, dom_structure="", extracted_css={}, color_palette=[], typography={},
+                              layout_info={}, assets={}, metadata={}, success=True, links=SITE.get(url, []))
+
+
+def crawl(scraper, on_page=None, **options):
+    return asyncio.run(asyncio.wait_for(SiteCrawler(scraper, **options).crawl("https://example.com/", on_page), 5))
+
+
+def test_crawl_follows_same_origin_links_breadth_first():
+    pages = crawl(FakeScraper(), max_depth=1, max_pages=5)
+
+    assert [page.url for page in pages][0] == "https://example.com/"
+    assert sorted((page.url, page.depth) for page in pages[1:]) == [("https://example.com/a", 1), ("https://example.com/b", 1)]
+
+
+def test_crawl_stops_at_max_pages():
+    pages = crawl(FakeScraper(), max_depth=2, max_pages=2, concurrency=1)
+
+    assert len(pages) == 2
+
+
+def test_failed_page_frees_its_slot_for_a_queued_url():
+    # b is dequeued while a still holds the second slot, a then fails
+    scraper = FakeScraper(broken={"https://example.com/a"})
+    pages = crawl(scraper, max_depth=1, max_pages=2, concurrency=2)
+
+    assert [page.url for page in pages] == ["https://example.com/", "https://example.com/b"]
+
+
+def test_deadline_stops_claiming_pages():
+    async def go():
+        # a 3s deadline leaves no scrape budget past the start page
+        with job_deadline(3) as deadline:
+            pages = await SiteCrawler(FakeScraper(), max_depth=2, max_pages=5).crawl("https://example.com/")
+        return pages, deadline
+
+    pages, deadline = asyncio.run(go())
+
+    assert [page.url for page in pages] == ["https://example.com/"]
+    assert [(entry["stage"], entry["action"]) for entry in deadline.degraded] == [("crawl", "pages skipped")]
+
+
+def test_scrape_exception_ends_the_crawl_instead_of_hanging():
+    scraper = FakeScraper(fail={"https://example.com/a"})
+
+    with pytest.raises(RuntimeError, match="boom"):
+        crawl(scraper, max_depth=2, max_pages=5, concurrency=1)
+    # nothing after the failure was scraped
+    assert "https://example.com/c" not in scraper.scraped
+
+
+def test_raising_on_page_ends_the_crawl_instead_of_hanging():
+    async def on_page(page, done):
+        raise LookupError("cancelled")
+
+    with pytest.raises(LookupError):
+        crawl(FakeScraper(), on_page=on_page, max_depth=1, max_pages=5, concurrency=2)
+
+
+def test_normalize_url_drops_tracking_params_only():
+    url = "https://Example.com:443/docs/?utm_source=x&refresh=1&ref=home&fbclid=abc&b=2&referrer=y"
+
+    assert normalize_url(url) == "https://example.com/docs?b=2&referrer=y&refresh=1"
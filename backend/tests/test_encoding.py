@@ -0,0 +1,83 @@
+import asyncio
+import gzip
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("OPENAI_KEY", "test")
+os.environ.setdefault("WARMUP", "0")
+
+import main
+from encoding import MIN_COMPRESS_BYTES, EncodedBody, brotli, parse_accept_encoding
+from pipeline import CloneStatus
+
+BIG = b"<p>hello</p>" * 500
+
+
+def test_etag_is_strong_and_content_addressed():
+    a, b, c = EncodedBody.build(BIG, "text/html"), EncodedBody.build(BIG, "text/html"), EncodedBody.build(BIG + b"!", "text/html")
+    assert a.etag == b.etag != c.etag
+    assert a.etag.startswith('"') and not a.etag.startswith('W/')
+
+
+def test_small_bodies_are_not_compressed():
+    body = EncodedBody.build(b"x" * (MIN_COMPRESS_BYTES - 1), "text/plain")
+    assert list(body.encodings) == ["identity"]
+    assert body.negotiate("gzip, br") == ("identity", b"x" * (MIN_COMPRESS_BYTES - 1))
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, "identity"),
+    ("", "identity"),
+    ("gzip", "gzip"),
+    ("gzip;q=0", "identity"),
+    ("identity", "identity"),
+    ("*", "br" if brotli else "gzip"),
+    ("br;q=0, *", "gzip"),
+    ("br, gzip", "br" if brotli else "gzip"),
+])
+def test_negotiation(header, expected):
+    body = EncodedBody.build(BIG, "text/html")
+    encoding, content = body.negotiate(header)
+    assert encoding == expected
+    if encoding == "gzip":
+        assert gzip.decompress(content) == BIG
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, BR;q=0.5, deflate;q=bad") == {"gzip": 1.0, "br": 0.5, "deflate": 1.0}
+
+
+@pytest.fixture
+def completed_job():
+    job_id = "encoding-test"
+    main.jobs_db[job_id] = main.CloneJob(job_id=job_id, status=CloneStatus.PROCESSING, url="https://example.com", progress=50, created_at="now")
+    result = {"original_url": "https://example.com", "generated_html": BIG.decode(), "scraping_metadata": {}}
+    asyncio.run(main.complete_job(job_id, result))
+    yield job_id
+    main.jobs_db.pop(job_id, None)
+    main.result_cache.pop(job_id, None)
+    main.job_memory.pop(job_id, None)
+
+
+def test_result_is_served_with_etag_and_304(completed_job):
+    client = TestClient(main.app)
+    url = f"/api/clone/{completed_job}/result/html"
+
+    first = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["vary"] == "Accept-Encoding"
+    # the client decompresses transparently
+    assert first.content == BIG
+
+    again = client.get(url, headers={"If-None-Match": first.headers["etag"], "Accept-Encoding": "gzip"})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == first.headers["etag"]
+
+    stale = client.get(url, headers={"If-None-Match": '"stale"', "Accept-Encoding": "identity"})
+    assert stale.status_code == 200
+    assert "content-encoding" not in stale.headers
+    assert stale.content == BIG
@@ -0,0 +1,69 @@
+import io
+import os
+import zipfile
+
+from export import ChunkSink, ZipMember, referenced_blobs, zip_stream
+
+
+def members(tmp_path):
+    blob = tmp_path / "blob.png"
+    blob.write_bytes(os.urandom(300_000))
+    return [
+        ZipMember("index.html", data=b"<html>" + b"<p>x</p>" * 50_000 + b"</html>"),
+        ZipMember("screenshots/desktop.png", file=str(blob)),
+        ZipMember("data/empty.json", data=b""),
+    ], blob.read_bytes()
+
+
+def test_sink_cannot_seek():
+    assert not ChunkSink().seekable()
+
+
+def test_stream_is_a_valid_archive(tmp_path):
+    files, png = members(tmp_path)
+    chunks = list(zip_stream(files, chunk_size=16 * 1024))
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.testzip() is None
+    assert archive.namelist() == ["index.html", "screenshots/desktop.png", "data/empty.json"]
+    assert archive.read("index.html") == files[0].data
+    assert archive.read("screenshots/desktop.png") == png
+    assert archive.read("data/empty.json") == b""
+
+
+def test_already_compressed_files_are_stored(tmp_path):
+    files, _ = members(tmp_path)
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(zip_stream(files))))
+
+    assert archive.getinfo("index.html").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo("screenshots/desktop.png").compress_type == zipfile.ZIP_STORED
+    # sizes and crcs follow each file, the sink couldn't seek back to the header
+    assert all(info.flag_bits & 0x08 for info in archive.infolist())
+
+
+def test_stream_is_incremental(tmp_path):
+    files, _ = members(tmp_path)
+    chunks = list(zip_stream(files, chunk_size=16 * 1024))
+
+    # several pieces, none much bigger than a chunk, rather than the archive in one go
+    assert len(chunks) > 10
+    assert max(len(chunk) for chunk in chunks) < 64 * 1024
+
+
+def test_referenced_blobs_cover_manifests_and_served_urls():
+    shot, data, font, logo = ("a" * 64 + ".png", "b" * 64 + ".json", "c" * 64 + ".woff2", "d" * 64 + ".svg")
+    result = {
+        "original_url": "https://example.com/",
+        "pages": {
+            "index.html": {
+                "generated_html": f'<img src="http://cdn.test/assets/{logo}">',
+                "export": {"files": {"screenshots/desktop.png": shot}, "assets": {"https://example.com/f.woff2": font}},
+            },
+            # backstopped page, nothing stored
+            "page-1.html": {"generated_html": "<p>template</p>", "export": {}},
+        },
+    }
+    single = {"generated_html": "", "export": {"files": {"data/colors.json": data}}}
+
+    assert referenced_blobs(result, "http://cdn.test/assets/") == {shot, font, logo}
+    assert referenced_blobs(single, "http://cdn.test/assets") == {data}
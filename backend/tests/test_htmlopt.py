@@ -0,0 +1,33 @@
+from htmlopt import HtmlOptimizer, split_declarations
+
+
+def page(style: str, repeats: int = 3) -> str:
+    body = f'<div style="{style}">x</div>' * repeats
+    return f"<html><head></head><body>{body}</body></html>"
+
+
+def lifted_rule(html: str) -> str:
+    start = html.index("<style>") + len("<style>")
+    return html[start:html.index("</style>")]
+
+
+def test_split_declarations_keeps_semicolons_in_urls_and_strings():
+    assert split_declarations("a:b; c:url(x;y); d:'e;f'") == ["a:b", "c:url(x;y)", "d:'e;f'"]
+
+
+def test_lift_keeps_data_uri_intact():
+    html, stats = HtmlOptimizer().optimize(page("background:url(data:image/png;base64,AAAA) no-repeat;color:red"))
+    assert stats["classes_created"] == 1
+    assert lifted_rule(html) == "._s0{background:url(data:image/png;base64,AAAA) no-repeat!important;color:red!important}"
+
+
+def test_lift_keeps_quoted_semicolons_intact():
+    html, stats = HtmlOptimizer().optimize(page("font-family:'A;B', serif;margin:0 auto"))
+    assert stats["classes_created"] == 1
+    assert lifted_rule(html) == "._s0{font-family:'A;B', serif!important;margin:0 auto!important}"
+
+
+def test_single_styles_stay_inline():
+    html, stats = HtmlOptimizer().optimize(page("color:red", repeats=1))
+    assert stats["classes_created"] == 0
+    assert 'style="color:red"' in html
@@ -0,0 +1,37 @@
+from jobqueue import JobQueue
+
+
+def queue(tmp_path) -> JobQueue:
+    return JobQueue(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_finish_appends_the_final_event(tmp_path):
+    q = queue(tmp_path)
+    q.enqueue("a", "https://example.com")
+    assert q.claim("w1")[0] == "a"
+
+    assert q.finish("a", {"type": "completed"})
+    assert [(job_id, payload) for _, job_id, payload in q.read_events(0)] == [("a", {"type": "completed"})]
+    assert q.depth() == {"done": 1}
+
+
+def test_finish_drops_the_result_of_a_cancelled_job(tmp_path):
+    q = queue(tmp_path)
+    q.enqueue("a", "https://example.com")
+    q.claim("w1")
+    q.cancel("a")
+
+    assert not q.report("a", {"type": "progress"})
+    assert not q.finish("a", {"type": "completed"})
+    assert q.read_events(0) == []
+    assert q.depth() == {"cancelled": 1}
+
+
+def test_finish_only_counts_once(tmp_path):
+    q = queue(tmp_path)
+    q.enqueue("a", "https://example.com")
+    q.claim("w1")
+
+    assert q.finish("a", {"type": "completed"})
+    assert not q.finish("a", {"type": "failed"})
+    assert len(q.read_events(0)) == 1
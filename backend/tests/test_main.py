@@ -0,0 +1,29 @@
+import asyncio
+import os
+
+os.environ.setdefault("OPENAI_KEY", "test")
+os.environ.setdefault("WARMUP", "0")
+
+import main
+
+
+def test_complete_job_ignores_deleted_jobs():
+    asyncio.run(main.complete_job("gone", {"original_url": "https://example.com", "generated_html": "<p>x</p>", "scraping_metadata": {}}))
+
+    assert "gone" not in main.result_cache
+    assert "gone" not in main.job_memory
+
+
+def test_relayed_progress_after_delete_is_dropped():
+    from fastapi.testclient import TestClient
+    from pipeline import CloneStatus
+
+    job_id = "deleted-while-running"
+    main.jobs_db[job_id] = main.CloneJob(job_id=job_id, status=CloneStatus.SCRAPING, url="https://example.com", progress=10, created_at="now")
+    assert TestClient(main.app).delete(f"/api/clone/{job_id}").status_code == 200
+
+    # what relay_worker_events does with a progress event still in the queue
+    asyncio.run(main.report_progress(job_id, CloneStatus.PROCESSING, 50, memory_bytes=123_456))
+
+    assert job_id not in main.jobs_db
+    assert job_id not in main.job_memory
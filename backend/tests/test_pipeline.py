@@ -0,0 +1,139 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import pytest
+
+os.environ.setdefault("OPENAI_KEY", "test")
+
+import crawler
+import pipeline
+from assets import AssetPipeline, AssetStore
+from pipeline import CloneOptions, run_clone_pipeline
+from singleflight import SingleFlight
+from webscrape import ScrapingResult
+
+
+def scraped(url: str = "https://example.com") -> ScrapingResult:
+    return ScrapingResult(url=url, screenshots={}, dom_structure="<p>x</p>", extracted_css={}, color_palette=["#000"],
+                          typography={"fonts": []}, layout_info={"structure": []}, assets={}, metadata={"title": "T"}, success=True)
+
+
+class FakeScraper:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.scrapes = 0
+
+    async def scrape_staged(self, url, **kwargs):
+        self.scrapes += 1
+        await asyncio.sleep(self.delay)
+        return scraped(url), None
+
+
+class FakeCrawlScraper:
+    @asynccontextmanager
+    async def shared_context(self):
+        yield None
+
+    async def scrape_website(self, url, context=None, screenshots=True):
+        result = scraped(url)
+        result.links = ["https://example.com/about"] if url == "https://example.com/" else []
+        return result
+
+
+async def report(status, progress, **extra):
+    pass
+
+
+def run(options: CloneOptions, scraper: FakeScraper, tmp_path):
+    async def go():
+        with options.deadline_context():
+            return await run_clone_pipeline("https://example.com", scraper, AssetPipeline(AssetStore(str(tmp_path))), report, options)
+    return asyncio.run(go())
+
+
+def test_stage_timeout_without_deadline_is_raised(tmp_path, monkeypatch):
+    async def timing_out(*args, **kwargs):
+        raise TimeoutError("stage timed out")
+    monkeypatch.setattr(pipeline, "generate_html_with_llm", timing_out)
+
+    # a stage's own TimeoutError is not the deadline backstop
+    with pytest.raises(TimeoutError, match="stage timed out"):
+        run(CloneOptions(deadline=0, share_generation=False), FakeScraper(), tmp_path)
+
+
+def test_deadline_backstop_returns_the_template(tmp_path, monkeypatch):
+    async def hanging(*args, **kwargs):
+        await asyncio.sleep(60)
+    monkeypatch.setattr(pipeline, "generate_html_with_llm", hanging)
+    monkeypatch.setattr(pipeline, "DEADLINE_MIN_LLM", 0.0)
+    monkeypatch.setattr(pipeline, "DEADLINE_FINISH_RESERVE", 0.0)
+
+    result = run(CloneOptions(deadline=1, share_generation=False), FakeScraper(), tmp_path)
+
+    deadline = result["scraping_metadata"]["deadline"]
+    assert deadline["met"]
+    assert ("pipeline", "template result") in [(entry["stage"], entry["action"]) for entry in deadline["degraded"]]
+    assert result["generated_html"].startswith("<!DOCTYPE html>")
+
+
+def test_deadline_before_the_scrape_fails_the_job(tmp_path):
+    with pytest.raises(pipeline.CloneFailed, match="before the page was scraped"):
+        run(CloneOptions(deadline=1, share_generation=False), FakeScraper(delay=5), tmp_path)
+
+
+def test_short_deadline_skips_the_llm(tmp_path, monkeypatch):
+    async def unexpected(*args, **kwargs):
+        raise AssertionError("no time for an LLM call")
+    monkeypatch.setattr(pipeline, "generate_html_with_llm", unexpected)
+
+    result = run(CloneOptions(deadline=3, share_generation=False), FakeScraper(), tmp_path)
+
+    degraded = result["scraping_metadata"]["deadline"]["degraded"]
+    assert ("generate", "template fallback") in [(entry["stage"], entry["action"]) for entry in degraded]
+
+
+def test_scrapes_are_only_shared_between_jobs_with_the_same_deadline(tmp_path, monkeypatch):
+    async def generated(*args, **kwargs):
+        return "<html></html>"
+    monkeypatch.setattr(pipeline, "generate_html_with_llm", generated)
+
+    async def go():
+        scraper, flights = FakeScraper(delay=0.2), SingleFlight()
+        assets = AssetPipeline(AssetStore(str(tmp_path)))
+
+        async def job(seconds):
+            options = CloneOptions(deadline=seconds, screenshots=False)
+            with options.deadline_context():
+                return await run_clone_pipeline("https://example.com", scraper, assets, report, options, flights)
+
+        await asyncio.gather(job(20), job(20), job(0))
+        return scraper.scrapes
+
+    # the two 20s jobs share one scrape, the job without a deadline gets its own
+    assert asyncio.run(go()) == 2
+
+
+def test_flight_keys_include_the_deadline():
+    assert CloneOptions(deadline=20).flight_key("https://example.com") != CloneOptions().flight_key("https://example.com")
+    assert CloneOptions(crawl=True, deadline=20).flight_key("https://example.com") != CloneOptions(crawl=True).flight_key("https://example.com")
+
+
+def test_crawl_deadline_backstop_returns_template_pages(tmp_path, monkeypatch):
+    async def hanging(*args, **kwargs):
+        await asyncio.sleep(60)
+    monkeypatch.setattr(pipeline, "generate_html_with_llm", hanging)
+    monkeypatch.setattr(pipeline, "DEADLINE_MIN_LLM", 0.0)
+    monkeypatch.setattr(pipeline, "DEADLINE_FINISH_RESERVE", 0.0)
+    # the whole second is left for the crawl, so both pages are scraped before generation hangs
+    monkeypatch.setattr(pipeline, "DEADLINE_GENERATION_RESERVE", 0.0)
+    monkeypatch.setattr(crawler, "DEADLINE_MIN_ATTEMPT", 0.0)
+
+    options = CloneOptions(crawl=True, deadline=1, max_pages=2, share_generation=False)
+    result = run(options, FakeCrawlScraper(), tmp_path)
+
+    deadline = result["scraping_metadata"]["deadline"]
+    assert deadline["met"]
+    assert ("pipeline", "template result") in [(entry["stage"], entry["action"]) for entry in deadline["degraded"]]
+    assert sorted(result["pages"]) == ["index.html", "page-1.html"]
+    assert all(page["generated_html"].startswith("<!DOCTYPE html>") for page in result["pages"].values())
@@ -0,0 +1,32 @@
+from routing import ModelRouter
+from webscrape import ScrapingResult
+
+
+def page(dom_chars: int, sections: int, page_height: int) -> ScrapingResult:
+    return ScrapingResult(url="https://example.com", screenshots={}, dom_structure="x" * dom_chars, extracted_css={}, color_palette=[],
+                          typography={}, layout_info={"structure": [{"tag": "section", "count": sections}], "page_height": page_height},
+                          assets={}, metadata={}, success=True)
+
+
+STANDARD = page(150_000, 25, 6000)
+
+
+def test_complexity_picks_the_tier():
+    router = ModelRouter(log_path=None)
+    assert router.route(page(1000, 2, 800)).tier == "simple"
+    assert router.route(STANDARD).tier == "standard"
+
+
+def test_deadline_that_fits_keeps_the_tier():
+    decision = ModelRouter(log_path=None).route(STANDARD, deadline=85)
+
+    assert decision.tier == "standard"
+    assert decision.max_tokens == 4000
+    assert decision.timeout <= 85
+
+
+def test_tight_deadline_steps_down_and_caps_the_timeout():
+    decision = ModelRouter(log_path=None).route(STANDARD, deadline=20)
+
+    assert decision.tier == "simple"
+    assert decision.timeout <= 20
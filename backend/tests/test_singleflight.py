@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class Work:
+    # shared work that reports progress and waits until released
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.runs = 0
+        self.cancelled = False
+
+    async def __call__(self, report):
+        self.runs += 1
+        try:
+            await report("scraping", 10)
+            await self.release.wait()
+            await report("scraping", 50)
+            return "result"
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def recorder(seen):
+    async def report(*args, **kwargs):
+        seen.append(args)
+    return report
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_calls_share_one_run():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        first, second = [], []
+        tasks = [
+            asyncio.create_task(flights.do("key", work, recorder(first))),
+            asyncio.create_task(flights.do("key", work, recorder(second))),
+        ]
+        await settle()
+        work.release.set()
+
+        assert await asyncio.gather(*tasks) == ["result", "result"]
+        assert work.runs == 1
+        assert first == second == [("scraping", 10), ("scraping", 50)]
+        assert flights.snapshot() == {"in_flight": 0, "started": 1, "coalesced": 1}
+
+    asyncio.run(run())
+
+
+def test_cancelling_one_subscriber_keeps_the_work_for_the_others():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        leaving = asyncio.create_task(flights.do("key", work))
+        staying = asyncio.create_task(flights.do("key", work))
+        await settle()
+
+        leaving.cancel()
+        await settle()
+        work.release.set()
+
+        assert await staying == "result"
+        assert leaving.cancelled()
+        assert not work.cancelled
+
+    asyncio.run(run())
+
+
+def test_cancelling_the_last_subscriber_cancels_the_work():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        tasks = [asyncio.create_task(flights.do("key", work)) for _ in range(2)]
+        await settle()
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await settle()
+
+        assert work.cancelled
+        assert flights.snapshot()["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_raising_reporter_detaches_only_its_job():
+    async def run():
+        flights, work = SingleFlight(), Work()
+
+        async def failing(*args, **kwargs):
+            if args[1] == 50:
+                raise RuntimeError("job cancelled")
+
+        seen = []
+        detached = asyncio.create_task(flights.do("key", work, failing))
+        attached = asyncio.create_task(flights.do("key", work, recorder(seen)))
+        await settle()
+        work.release.set()
+
+        assert await attached == "result"
+        assert seen == [("scraping", 10), ("scraping", 50)]
+        with pytest.raises(asyncio.CancelledError):
+            await detached
+        assert not work.cancelled
+
+    asyncio.run(run())
+
+
+def test_late_joiner_gets_the_latest_progress():
+    async def run():
+        flights, work = SingleFlight(), Work()
+        first = asyncio.create_task(flights.do("key", work))
+        await settle()
+
+        seen = []
+        late = asyncio.create_task(flights.do("key", work, recorder(seen)))
+        await settle()
+        assert seen == [("scraping", 10)]
+
+        work.release.set()
+        assert await asyncio.gather(first, late) == ["result", "result"]
+
+    asyncio.run(run())
+
+
+def test_failure_reaches_every_subscriber():
+    async def run():
+        flights = SingleFlight()
+
+        async def failing(report):
+            await asyncio.sleep(0)
+            raise ValueError("scrape failed")
+
+        results = await asyncio.gather(*(flights.do("key", failing) for _ in range(2)), return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError, ValueError]
+
+    asyncio.run(run())
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from stagegraph import StageGraph
+
+
+def run(graph: StageGraph, *targets: str):
+    return asyncio.run(graph.run(*targets))
+
+
+def test_only_needed_stages_run():
+    ran = []
+    graph = StageGraph()
+
+    def stage(name, value):
+        async def fn(*inputs):
+            ran.append(name)
+            return value(*inputs)
+        return fn
+
+    graph.add("scrape", stage("scrape", lambda: 2))
+    graph.add("generate", stage("generate", lambda scraped: scraped * 10), "scrape")
+    graph.add("assets", stage("assets", lambda scraped: "unused"), "scrape")
+    graph.add("rewrite", stage("rewrite", lambda scraped, generated: scraped + generated), "scrape", "generate")
+
+    results = run(graph, "rewrite")
+
+    assert results == {"scrape": 2, "generate": 20, "rewrite": 22}
+    assert "assets" not in ran
+    assert graph.needed(["rewrite"]) == ["scrape", "generate", "rewrite"]
+
+
+def test_independent_stages_overlap():
+    graph = StageGraph()
+
+    async def slow(*_):
+        await asyncio.sleep(0.2)
+
+    graph.add("scrape", slow)
+    graph.add("a", slow, "scrape")
+    graph.add("b", slow, "scrape")
+    graph.add("join", slow, "a", "b")
+    run(graph, "join")
+
+    report = graph.report()
+    # a, b in parallel: 600ms, one after the other: 800ms
+    assert report["wall_ms"] < 750
+    assert report["critical_path"][0] == "scrape" and report["critical_path"][-1] == "join"
+
+
+def test_error_propagates_and_cancels_the_rest():
+    cancelled = []
+    graph = StageGraph()
+
+    async def scrape():
+        return 1
+
+    async def failing(_):
+        raise ValueError("generation failed")
+
+    async def slow(_):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append("assets")
+            raise
+
+    async def never(*_):
+        raise AssertionError("runs after a failed dependency")
+
+    graph.add("scrape", scrape)
+    graph.add("generate", failing, "scrape")
+    graph.add("assets", slow, "scrape")
+    graph.add("rewrite", never, "generate", "assets")
+
+    with pytest.raises(ValueError, match="generation failed"):
+        asyncio.run(asyncio.wait_for(graph.run("rewrite"), 2))
+    assert cancelled == ["assets"]
+
+
+def test_cycles_are_rejected():
+    graph = StageGraph()
+
+    async def noop(*_):
+        pass
+
+    graph.add("a", noop, "b")
+    graph.add("b", noop, "a")
+    with pytest.raises(ValueError, match="cycle"):
+        graph.needed(["a"])
@@ -22,6 +22,13 @@ export default function Home() {
   const [progress, setProgress] = useState<number>(0);
   const [generatedHtml, setGeneratedHtml] = useState<string>("");
   const [iframeUrl, setIframeUrl] = useState<string>("");
+  // template preview shown while the LLM generates, replaced by the result
+  const [isPreview, setIsPreview] = useState<boolean>(false);
+
+  const showHtml = (htmlContent: string) => {
+    const blob = new Blob([htmlContent], { type: 'text/html' });
+    setIframeUrl(URL.createObjectURL(blob));
+  };
 
   const cloneWebsite = async () => {
     console.log("cloning", userInput);
@@ -29,6 +36,7 @@ export default function Home() {
     // Reset previous state
     setGeneratedHtml("");
     setIframeUrl("");
+    setIsPreview(false);
 
     const res = await fetch(`${process.env.NEXT_PUBLIC_BACKEND}/api/clone`, {
       method: "POST",
@@ -56,6 +64,7 @@ export default function Home() {
         const msg = JSON.parse(event.data) as {
           status?: string;
           progress?: number;
+          preview_html?: string;
         };
 
         console.log("WS update:", msg);
@@ -64,6 +73,11 @@ export default function Home() {
           setProgress(msg.progress);
         }
 
+        if (msg.preview_html) {
+          showHtml(msg.preview_html);
+          setIsPreview(true);
+        }
+
         if (msg.status) {
           setStatus(msg.status.toUpperCase() as any);
 
@@ -81,10 +95,9 @@ export default function Home() {
                 const htmlContent = data.generated_html;
                 setGeneratedHtml(htmlContent);
 
-                // Create blob URL for iframe
-                const blob = new Blob([htmlContent], { type: 'text/html' });
-                const url = URL.createObjectURL(blob);
-                setIframeUrl(url);
+                // Create blob URL for iframe, replacing the preview
+                showHtml(htmlContent);
+                setIsPreview(false);
 
               } catch (error) {
                 console.error("Error fetching HTML:", error);
@@ -161,7 +174,12 @@ export default function Home() {
       </div>
 
       {/* Iframe to display generated HTML */}
-      <div className="h-[70vh] w-full p-4 overflow-auto">
+      <div className="h-[70vh] w-full p-4 overflow-auto relative">
+        {isPreview && (
+          <span className="absolute top-6 right-6 px-2 py-1 text-xs rounded bg-pink-200/90 text-pink-800">
+            Preview, generating...
+          </span>
+        )}
         {iframeUrl ? (
           <iframe
             src={iframeUrl}